@@ -0,0 +1,60 @@
+"""
+Compare peak allocations of the streaming extractor against res.json().
+
+Run with `inv bench` or `PYTHONPATH=src python bench/bench_jsonstream.py`.
+"""
+
+import io
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from ha import STATE_FIELDS
+from jsonstream import extract
+
+PAYLOADS_DIR = Path(__file__).parent / "payloads"
+ROUNDS = 50
+
+
+def full_parse(stream):
+    # What urequests' Response.json() does: read everything, then parse.
+    return json.loads(stream.read())
+
+
+def streaming_parse(stream):
+    return extract(stream, STATE_FIELDS)
+
+
+def measure(parse, raw: bytes) -> tuple[int, float]:
+    stream = io.BytesIO(raw)
+    tracemalloc.start()
+    parse(stream)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        parse(io.BytesIO(raw))
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    return peak, elapsed * 1000
+
+
+def main() -> None:
+    print(
+        f"{'payload':<28}{'size':>8}{'json peak':>12}{'stream peak':>13}"
+        f"{'json ms':>10}{'stream ms':>11}"
+    )
+    for path in sorted(PAYLOADS_DIR.glob("*.json")):
+        raw = path.read_bytes()
+        assert streaming_parse(io.BytesIO(raw))["state"] == json.loads(raw)["state"]
+        json_peak, json_ms = measure(full_parse, raw)
+        stream_peak, stream_ms = measure(streaming_parse, raw)
+        print(
+            f"{path.stem:<28}{len(raw):>8}{json_peak:>12}{stream_peak:>13}"
+            f"{json_ms:>10.3f}{stream_ms:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
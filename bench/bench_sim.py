@@ -0,0 +1,74 @@
+"""
+Run the plant app in the simulator for a day of wakes and report, for each
+wake, the allocation peak, the Home Assistant requests, the time the board
+stays on and the panel refresh time.
+
+Run with `inv bench` or `PYTHONPATH=.:src python bench/bench_sim.py`.
+"""
+
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from sim import FakeHA, Simulator
+
+WAKES = 24
+# Sensor values served at each wake: moisture slowly drying out, watered
+# half way through the day.
+MOISTURE = [42 - i * 0.5 for i in range(WAKES // 2)]
+MOISTURE += [55] * (WAKES + 1 - len(MOISTURE))
+
+
+def main() -> None:
+    ha = FakeHA().start()
+    try:
+        with tempfile.TemporaryDirectory() as flash_dir:
+            sim = Simulator(Path(flash_dir), {"HA_BASE_URL": ha.base_url})
+            report(sim, ha)
+    finally:
+        ha.stop()
+
+
+def report(sim: Simulator, ha: FakeHA) -> None:
+    print(
+        f"{'wake':>4}{'slept min':>11}{'on s':>7}{'refresh s':>11}{'refreshes':>11}"
+        f"{'wifi':>6}{'requests':>10}{'conns':>7}{'peak KiB':>10}{'host ms':>9}"
+    )
+    totals = {"on": 0.0, "refresh": 0.0, "requests": 0, "slept": 0.0}
+    tracemalloc.start()
+    try:
+        for i in range(WAKES + 1):
+            ha.set_state("sensor.aloe_vera_soil_moisture", str(MOISTURE[i]))
+            requests, connections = len(ha.requests), ha.connections
+            slept = sim.sleep() if i else 0
+            start = time.perf_counter()
+            wake = sim.boot("rtc") if i else sim.launch("plant")
+            host_ms = (time.perf_counter() - start) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+            if wake.exceptions:
+                raise wake.exceptions[0]
+
+            requests = len(ha.requests) - requests
+            totals["on"] += wake.seconds
+            totals["refresh"] += wake.refresh_seconds
+            totals["requests"] += requests
+            totals["slept"] += slept
+            print(
+                f"{i:>4}{slept / 60:>11.0f}{wake.seconds:>7.2f}"
+                f"{wake.refresh_seconds:>11.2f}{len(wake.refreshes):>11}"
+                f"{','.join(wake.wifi_connects):>6}{requests:>10}"
+                f"{ha.connections - connections:>7}{peak / 1024:>10.1f}"
+                f"{host_ms:>9.1f}"
+            )
+    finally:
+        tracemalloc.stop()
+
+    print(
+        f"Total over {totals['slept'] / 3600:.1f} hours: {totals['on']:.1f} s on, "
+        f"{totals['refresh']:.1f} s refreshing, {totals['requests']} requests"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Gateway between Home Assistant and the badges, run next to HA by
+`inv gateway`.
+
+It polls the states of the entities of every board in provisioning.yaml
+and precomputes a record per plant (see src/plantrecord.py), served at
+/records/<board_id>?plant=<index>. A badge then gets all it draws with one
+small GET per plant and struct.unpack, instead of parsing HA's JSON.
+Records keep being served from the last successful poll when HA can't be
+reached.
+"""
+
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import plantrecord
+
+# Width of the bars of src/apps/plant.py inside their border
+DEFAULT_FILL_WIDTH = 160
+MAX_FILL_WIDTH = plantrecord.NO_FILL - 1
+
+SENSORS = {
+    "moisture": "HA_PLANT_MOISTURE_SENSOR",
+    "temperature": "HA_PLANT_TEMPERATURE_SENSOR",
+    "conductivity": "HA_PLANT_CONDUCTIVITY_SENSOR",
+    "illuminance": "HA_PLANT_ILLUMINANCE_SENSOR",
+    "dli": "HA_PLANT_DLI_SENSOR",
+}
+
+
+def board_plants(board: dict) -> list:
+    """Provisioning of each plant of a board, see get_plants in tasks.py."""
+    return board.get("plants") or [board]
+
+
+def number(state: dict):
+    """Numeric state of an entity, None if unknown."""
+    try:
+        return float(state["state"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def thresholds(board: dict, states: dict, attribute: str):
+    """
+    (min, max) thresholds of a gauge, like prepare() writes them to the
+    board's secrets.py and plant.thresholds() reads them back. Taken from
+    the provisioning values, else from the HA entities they name.
+    """
+    bounds = []
+    for key in ("HA_PLANT_MIN_", "HA_PLANT_MAX_"):
+        key += attribute.upper()
+        if key in board:
+            value = board[key]
+        else:
+            value = number(states.get(board.get(key.lower()), {}))
+        if value is None or value == -1:
+            return None
+        bounds.append(float(value))
+
+    min_value, max_value = bounds
+    if max_value < min_value:
+        min_value, max_value = max_value, min_value
+    elif min_value == max_value:
+        max_value = min_value + 100
+    return min_value, max_value
+
+
+def fill(value, bounds, width: int):
+    """Width in pixels of the filled part of a bar, None if unknown."""
+    if value is None or bounds is None:
+        return None
+    min_value, max_value = bounds
+    value = min(max(value, min_value), max_value)
+    return int(width * (value - min_value) / (max_value - min_value))
+
+
+def build_record(board: dict, states: dict, updated: int, width: int) -> bytes:
+    plant = states.get(board.get("HA_PLANT_ID"), {})
+    name = plant.get("attributes", {}).get("friendly_name") or ""
+    gauges = {}
+    for attribute, key in SENSORS.items():
+        value = number(states.get(board.get(key), {}))
+        bounds = thresholds(board, states, attribute)
+        gauges[attribute] = (value, fill(value, bounds, width), bounds)
+    return plantrecord.pack(name, updated, gauges)
+
+
+class Gateway(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        provisioning: dict,
+        ha_url: str,
+        token: str,
+        *,
+        interval: float = 30,
+        address=("0.0.0.0", 8124),
+    ):
+        super().__init__(address, GatewayHandler)
+        # Boards by id, as in provisioning.yaml
+        self.provisioning = provisioning
+        self.ha_url = ha_url.rstrip("/")
+        self.token = token
+        self.interval = interval
+        # Records by (board_id, plant, fill width), built from the last poll
+        self.records = {}
+        self.states = None
+        self.updated = 0
+        self.polls = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fetch_states(self) -> dict:
+        request = urllib.request.Request(
+            self.ha_url + "/states",
+            headers={"Authorization": "Bearer " + self.token},
+        )
+        with urllib.request.urlopen(request, timeout=10) as res:
+            return {state["entity_id"]: state for state in json.load(res)}
+
+    def poll(self) -> None:
+        """Fetch all states from HA and rebuild the records."""
+        states = self.fetch_states()
+        updated = int(time.time())
+        records = {
+            (board_id, index, DEFAULT_FILL_WIDTH): build_record(
+                plant, states, updated, DEFAULT_FILL_WIDTH
+            )
+            for board_id, board in self.provisioning.items()
+            for index, plant in enumerate(board_plants(board))
+        }
+        with self.lock:
+            self.states = states
+            self.updated = updated
+            self.records = records
+            self.polls += 1
+
+    def poll_forever(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Couldn't poll Home Assistant ({e}), serving the last records")
+            self.stopped.wait(self.interval)
+
+    def record(self, board_id: str, plant: int = 0, width: int = DEFAULT_FILL_WIDTH):
+        """
+        Record of a board's plant, None if it's unknown or HA wasn't polled
+        yet.
+        """
+        with self.lock:
+            if self.states is None or board_id not in self.provisioning:
+                return None
+            plants = board_plants(self.provisioning[board_id])
+            if not 0 <= plant < len(plants):
+                return None
+            key = (board_id, plant, width)
+            if key not in self.records:
+                self.records[key] = build_record(
+                    plants[plant], self.states, self.updated, width
+                )
+            return self.records[key]
+
+    def start(self) -> "Gateway":
+        for target in (self.serve_forever, self.poll_forever):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        board_id = url.path.removeprefix("/records/")
+        if board_id == url.path or board_id not in self.server.provisioning:
+            self._reply(404, b"Unknown board", "text/plain")
+            return
+        query = parse_qs(url.query)
+        try:
+            plant = int(query.get("plant", [0])[0])
+            width = int(query.get("width", [DEFAULT_FILL_WIDTH])[0])
+        except ValueError:
+            plant, width = -1, -1
+        if not 0 < width <= MAX_FILL_WIDTH:
+            self._reply(400, b"Invalid width", "text/plain")
+            return
+        if not 0 <= plant < len(board_plants(self.server.provisioning[board_id])):
+            self._reply(404, b"Unknown plant", "text/plain")
+            return
+
+        record = self.server.record(board_id, plant, width)
+        if record is None:
+            self._reply(503, b"Home Assistant wasn't polled yet", "text/plain")
+            return
+        self._reply(200, record, "application/octet-stream")
@@ -0,0 +1,102 @@
+"""
+Host cache of the plant pictures downloaded by `inv provision`.
+
+Downloads are kept by URL with their ETag and Last-Modified headers, so that
+a picture is only downloaded again when the server says it changed. What
+they're turned into for the panel is kept by a hash of the downloaded bytes
+and the processing parameters: a picture shared by several boards, or
+provisioned again, is processed once.
+
+Files are written to a temporary name and renamed, so that boards
+provisioned in parallel processes can share the cache.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class ImageCache:
+    def __init__(self, cache_dir: Path, timeout: float = 30):
+        self.sources_dir = cache_dir / "sources"
+        self.processed_dir = cache_dir / "processed"
+        self.sources_dir.mkdir(parents=True, exist_ok=True)
+        self.processed_dir.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+
+    def fetch(self, url: str) -> bytes:
+        """
+        Content at url, only downloaded if the server doesn't confirm that
+        the cached copy is still current. The cached copy is also returned
+        when the server can't be reached.
+        """
+        name = hashlib.sha256(url.encode()).hexdigest()
+        data_path = self.sources_dir / name
+        meta_path = self.sources_dir / (name + ".json")
+        meta = {}
+        if data_path.exists() and meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as res:
+                data = res.read()
+                etag = res.headers.get("ETag")
+                last_modified = res.headers.get("Last-Modified")
+        except OSError as e:
+            # HTTPError for a 304, since urllib only follows redirects
+            if not meta:
+                raise
+            if isinstance(e, urllib.error.HTTPError) and e.code == 304:
+                print(f"{url} not modified, using the cached copy")
+            else:
+                print(f"Couldn't download {url} ({e}), using the cached copy")
+            return data_path.read_bytes()
+
+        write_atomic(data_path, data)
+        meta = {"url": url, "etag": etag, "last_modified": last_modified}
+        write_atomic(meta_path, json.dumps(meta).encode())
+        return data
+
+    def processed(self, source: bytes, params: dict, process) -> dict[str, bytes]:
+        """
+        Outputs of process(source, **params), a dict of file contents by
+        extension, computed once for the same source and params.
+        """
+        key = hashlib.sha256(source)
+        key.update(json.dumps(params, sort_keys=True).encode())
+        name = key.hexdigest()
+        # Written last, the outputs are complete once it exists
+        index_path = self.processed_dir / (name + ".json")
+        if index_path.exists():
+            extensions = json.loads(index_path.read_text())
+            return {
+                extension: (self.processed_dir / f"{name}.{extension}").read_bytes()
+                for extension in extensions
+            }
+
+        outputs = process(source, **params)
+        for extension, data in outputs.items():
+            write_atomic(self.processed_dir / f"{name}.{extension}", data)
+        write_atomic(index_path, json.dumps(sorted(outputs)).encode())
+        return outputs
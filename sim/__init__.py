@@ -0,0 +1,18 @@
+"""
+CPython simulator of the Badger 2040 W running this repo's code.
+
+    sim = Simulator(tmp_path / "flash", {"HA_BASE_URL": fake_ha.base_url})
+    wake = sim.launch("plant")
+    for slept, wake in sim.run(3):
+        ...
+    sim.screenshot("screen.png")
+
+The board's hardware is virtual (panel, RTC, Wi-Fi, battery, clock), and
+FakeHA serves recorded Home Assistant states over HTTP.
+"""
+
+from sim.fakeha import FakeHA
+from sim.hardware import Hardware, PowerOff
+from sim.simulator import Simulator, Wake
+
+__all__ = ["FakeHA", "Hardware", "PowerOff", "Simulator", "Wake"]
@@ -0,0 +1,250 @@
+"""
+Local stand-in for the Home Assistant REST and WebSocket APIs, serving
+recorded states.
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+RECORDED_STATES_PATH = Path(__file__).parent / "recorded_states.json"
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def recorded_states() -> dict:
+    with RECORDED_STATES_PATH.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeHA(ThreadingHTTPServer):
+    """
+    Minimal stand-in for the Home Assistant REST API, counting requests,
+    and for the state triggers of its WebSocket API.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, states: dict = None):
+        super().__init__(("127.0.0.1", 0), FakeHAHandler)
+        # States by entity_id, can be changed while serving
+        self.states = copy.deepcopy(states if states is not None else STATES)
+        self.requests = []
+        self.connections = 0
+        self.template_enabled = True
+        # Send bodies with Transfer-Encoding: chunked
+        self.chunked = False
+        # Close connections after each response without announcing it,
+        # like a server dropping idle keep-alive connections.
+        self.drop_connections = False
+        # WebSocket subscriptions, and an event set when one is added
+        self.subscriptions = []
+        self.subscribed = threading.Event()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api"
+
+    def set_state(self, entity_id: str, state: str) -> None:
+        """Change a state, sending it to the WebSockets subscribed to it."""
+        old_state = copy.deepcopy(self.states[entity_id])
+        self.states[entity_id]["state"] = state
+        for subscription in list(self.subscriptions):
+            subscription.state_changed(entity_id, old_state, self.states[entity_id])
+
+    def remove_state(self, entity_id: str) -> None:
+        """Remove an entity, like renaming it does."""
+        old_state = self.states.pop(entity_id)
+        for subscription in list(self.subscriptions):
+            subscription.state_changed(entity_id, old_state, None)
+
+    def start(self) -> "FakeHA":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class FakeHAHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type="application/json"):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if self.server.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(body), 50):
+                chunk = body[i : i + 50]
+                self.wfile.write(b"%x;ext=1\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\nX-Trailer: yes\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        if self.server.drop_connections:
+            self.close_connection = True
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path))
+        if self.path == "/api/websocket":
+            Subscription(self).serve()
+            return
+        if self.path == "/api/states":
+            self._reply(200, json.dumps(list(self.server.states.values())))
+            return
+        entity = self.path.removeprefix("/api/states/")
+        if entity not in self.server.states:
+            self._reply(404, json.dumps({"message": "Entity not found."}))
+            return
+        self._reply(200, json.dumps(self.server.states[entity]))
+
+    def do_POST(self):
+        self.server.requests.append(("POST", self.path))
+        length = int(self.headers["Content-Length"])
+        template = json.loads(self.rfile.read(length))["template"]
+        if self.path != "/api/template" or not self.server.template_enabled:
+            self._reply(500, "Template rendering disabled", "text/plain")
+            return
+        self._reply(200, render_template(template, self.server.states), "text/plain")
+
+
+class Subscription:
+    """A WebSocket connection to the stand-in, run by its handler thread."""
+
+    def __init__(self, handler: FakeHAHandler):
+        self.handler = handler
+        self.server = handler.server
+        self.entity_ids = set()
+        self.trigger_id = None
+        self.lock = threading.Lock()
+
+    def serve(self) -> None:
+        key = self.handler.headers["Sec-WebSocket-Key"].encode()
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest())
+        self.handler.send_response(101)
+        self.handler.send_header("Upgrade", "websocket")
+        self.handler.send_header("Connection", "Upgrade")
+        self.handler.send_header("Sec-WebSocket-Accept", accept.decode())
+        self.handler.end_headers()
+        self.handler.close_connection = True
+
+        self.send({"type": "auth_required", "ha_version": "2023.3.0"})
+        try:
+            message = self.receive()
+            if message is None or not message.get("access_token"):
+                self.send({"type": "auth_invalid", "message": "Invalid access token"})
+                return
+            self.send({"type": "auth_ok", "ha_version": "2023.3.0"})
+            while (message := self.receive()) is not None:
+                self.handle(message)
+        except OSError:
+            pass
+        finally:
+            if self in self.server.subscriptions:
+                self.server.subscriptions.remove(self)
+
+    def handle(self, message: dict) -> None:
+        if message.get("type") != "subscribe_trigger":
+            self.send(
+                {
+                    "id": message.get("id"),
+                    "type": "result",
+                    "success": False,
+                    "error": {"code": "unknown_command"},
+                }
+            )
+            return
+        entity_ids = message["trigger"]["entity_id"]
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        self.entity_ids = set(entity_ids)
+        self.trigger_id = message["id"]
+        self.server.subscriptions.append(self)
+        self.send(
+            {"id": message["id"], "type": "result", "success": True, "result": None}
+        )
+        self.server.subscribed.set()
+
+    def state_changed(self, entity_id: str, old_state: dict, new_state: dict):
+        if entity_id not in self.entity_ids:
+            return
+        trigger = {
+            "id": "0",
+            "idx": "0",
+            "platform": "state",
+            "entity_id": entity_id,
+            "from_state": old_state,
+            "to_state": new_state,
+            "for": None,
+        }
+        event = {"variables": {"trigger": trigger}, "context": None}
+        try:
+            self.send({"id": self.trigger_id, "type": "event", "event": event})
+        except OSError:
+            pass
+
+    def send(self, message: dict, opcode: int = 0x1) -> None:
+        payload = json.dumps(message).encode() if opcode == 0x1 else message
+        size = len(payload)
+        if size < 126:
+            header = struct.pack("!BB", 0x80 | opcode, size)
+        elif size < 0x10000:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, size)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, size)
+        with self.lock:
+            self.handler.wfile.write(header + payload)
+            self.handler.wfile.flush()
+
+    def receive(self):
+        """Next message from the client, None once it closed."""
+        while True:
+            header = self.handler.rfile.read(2)
+            if len(header) < 2:
+                return None
+            opcode, size = header[0] & 0x0F, header[1] & 0x7F
+            if size == 126:
+                (size,) = struct.unpack("!H", self.handler.rfile.read(2))
+            elif size == 127:
+                (size,) = struct.unpack("!Q", self.handler.rfile.read(8))
+            mask = self.handler.rfile.read(4) if header[1] & 0x80 else bytes(4)
+            payload = bytes(
+                byte ^ mask[i % 4]
+                for i, byte in enumerate(self.handler.rfile.read(size))
+            )
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self.send(payload, opcode=0xA)
+            elif opcode == 0x1:
+                return json.loads(payload)
+
+
+def render_template(template: str, states: dict) -> str:
+    # Only supports the expressions emitted by ha.batch_template.
+    rendered = template.removeprefix("{{ ").removesuffix(" | tojson }}")
+    for entity, state in states.items():
+        name = json.dumps(state["attributes"].get("friendly_name"))
+        rendered = rendered.replace(f'states("{entity}")', json.dumps(state["state"]))
+        rendered = rendered.replace(f'state_attr("{entity}","friendly_name")', name)
+    return json.dumps(json.loads(rendered))
+
+
+STATES = recorded_states()
@@ -0,0 +1,261 @@
+"""
+Virtual Badger 2040 W hardware, shared by the stand-in modules.
+
+The hardware outlives the code running on it: the e-ink panel keeps its
+image and the battery backed RTC keeps counting while the board is off.
+Time is virtual, it only moves forward when the board sleeps, waits or
+refreshes the panel.
+"""
+
+import calendar
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+WIDTH = 296
+HEIGHT = 128
+FRAMEBUFFER_SIZE = WIDTH * HEIGHT // 8
+
+UPDATE_NORMAL = 0
+UPDATE_MEDIUM = 1
+UPDATE_FAST = 2
+UPDATE_TURBO = 3
+# Rough panel refresh times in seconds at each speed. A partial update runs
+# the same waveform as a full one, only on fewer pixels.
+REFRESH_SECONDS = {
+    UPDATE_NORMAL: 2.0,
+    UPDATE_MEDIUM: 1.0,
+    UPDATE_FAST: 0.5,
+    UPDATE_TURBO: 0.25,
+}
+
+# Rough Wi-Fi timings in seconds: joining a known access point with a static
+# IP, and a scan, association and DHCP lease
+WIFI_FAST_CONNECT_SECONDS = 1.0
+WIFI_FULL_CONNECT_SECONDS = 4.0
+WIFI_SCAN_SECONDS = 1.5
+
+# Virtual seconds a button press holds the button down
+PRESS_SECONDS = 0.1
+
+# RP2040 MicroPython heap, reported by gc.mem_free() minus what CPython
+# allocated since the last boot when tracemalloc is tracing
+HEAP_SIZE = 160 * 1024
+
+# Fri 2023-03-10 12:00:00 UTC
+START_TIME = 1678449600
+
+
+class PowerOff(BaseException):
+    """Raised when the board switches its own power off, ending a wake."""
+
+
+class Hardware:
+    def __init__(
+        self,
+        flash_dir: Path,
+        code_dir: Path,
+        start: float = START_TIME,
+        battery_mv: int = 4000,
+        rtc_drift_ppm: float = 0,
+        access_points=(("sim", b"\x02\x00\x00\x00\x00\x01", 6, -60),),
+    ):
+        # Files written on the board, over the deployed code
+        self.flash_dir = Path(flash_dir)
+        self.code_dir = Path(code_dir)
+        # True time, seconds since the epoch
+        self.now = float(start)
+        self.boot_time = self.now
+        self.battery_mv = battery_mv
+        # Powered over USB, seen by the Pico W on its VBUS sense pin
+        self.usb_power = False
+        # (ssid, bssid, channel, rssi) of the access points in range
+        self.access_points = list(access_points)
+        # Whether WLAN.config() of the firmware reports the BSSID joined
+        self.wlan_reports_bssid = True
+        self.rtc = RTC(self, rtc_drift_ppm)
+        self.panel = bytearray(FRAMEBUFFER_SIZE)
+        self.ntp_synced = False
+        # Buttons held down, until released_at
+        self.pressed = set()
+        self.released_at = None
+        # Buttons that woke the board, latched at power on
+        self.wake_buttons = set()
+        self.woken_by = "button"
+        # Set when the power latch is released on USB, which keeps the
+        # board on: the code then waits in halt() for a button or the RTC
+        self.halted = threading.Event()
+        # Print the board's console output as it runs
+        self.echo = False
+
+        # Log of the current wake
+        self.refreshes = []
+        self.wifi_connects = []
+        self.warnings = []
+        self.exceptions = []
+        self.console = []
+
+    def path(self, device_path: str) -> Path:
+        """Host path a device path is written to."""
+        return self.flash_dir / device_path.lstrip("/")
+
+    def resolve(self, device_path: str) -> Path:
+        """Host path a device path is read from: the flash, else the code."""
+        path = self.path(device_path)
+        if not path.exists():
+            code_path = self.code_dir / device_path.lstrip("/")
+            if code_path.exists():
+                return code_path
+        return path
+
+    def log(self, text: str) -> None:
+        self.console.append(text)
+        if self.echo:
+            print(text)
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    def press(self, buttons, seconds: float = PRESS_SECONDS) -> None:
+        """Hold buttons down for seconds of virtual time."""
+        self.pressed = set(buttons)
+        self.released_at = self.now + seconds
+
+    def held(self) -> set:
+        """Buttons held down now."""
+        if self.released_at is not None and self.now >= self.released_at:
+            self.pressed = set()
+            self.released_at = None
+        return self.pressed
+
+    def power_on(self, woken_by: str) -> None:
+        self.boot_time = self.now
+        self.woken_by = woken_by
+        self.wake_buttons = set(self.pressed) if woken_by == "button" else set()
+        self.ntp_synced = False
+        self.refreshes = []
+        self.wifi_connects = []
+        self.warnings = []
+        self.exceptions = []
+        self.console = []
+        if tracemalloc.is_tracing():
+            tracemalloc.clear_traces()
+
+    def ticks_us(self) -> int:
+        return round((self.now - self.boot_time) * 1_000_000)
+
+    def mem_free(self) -> int:
+        used = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        return max(0, HEAP_SIZE - used)
+
+    def system_time(self) -> float:
+        """time.time() on the board: set from NTP, else from the RTC."""
+        if self.ntp_synced:
+            return self.now
+        return self.rtc.timestamp()
+
+    def refresh(self, speed: int, region=None) -> None:
+        """Log a panel refresh of the framebuffer, or of a region of it."""
+        seconds = REFRESH_SECONDS[speed]
+        self.refreshes.append((speed, region, seconds))
+        self.advance(seconds)
+
+    def sleep_until_wake(self) -> float:
+        """Advance to the next RTC interrupt and return the seconds slept."""
+        timer_due = self.rtc.timer_due()
+        alarm_due = self.rtc.alarm_due()
+        due = [due for due in (timer_due, alarm_due) if due is not None]
+        if not due:
+            raise RuntimeError("The board was switched off without a wake up")
+        wake = max(self.now, min(due))
+        slept = wake - self.now
+        self.now = wake
+        if timer_due is not None and timer_due <= wake:
+            self.rtc.timer_flag = True
+            # The countdown timer reloads and keeps counting
+            self.rtc.timer_set_at = self.rtc.timestamp()
+        if alarm_due is not None and alarm_due <= wake:
+            self.rtc.alarm_flag = True
+        return slept
+
+
+class RTC:
+    """Registers of the PCF85063A, counting with a drift relative to true time."""
+
+    def __init__(self, hardware: Hardware, drift_ppm: float = 0):
+        self.hardware = hardware
+        self.drift_ppm = drift_ppm
+        # RTC timestamp at the true time set_at, unset RTCs start in 2000
+        self.base = calendar.timegm((2000, 1, 1, 0, 0, 0))
+        self.set_at = hardware.now
+
+        self.timer_seconds = None
+        self.timer_set_at = None
+        self.timer_enabled = False
+        self.timer_flag = False
+        # (second, minute, hour, day), None for fields that always match
+        self.alarm = None
+        self.alarm_enabled = False
+        self.alarm_flag = False
+
+    def _rate(self) -> float:
+        return 1 + self.drift_ppm / 1_000_000
+
+    def timestamp(self) -> float:
+        return self.base + (self.hardware.now - self.set_at) * self._rate()
+
+    def set_timestamp(self, timestamp: float) -> None:
+        self.base = timestamp
+        self.set_at = self.hardware.now
+
+    def true_time(self, timestamp: float) -> float:
+        """True time at which the RTC will read timestamp."""
+        return self.set_at + (timestamp - self.base) / self._rate()
+
+    def start_timer(self, seconds: float) -> None:
+        self.timer_seconds = seconds
+        self.timer_set_at = self.timestamp()
+
+    def timer_due(self):
+        """True time at which the timer interrupt fires, None if it's off."""
+        if not self.timer_enabled or self.timer_seconds is None:
+            return None
+        return self.true_time(self.timer_set_at + self.timer_seconds)
+
+    def alarm_due(self):
+        """True time at which the alarm interrupt fires, None if it's off."""
+        if not self.alarm_enabled or self.alarm is None:
+            return None
+        second, minute, hour, day = self.alarm
+        start = int(self.timestamp()) + 1
+        today = time.gmtime(start)
+        # The alarm fires on the next second whose set fields all match
+        for offset in range(62):
+            midnight = calendar.timegm(
+                (today.tm_year, today.tm_mon, today.tm_mday + offset, 0, 0, 0)
+            )
+            if day is not None and time.gmtime(midnight).tm_mday != day:
+                continue
+            for h in range(24) if hour is None else (hour,):
+                for m in range(60) if minute is None else (minute,):
+                    for s in range(60) if second is None else (second,):
+                        timestamp = midnight + h * 3600 + m * 60 + s
+                        if timestamp >= start:
+                            return self.true_time(timestamp)
+        return None
+
+
+# Hardware the stand-in modules talk to, set by the Simulator for each wake
+_current = None
+
+
+def current() -> Hardware:
+    if _current is None:
+        raise RuntimeError("No simulated board is running")
+    return _current
+
+
+def set_current(hardware: Hardware) -> None:
+    global _current
+    _current = hardware
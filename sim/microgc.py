@@ -0,0 +1,27 @@
+"""MicroPython's gc module, reporting the simulated heap."""
+
+from sim.hardware import HEAP_SIZE, current
+
+
+def collect() -> None:
+    pass
+
+
+def mem_free() -> int:
+    return current().mem_free()
+
+
+def mem_alloc() -> int:
+    return HEAP_SIZE - current().mem_free()
+
+
+def enable() -> None:
+    pass
+
+
+def disable() -> None:
+    pass
+
+
+def threshold(amount: int = None):
+    return -1 if amount is None else None
@@ -0,0 +1,69 @@
+"""
+MicroPython's os module on the board's filesystem: files written on the
+board are kept in the flash dir, over the deployed code which is read-only.
+"""
+
+import os as _os
+
+from sim.hardware import current
+
+
+def listdir(path: str = "/") -> list:
+    hardware = current()
+    names = set()
+    found = False
+    for directory in (hardware.path(path), hardware.code_dir / path.lstrip("/")):
+        if directory.is_dir():
+            found = True
+            names.update(
+                name for name in _os.listdir(directory) if name != "__pycache__"
+            )
+    if not found:
+        raise OSError(2, "ENOENT")
+    return sorted(names)
+
+
+def ilistdir(path: str = "/"):
+    for name in listdir(path):
+        full = f"{path.rstrip('/')}/{name}"
+        yield (name, 0x4000 if stat(full)[0] & 0x4000 else 0x8000, 0)
+
+
+def stat(path: str) -> tuple:
+    return tuple(_os.stat(current().resolve(path)))[:10]
+
+
+def statvfs(path: str) -> tuple:
+    return (4096, 4096, 212, 150, 150, 0, 0, 0, 0, 255)
+
+
+def mkdir(path: str) -> None:
+    _os.mkdir(current().path(path))
+
+
+def rmdir(path: str) -> None:
+    _os.rmdir(current().path(path))
+
+
+def remove(path: str) -> None:
+    _os.remove(current().path(path))
+
+
+def urandom(size: int) -> bytes:
+    return _os.urandom(size)
+
+
+def rename(old: str, new: str) -> None:
+    _os.rename(current().path(old), current().path(new))
+
+
+def getcwd() -> str:
+    return "/"
+
+
+def sync() -> None:
+    pass
+
+
+def uname() -> tuple:
+    return ("rp2", "rp2", "1.22.0", "v1.22.0", "Raspberry Pi Pico W with RP2040")
@@ -0,0 +1,22 @@
+"""MicroPython's sys module: CPython's, with print_exception and the board's details."""
+
+import sys as _sys
+import traceback
+import types
+
+from sim.hardware import current
+
+platform = "rp2"
+implementation = types.SimpleNamespace(
+    name="micropython", version=(1, 22, 0, ""), _machine="Pico W with RP2040"
+)
+
+
+def print_exception(e: BaseException, file=None) -> None:
+    hardware = current()
+    hardware.exceptions.append(e)
+    hardware.log("".join(traceback.format_exception(e)).rstrip())
+
+
+def __getattr__(name: str):
+    return getattr(_sys, name)
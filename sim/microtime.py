@@ -0,0 +1,62 @@
+"""
+MicroPython's time module on the virtual clock.
+
+Only the device modules get it, in place of CPython's time: MicroPython's
+localtime() and mktime() use 8-tuples without a timezone, and sleeping only
+moves the virtual clock forward.
+"""
+
+import calendar
+import time as _time
+
+from sim.hardware import current
+
+
+def time() -> int:
+    return int(current().system_time())
+
+
+def time_ns() -> int:
+    return int(current().system_time() * 1_000_000_000)
+
+
+def gmtime(secs: float = None) -> tuple:
+    if secs is None:
+        secs = current().system_time()
+    return tuple(_time.gmtime(secs))[:8]
+
+
+# No timezone on the board
+localtime = gmtime
+
+
+def mktime(t: tuple) -> int:
+    return calendar.timegm(tuple(t[:6]))
+
+
+def sleep(seconds: float) -> None:
+    current().advance(seconds)
+
+
+def sleep_ms(ms: int) -> None:
+    current().advance(ms / 1000)
+
+
+def sleep_us(us: int) -> None:
+    current().advance(us / 1_000_000)
+
+
+def ticks_us() -> int:
+    return current().ticks_us()
+
+
+def ticks_ms() -> int:
+    return current().ticks_us() // 1000
+
+
+def ticks_diff(end: int, start: int) -> int:
+    return end - start
+
+
+def ticks_add(ticks: int, delta: int) -> int:
+    return ticks + delta
@@ -0,0 +1,190 @@
+"""Stand-in for Pimoroni's badger2040 module, drawing into a Pen1BitY framebuffer."""
+
+import machine
+import network
+from sim.hardware import (
+    FRAMEBUFFER_SIZE,
+    HEIGHT,
+    UPDATE_FAST,
+    UPDATE_MEDIUM,
+    UPDATE_NORMAL,
+    UPDATE_TURBO,
+    WIDTH,
+    WIFI_FULL_CONNECT_SECONDS,
+    current,
+)
+
+BUTTON_DOWN = 11
+BUTTON_A = 12
+BUTTON_B = 13
+BUTTON_C = 14
+BUTTON_UP = 15
+BUTTON_USER = None
+
+ENABLE_3V3 = 10
+BUSY = 26
+LED = 22
+
+# Width of a glyph of the bitmap fonts at scale 1, spacing included
+FONT_WIDTHS = {"bitmap6": 6, "bitmap8": 8, "bitmap14_outline": 14}
+FONT_HEIGHTS = {"bitmap6": 6, "bitmap8": 8, "bitmap14_outline": 14}
+
+
+def woken_by_button() -> bool:
+    return current().woken_by == "button"
+
+
+def woken_by_rtc() -> bool:
+    return current().woken_by == "rtc"
+
+
+def pressed_to_wake(button) -> bool:
+    return button in current().wake_buttons
+
+
+def reset_pressed_to_wake() -> None:
+    current().wake_buttons.clear()
+
+
+def pressed_to_wake_get_once(button) -> bool:
+    pressed = pressed_to_wake(button)
+    current().wake_buttons.discard(button)
+    return pressed
+
+
+def system_speed(speed) -> None:
+    pass
+
+
+class Badger2040:
+    def __init__(self):
+        # What jpegdec and the raw blits write into: column by column,
+        # HEIGHT // 8 bytes each, top pixel in the most significant bit,
+        # a set bit being white.
+        self.display = bytearray(FRAMEBUFFER_SIZE)
+        self._pen = 0
+        self._font = "bitmap8"
+        self._thickness = 1
+        self._speed = UPDATE_NORMAL
+
+    # Drawing
+
+    def set_pen(self, pen: int) -> None:
+        self._pen = pen
+
+    def set_font(self, font: str) -> None:
+        self._font = font
+
+    def set_thickness(self, thickness: int) -> None:
+        self._thickness = thickness
+
+    def clear(self) -> None:
+        value = 0xFF if self._white() else 0x00
+        self.display[:] = bytes([value]) * FRAMEBUFFER_SIZE
+
+    def pixel(self, x: int, y: int) -> None:
+        if 0 <= x < WIDTH and 0 <= y < HEIGHT:
+            index = (x * HEIGHT + y) // 8
+            bit = 0x80 >> (y % 8)
+            if self._white():
+                self.display[index] |= bit
+            else:
+                self.display[index] &= ~bit
+
+    def rectangle(self, x: int, y: int, w: int, h: int) -> None:
+        for column in range(max(0, x), min(WIDTH, x + w)):
+            for row in range(max(0, y), min(HEIGHT, y + h)):
+                self.pixel(column, row)
+
+    def line(self, x1: int, y1: int, x2: int, y2: int, thickness: int = 1) -> None:
+        steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+        for i in range(steps + 1):
+            x = x1 + (x2 - x1) * i // steps
+            y = y1 + (y2 - y1) * i // steps
+            self.rectangle(x, y, thickness, thickness)
+
+    def measure_text(self, text: str, scale: float = 2, spacing: int = 1) -> int:
+        return int(len(text) * FONT_WIDTHS.get(self._font, 8) * scale)
+
+    def text(
+        self,
+        text: str,
+        x: int,
+        y: int,
+        wordwrap: int = WIDTH,
+        scale: float = 2,
+        angle: int = 0,
+        spacing: int = 1,
+    ) -> None:
+        # Glyphs are drawn as blocks, enough to check the layout
+        width = int(FONT_WIDTHS.get(self._font, 8) * scale)
+        height = int(FONT_HEIGHTS.get(self._font, 8) * scale)
+        for i, char in enumerate(text):
+            if not char.isspace():
+                self.rectangle(x + i * width, y, max(1, width - 1), height)
+
+    def image(self, data, w: int, h: int, x: int, y: int) -> None:
+        # 1 bit per pixel, row by row, a set bit being black
+        for row in range(h):
+            for column in range(w):
+                index = row * w + column
+                if data[index // 8] & (0x80 >> (index % 8)):
+                    self.pixel(x + column, y + row)
+
+    def _white(self) -> bool:
+        return self._pen >= 8
+
+    # Panel
+
+    def set_update_speed(self, speed: int) -> None:
+        self._speed = speed
+
+    def update(self) -> None:
+        hardware = current()
+        hardware.panel[:] = self.display
+        hardware.refresh(self._speed)
+
+    def partial_update(self, x: int, y: int, w: int, h: int) -> None:
+        if y % 8 or h % 8:
+            raise ValueError("y and h must be multiples of 8")
+        hardware = current()
+        for column in range(max(0, x), min(WIDTH, x + w)):
+            start = (column * HEIGHT + y) // 8
+            end = start + h // 8
+            hardware.panel[start:end] = self.display[start:end]
+        hardware.refresh(self._speed, (x, y, w, h))
+
+    # Board
+
+    def led(self, brightness: int) -> None:
+        pass
+
+    def invert(self, invert: bool) -> None:
+        pass
+
+    def pressed(self, button) -> bool:
+        return button in current().held()
+
+    def pressed_any(self) -> bool:
+        return bool(current().held())
+
+    def keepalive(self) -> None:
+        pass
+
+    def halt(self) -> None:
+        machine.Pin(ENABLE_3V3, machine.Pin.OUT).off()
+
+    def connect(self, **args) -> None:
+        """Full Wi-Fi connection: scan, association and DHCP."""
+        hardware = current()
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+        hardware.advance(WIFI_FULL_CONNECT_SECONDS)
+        hardware.wifi_connects.append("full")
+        wlan.join(hardware.access_points[0][1])
+
+    def isconnected(self) -> bool:
+        return network.WLAN(network.STA_IF).isconnected()
+
+    def ip_address(self) -> str:
+        return network.WLAN(network.STA_IF).ifconfig()[0]
@@ -0,0 +1,104 @@
+"""Stand-in for Pimoroni's badger_os module, keeping app state on the flash."""
+
+import json
+import os
+
+from sim.hardware import HEIGHT, WIDTH, current
+
+# Battery voltage range shown as 0-100%
+BATTERY_EMPTY_MV = 3000
+BATTERY_FULL_MV = 4200
+
+
+def get_battery_level() -> int:
+    level = (current().battery_mv - BATTERY_EMPTY_MV) * 100
+    return max(0, min(100, level // (BATTERY_FULL_MV - BATTERY_EMPTY_MV)))
+
+
+def get_disk_usage():
+    hardware = current()
+    used = sum(
+        path.stat().st_size for path in hardware.flash_dir.rglob("*") if path.is_file()
+    )
+    total = 848 * 1024
+    used_percent = used * 100 / total
+    return 100 - used_percent, used_percent, total - used
+
+
+def state_load(app: str, defaults: dict) -> bool:
+    try:
+        with open(f"/state/{app}.json") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            defaults.update(data)
+            return True
+    except (OSError, ValueError):
+        pass
+    state_save(app, defaults)
+    return False
+
+
+def state_save(app: str, data: dict) -> None:
+    try:
+        os.stat("/state")
+    except OSError:
+        os.mkdir("/state")
+    with open(f"/state/{app}.json", "w") as f:
+        f.write(json.dumps(data))
+
+
+def state_modify(app: str, data: dict) -> None:
+    state = {}
+    state_load(app, state)
+    state.update(data)
+    state_save(app, state)
+
+
+def state_delete(app: str) -> None:
+    try:
+        os.remove(f"/state/{app}.json")
+    except OSError:
+        pass
+
+
+def state_app():
+    state = {"running": "launcher"}
+    state_load("launcher", state)
+    return state["running"]
+
+
+def state_set_running(app: str) -> None:
+    state_modify("launcher", {"running": app})
+
+
+def state_clear_running() -> bool:
+    running = state_app() != "launcher"
+    state_set_running("launcher")
+    return running
+
+
+def state_launch() -> None:
+    app = state_app()
+    if app is not None and app != "launcher":
+        launch(f"/apps/{app}")
+
+
+def launch(file: str) -> None:
+    state_set_running(file.rsplit("/", 1)[-1])
+    __import__(file)
+
+
+def warning(
+    display,
+    message,
+    width=WIDTH - 20,
+    height=HEIGHT - 20,
+    line_spacing=20,
+    text_size=0.6,
+):
+    current().warnings.append(message)
+    display.set_pen(15)
+    display.rectangle((WIDTH - width) // 2, (HEIGHT - height) // 2, width, height)
+    display.set_pen(0)
+    display.text(message, (WIDTH - width) // 2 + 4, (HEIGHT - height) // 2 + 4)
+    display.update()
@@ -0,0 +1,82 @@
+"""
+Stand-in for Pimoroni's jpegdec module. Decodes with Pillow when it's
+installed, else draws a grey placeholder of the picture's size.
+"""
+
+import struct
+
+from sim.hardware import HEIGHT, WIDTH
+
+# Start of frame markers, followed by the picture's height and width
+SOF_MARKERS = {0xC0, 0xC1, 0xC2}
+
+# 2x2 ordered dither of the placeholder's grey
+PLACEHOLDER = ((1, 0), (0, 1))
+
+
+def jpeg_size(data: bytes):
+    """(width, height) of a JPEG picture."""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            raise OSError("Invalid JPEG")
+        marker = data[i + 1]
+        (length,) = struct.unpack_from(">H", data, i + 2)
+        if marker in SOF_MARKERS:
+            height, width = struct.unpack_from(">HH", data, i + 5)
+            return width, height
+        i += 2 + length
+    raise OSError("Invalid JPEG")
+
+
+class JPEG:
+    def __init__(self, framebuffer):
+        self.framebuffer = framebuffer
+        self.data = None
+
+    def open_file(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.data = f.read()
+
+    def open_RAM(self, data) -> None:
+        self.data = bytes(data)
+
+    def get_width(self) -> int:
+        return jpeg_size(self.data)[0]
+
+    def get_height(self) -> int:
+        return jpeg_size(self.data)[1]
+
+    def decode(self, x: int = 0, y: int = 0, scale: int = 0, dither: bool = True):
+        if self.data is None:
+            raise OSError("No JPEG opened")
+        try:
+            import io
+
+            from PIL import Image
+
+            image = Image.open(io.BytesIO(self.data)).convert("1")
+            width, height = image.size
+            pixels = image.load()
+
+            def white(column, row):
+                return pixels[column, row]
+
+        except ImportError:
+            width, height = jpeg_size(self.data)
+
+            def white(column, row):
+                return PLACEHOLDER[row % 2][column % 2]
+
+        for column in range(width):
+            for row in range(height):
+                self._set(x + column, y + row, white(column, row))
+
+    def _set(self, x: int, y: int, white) -> None:
+        if 0 <= x < WIDTH and 0 <= y < HEIGHT:
+            index = (x * HEIGHT + y) // 8
+            bit = 0x80 >> (y % 8)
+            if white:
+                self.framebuffer[index] |= bit
+            else:
+                self.framebuffer[index] &= ~bit
@@ -0,0 +1,74 @@
+"""Stand-in for MicroPython's machine module."""
+
+from sim.hardware import PowerOff, current
+
+ENABLE_3V3 = 10
+# GPIO29 samples VSYS through a 1/3 divider
+VSYS_ADC = 29
+# Pico W VBUS sense, on a GPIO of the Wi-Fi chip
+VBUS_SENSE = "WL_GPIO2"
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, pin, mode: int = IN, pull: int = None, value: int = None):
+        self.pin = pin
+        self.mode = mode
+        self._value = value or 0
+
+    def init(self, mode: int = IN, pull: int = None, value: int = None) -> None:
+        self.mode = mode
+
+    def value(self, value: int = None):
+        if value is None:
+            if self.pin == VBUS_SENSE:
+                return int(current().usb_power)
+            return self._value
+        self._value = value
+        if self.pin == ENABLE_3V3 and not value:
+            hardware = current()
+            if not hardware.usb_power:
+                # Releasing the power latch switches the board off
+                raise PowerOff()
+            hardware.halted.set()
+
+    def on(self) -> None:
+        self.value(1)
+
+    def off(self) -> None:
+        self.value(0)
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read_u16(self) -> int:
+        if self.pin == VSYS_ADC:
+            return min(65535, current().battery_mv * 65535 // (3 * 3300))
+        return 0
+
+
+def reset() -> None:
+    raise PowerOff()
+
+
+def deepsleep(ms: int = None) -> None:
+    raise PowerOff()
+
+
+def lightsleep(ms: int = None) -> None:
+    if ms:
+        current().advance(ms / 1000)
+
+
+def freq(hz: int = None) -> int:
+    return 125_000_000
+
+
+def unique_id() -> bytes:
+    return b"\xe6\x61\x48\x64\xd3\x5f\x99\x34"
@@ -0,0 +1,86 @@
+"""Stand-in for MicroPython's network module, joining the simulated access points."""
+
+from sim.hardware import WIFI_FAST_CONNECT_SECONDS, WIFI_SCAN_SECONDS, current
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+DHCP_IFCONFIG = ("192.168.1.42", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+# The module is loaded again on every boot, so is the interface state
+_state = {"active": False, "bssid": None, "ifconfig": None, "status": STAT_IDLE}
+
+
+class WLAN:
+    def __init__(self, interface: int = STA_IF):
+        self.interface = interface
+
+    def active(self, active: bool = None):
+        if active is None:
+            return _state["active"]
+        _state["active"] = active
+
+    def connect(self, ssid: str, key: str = None, *, bssid=None, channel=None):
+        hardware = current()
+        for ap_ssid, ap_bssid, ap_channel, _ in hardware.access_points:
+            if ap_ssid != ssid or bssid not in (None, ap_bssid):
+                continue
+            if channel not in (None, ap_channel):
+                continue
+            hardware.advance(WIFI_FAST_CONNECT_SECONDS)
+            hardware.wifi_connects.append("fast")
+            self.join(ap_bssid)
+            return
+        _state["status"] = STAT_NO_AP_FOUND
+
+    def join(self, bssid: bytes) -> None:
+        _state["bssid"] = bssid
+        _state["status"] = STAT_GOT_IP
+        if _state["ifconfig"] is None:
+            _state["ifconfig"] = DHCP_IFCONFIG
+
+    def disconnect(self) -> None:
+        _state["bssid"] = None
+        _state["status"] = STAT_IDLE
+
+    def isconnected(self) -> bool:
+        return _state["status"] == STAT_GOT_IP
+
+    def status(self, param: str = None):
+        if param == "rssi":
+            return -60
+        return _state["status"]
+
+    def ifconfig(self, config=None):
+        if config is None:
+            return _state["ifconfig"] or ("0.0.0.0",) * 4
+        _state["ifconfig"] = None if config == "dhcp" else tuple(config)
+
+    def scan(self) -> list:
+        hardware = current()
+        hardware.advance(WIFI_SCAN_SECONDS)
+        return [
+            (ssid.encode(), bssid, channel, rssi, 3, False)
+            for ssid, bssid, channel, rssi in hardware.access_points
+        ]
+
+    def config(self, *args, **kwargs):
+        if args == ("mac",):
+            return b"\x28\xcd\xc1\x00\x00\x01"
+        if args == ("channel",):
+            for _, bssid, channel, _ in current().access_points:
+                if bssid == _state["bssid"]:
+                    return channel
+            return 0
+        if args == ("bssid",):
+            if not current().wlan_reports_bssid:
+                raise ValueError("unknown config param")
+            return _state["bssid"]
+        return None
@@ -0,0 +1,15 @@
+"""Stand-in for MicroPython's ntptime, setting the system clock to true time."""
+
+from sim.hardware import current
+
+host = "pool.ntp.org"
+timeout = 1
+
+
+def time() -> int:
+    return int(current().now)
+
+
+def settime() -> None:
+    current().advance(0.1)
+    current().ntp_synced = True
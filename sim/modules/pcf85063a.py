@@ -0,0 +1,83 @@
+"""Stand-in for Pimoroni's PCF85063A driver, on the battery backed virtual RTC."""
+
+import calendar
+import time
+
+from sim.hardware import current
+
+TIMER_TICK_4096HZ = 0b00
+TIMER_TICK_64HZ = 0b01
+TIMER_TICK_1HZ = 0b10
+TIMER_TICK_1_OVER_60HZ = 0b11
+
+# Seconds per timer tick
+TICK_SECONDS = {
+    TIMER_TICK_4096HZ: 1 / 4096,
+    TIMER_TICK_64HZ: 1 / 64,
+    TIMER_TICK_1HZ: 1,
+    TIMER_TICK_1_OVER_60HZ: 60,
+}
+
+
+class PCF85063A:
+    TIMER_TICK_4096HZ = TIMER_TICK_4096HZ
+    TIMER_TICK_64HZ = TIMER_TICK_64HZ
+    TIMER_TICK_1HZ = TIMER_TICK_1HZ
+    TIMER_TICK_1_OVER_60HZ = TIMER_TICK_1_OVER_60HZ
+
+    def __init__(self, i2c, address: int = 0x51):
+        self.rtc = current().rtc
+
+    def datetime(self, value: tuple = None):
+        """(year, month, day, hour, minute, second, weekday), or set it."""
+        if value is None:
+            tm = time.gmtime(int(self.rtc.timestamp()))
+            return tuple(tm[:7])
+        self.rtc.set_timestamp(calendar.timegm(tuple(value[:6])))
+
+    def reset(self) -> None:
+        self.unset_timer()
+        self.unset_alarm()
+
+    def set_timer(self, ticks: int, ttp: int = TIMER_TICK_1HZ) -> None:
+        if not 0 < ticks <= 255:
+            raise ValueError("ticks out of range: 1-255")
+        self.rtc.start_timer(ticks * TICK_SECONDS[ttp])
+
+    def enable_timer_interrupt(self, enable: bool, clear_flag: bool = True) -> None:
+        self.rtc.timer_enabled = enable
+        if clear_flag:
+            self.rtc.timer_flag = False
+
+    def read_timer_flag(self) -> bool:
+        return self.rtc.timer_flag
+
+    def clear_timer_flag(self) -> None:
+        self.rtc.timer_flag = False
+
+    def unset_timer(self) -> None:
+        self.rtc.timer_enabled = False
+        self.rtc.timer_seconds = None
+
+    def set_alarm(
+        self, second: int = -1, minute: int = -1, hour: int = -1, day: int = -1
+    ) -> None:
+        self.rtc.alarm = tuple(
+            None if value < 0 else value for value in (second, minute, hour, day)
+        )
+
+    def enable_alarm_interrupt(self, enable: bool) -> None:
+        self.rtc.alarm_enabled = enable
+
+    def read_alarm_flag(self) -> bool:
+        return self.rtc.alarm_flag
+
+    def clear_alarm_flag(self) -> None:
+        self.rtc.alarm_flag = False
+
+    def unset_alarm(self) -> None:
+        self.rtc.alarm = None
+        self.rtc.alarm_enabled = False
+
+    def set_clock_output(self, frequency: int) -> None:
+        pass
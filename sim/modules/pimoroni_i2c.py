@@ -0,0 +1,7 @@
+"""Stand-in for Pimoroni's I2C bus, the simulated devices don't need one."""
+
+
+class PimoroniI2C:
+    def __init__(self, sda: int = 4, scl: int = 5, baudrate: int = 400_000):
+        self.sda = sda
+        self.scl = scl
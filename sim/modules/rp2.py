@@ -0,0 +1,5 @@
+"""Stand-in for MicroPython's rp2 module."""
+
+
+def country(code: str = None):
+    return code
@@ -0,0 +1,54 @@
+"""Stand-in for MicroPython's urequests, one connection per request."""
+
+import http.client
+import json as _json
+
+
+class Response:
+    def __init__(self, response: http.client.HTTPResponse):
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = dict(response.getheaders())
+        self.content = response.read()
+
+    @property
+    def text(self) -> str:
+        return self.content.decode()
+
+    def json(self):
+        return _json.loads(self.content)
+
+    def close(self) -> None:
+        pass
+
+
+def request(method, url, data=None, json=None, headers=None, timeout=None):
+    scheme, _, rest = url.partition("://")
+    netloc, slash, path = rest.partition("/")
+    connection_class = (
+        http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    )
+    connection = connection_class(netloc, timeout=timeout)
+    if json is not None:
+        data = _json.dumps(json)
+    try:
+        connection.request(method, slash + path, body=data, headers=headers or {})
+        return Response(connection.getresponse())
+    finally:
+        connection.close()
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
@@ -0,0 +1,37 @@
+"""Dump the panel to a 1 bit PNG, without depending on Pillow."""
+
+import struct
+import zlib
+from pathlib import Path
+
+
+def framebuffer_rows(framebuffer, width: int, height: int) -> list:
+    """Rows of a column-major Pen1BitY framebuffer, packed 8 pixels per byte."""
+    column_bytes = height // 8
+    rows = []
+    for y in range(height):
+        row = bytearray((width + 7) // 8)
+        bit = 0x80 >> (y % 8)
+        for x in range(width):
+            if framebuffer[x * column_bytes + y // 8] & bit:
+                row[x // 8] |= 0x80 >> (x % 8)
+        rows.append(bytes(row))
+    return rows
+
+
+def write_png(path: Path, framebuffer, width: int, height: int) -> None:
+    raw = b"".join(
+        b"\x00" + row for row in framebuffer_rows(framebuffer, width, height)
+    )
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(kind + data) & 0xFFFFFFFF
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    Path(path).write_bytes(
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
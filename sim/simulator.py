@@ -0,0 +1,258 @@
+"""
+Run the device code on CPython, one wake at a time.
+
+Each boot runs main.py from a fresh set of modules, like a cold boot of the
+board: the code in src/ with the stand-ins of modules/ for the firmware,
+and MicroPython flavours of time, gc, sys and os. Device modules live in
+their own registry, never in sys.modules, and see the board's filesystem
+through open() and os: files written on the board go to the flash dir,
+over the code in src/.
+
+A wake ends when the board switches itself off, usually by halt(). The
+simulator then moves the virtual clock to the next RTC interrupt.
+"""
+
+import builtins
+import dataclasses
+import io
+import runpy
+import types
+from pathlib import Path
+
+from sim import hardware as _hardware
+from sim import microgc, microos, microsys, microtime
+from sim.hardware import HEIGHT, WIDTH, Hardware, PowerOff, START_TIME
+from sim.png import write_png
+
+BASE_DIR = Path(__file__).parent.parent
+SRC_DIR = BASE_DIR / "src"
+MODULES_DIR = Path(__file__).parent / "modules"
+IMAGE_WIDTH = 104
+
+# secrets.py of the simulated board, over the defaults of secrets_template.py
+SECRETS = {
+    "SSID": "sim",
+    "PASS": "password",
+    "COUNTRY": "GB",
+    "HA_ACCESS_TOKEN": "token",
+    "HA_PLANT_ID": "plant.aloe_vera",
+    "HA_PLANT_MOISTURE_SENSOR": "sensor.aloe_vera_soil_moisture",
+    "HA_PLANT_TEMPERATURE_SENSOR": "sensor.aloe_vera_temperature",
+    "HA_PLANT_CONDUCTIVITY_SENSOR": "sensor.aloe_vera_conductivity",
+    "HA_PLANT_ILLUMINANCE_SENSOR": "sensor.aloe_vera_illuminance",
+    "HA_PLANT_DLI_SENSOR": "sensor.aloe_vera_dli",
+    "HA_PLANT_MIN_MOISTURE": 15,
+    "HA_PLANT_MAX_MOISTURE": 60,
+    "HA_PLANT_MIN_TEMPERATURE": 10,
+    "HA_PLANT_MAX_TEMPERATURE": 35,
+    "HA_PLANT_MIN_CONDUCTIVITY": 250,
+    "HA_PLANT_MAX_CONDUCTIVITY": 2000,
+    "HA_PLANT_MIN_ILLUMINANCE": 2000,
+    "HA_PLANT_MAX_ILLUMINANCE": 60000,
+    "HA_PLANT_MIN_DLI": 2,
+    "HA_PLANT_MAX_DLI": 12,
+}
+
+# MicroPython modules that exist in CPython with a different API
+MICROPYTHON_MODULES = {
+    "gc": microgc,
+    "os": microos,
+    "sys": microsys,
+    "time": microtime,
+}
+
+
+@dataclasses.dataclass
+class Wake:
+    """What happened during a wake, from power on to power off."""
+
+    woken_by: str
+    # Virtual seconds the board was on
+    seconds: float
+    refreshes: list
+    wifi_connects: list
+    warnings: list
+    exceptions: list
+    console: list
+
+    @property
+    def refresh_seconds(self) -> float:
+        return sum(seconds for _, _, seconds in self.refreshes)
+
+    @property
+    def output(self) -> str:
+        return "\n".join(self.console)
+
+
+class Simulator:
+    def __init__(
+        self,
+        flash_dir: Path,
+        secrets: dict = None,
+        *,
+        start: float = START_TIME,
+        battery_mv: int = 4000,
+        rtc_drift_ppm: float = 0,
+        code_dir: Path = SRC_DIR,
+        echo: bool = False,
+    ):
+        self.hardware = Hardware(
+            flash_dir,
+            code_dir,
+            start,
+            battery_mv=battery_mv,
+            rtc_drift_ppm=rtc_drift_ppm,
+        )
+        self.hardware.echo = echo
+        self.hardware.flash_dir.mkdir(parents=True, exist_ok=True)
+        self.provision_image()
+        template = runpy.run_path(str(SRC_DIR / "secrets_template.py"))
+        self.secrets = {
+            name: value for name, value in template.items() if name.isupper()
+        }
+        self.secrets.update(SECRETS)
+        self.secrets.update(secrets or {})
+
+        self.modules = {}
+        self.builtins = dict(vars(builtins))
+        self.builtins.update(
+            __import__=self._import, open=self._open, print=self._print
+        )
+        self._code = {}
+
+    def provision_image(self, index: int = 0) -> None:
+        """Write a placeholder picture of a plant, like download_image would."""
+        name = "plant" if not index else f"plant-{index}"
+        path = self.hardware.path(f"/images/{name}.bin")
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Diagonal stripes, packed like the framebuffer: 16 bytes a column
+        path.write_bytes(
+            bytes(
+                0xF0 if (x // 8 + row + index) % 2 else 0x0F
+                for x in range(IMAGE_WIDTH)
+                for row in range(HEIGHT // 8)
+            )
+        )
+
+    # Wakes
+
+    def launch(self, app: str = "plant") -> Wake:
+        """Start an app as if picked in the launcher, and run it until it halts."""
+        self.hardware.path("/state").mkdir(parents=True, exist_ok=True)
+        self.hardware.path("/state/launcher.json").write_text(
+            f'{{"page": 0, "running": "{app}"}}'
+        )
+        return self.boot("button")
+
+    def boot(self, woken_by: str = "rtc") -> Wake:
+        """Power the board on and run main.py until the board switches off."""
+        hardware = self.hardware
+        hardware.power_on(woken_by)
+        start = hardware.now
+        secrets = types.ModuleType("secrets")
+        vars(secrets).update(self.secrets)
+        self.modules = {"secrets": secrets, **MICROPYTHON_MODULES}
+
+        _hardware.set_current(hardware)
+        try:
+            self._import("main")
+        except PowerOff:
+            pass
+        else:
+            raise RuntimeError("main.py returned without switching the board off")
+        finally:
+            _hardware.set_current(None)
+
+        return Wake(
+            woken_by=woken_by,
+            seconds=hardware.now - start,
+            refreshes=hardware.refreshes,
+            wifi_connects=hardware.wifi_connects,
+            warnings=hardware.warnings,
+            exceptions=hardware.exceptions,
+            console=hardware.console,
+        )
+
+    def press(self, *buttons) -> Wake:
+        """Wake the board up by pressing buttons, badger2040.BUTTON_* pins."""
+        self.hardware.press(buttons)
+        try:
+            return self.boot("button")
+        finally:
+            self.hardware.pressed = set()
+
+    def sleep(self) -> float:
+        """Sleep until the RTC wakes the board, return the seconds slept."""
+        return self.hardware.sleep_until_wake()
+
+    def run(self, wakes: int):
+        """Sleep and wake the board up again, wakes times, yielding each Wake."""
+        for _ in range(wakes):
+            slept = self.sleep()
+            yield slept, self.boot("rtc")
+
+    def screenshot(self, path: Path) -> None:
+        """Save what the panel shows as a PNG."""
+        write_png(path, self.hardware.panel, WIDTH, HEIGHT)
+
+    # Device Python
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0:
+            if name in self.modules:
+                return self.modules[name]
+            path = self._find(name)
+            if path is not None:
+                return self._load(name, path)
+        return builtins.__import__(name, globals, locals, fromlist, level)
+
+    def _find(self, name: str):
+        """Host path of a device module, None if it's a CPython one."""
+        if name.startswith("/"):
+            # badger_os.launch imports apps by path
+            candidates = [self.hardware.resolve(name + ".py")]
+        elif "." in name:
+            return None
+        else:
+            # Like sys.path on the board: "", ".frozen" and "/lib"
+            candidates = [
+                self.hardware.resolve(f"/{name}.py"),
+                MODULES_DIR / f"{name}.py",
+                self.hardware.resolve(f"/lib/{name}.py"),
+            ]
+        for path in candidates:
+            if path.is_file():
+                return path
+        return None
+
+    def _load(self, name: str, path: Path) -> types.ModuleType:
+        module = types.ModuleType(name)
+        module.__file__ = str(path)
+        module.__builtins__ = self.builtins
+        self.modules[name] = module
+        key = (path, path.stat().st_mtime_ns)
+        if key not in self._code:
+            self._code[key] = compile(path.read_text(), str(path), "exec")
+        try:
+            exec(self._code[key], vars(module))
+        except Exception:
+            del self.modules[name]
+            raise
+        return module
+
+    def _open(self, file, mode="r", *args, **kwargs):
+        if isinstance(file, str):
+            writing = any(flag in mode for flag in "wax+")
+            path = self.hardware.path(file) if writing else self.hardware.resolve(file)
+            return open(path, mode, *args, **kwargs)
+        return open(file, mode, *args, **kwargs)
+
+    def _print(self, *args, sep=" ", end="\n", file=None, flush=False):
+        if file is not None:
+            print(*args, sep=sep, end=end, file=file, flush=flush)
+            return
+        out = io.StringIO()
+        print(*args, sep=sep, end="", file=out)
+        self.hardware.log(out.getvalue())
@@ -3,3 +3,4 @@ import secrets
 SSID = secrets.SSID
 PSK = secrets.PASS
 COUNTRY = secrets.COUNTRY
+FAST_CONNECT = getattr(secrets, "WIFI_FAST_CONNECT", True)
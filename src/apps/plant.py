@@ -1,20 +1,64 @@
-import urequests
+import gc
+
+# Free heap before this app's modules are loaded, reported by `inv boot-stats`
+BOOT_STATS = {"start_mem_free": gc.mem_free()}
+
+import binascii
 import jpegdec
+import machine
+import os
 import sys
+import time
 
+import badger2040
 from badger2040 import (
+    BUTTON_DOWN,
+    BUTTON_UP,
     WIDTH,
+    HEIGHT,
     UPDATE_NORMAL,
     UPDATE_MEDIUM,
     UPDATE_FAST,
 )
 from badger_with_clock import Badger2040
-from badger_os import get_battery_level, warning
+from badger_os import (
+    get_battery_level,
+    state_delete,
+    state_load,
+    state_save,
+    warning,
+)
 
+import history
+import plantrecord
+import power
+import profiler
+import scheduler
 import secrets
+from compat import const, ticks_ms
 from dst import fix_dst
-from secrets import HA_BASE_URL, HA_ACCESS_TOKEN
+from ha import (
+    HAError,
+    close_connection,
+    fetch_entities,
+    receive_state_change,
+    subscribe_states,
+)
+from httpclient import HTTPConnection
+from screen import align, digest, dirty_regions, quantize
+
+# Collect the garbage between the phases of a wake, and sooner while they
+# run, so that the heap doesn't fill up and fragment
+LOW_HEAP = getattr(secrets, "LOW_HEAP", False)
+if LOW_HEAP:
+    gc.collect()
+    gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+
+BOOT_STATS["imported_mem_free"] = gc.mem_free()
+BOOT_STATS["imported_ms"] = ticks_ms()
 
+# Prints what's fetched and drawn when set, like ha._DEBUG
+_DEBUG = const(0)
 
 display = Badger2040()
 display.led(128)
@@ -29,35 +73,79 @@ IMAGE_WIDTH = 104
 LINE_START_OFFSET = IMAGE_WIDTH + 8
 STATUS_VALUE_OFFSET = IMAGE_WIDTH + 25
 
-
-class HAError(Exception):
-    pass
-
-
-class HAFetchStateError(HAError):
-    pass
-
-
-def fetch_state(entity: str) -> dict:
-    headers = {
-        "Authorization": f"Bearer {HA_ACCESS_TOKEN}",
-        "content-type": "application/json",
-    }
-    url = f"{HA_BASE_URL}/states/{entity}"
-    print("Fetching state from", url)
-    res = urequests.get(url, headers=headers)
-    if res.status_code != 200:
-        msg = f"Error fetching state for {entity}: {res.text}"
-        raise HAFetchStateError(msg)
-    data = res.json()
-    res.close()
-    del data["context"]
-    print(data)
-    return data
+GAUGES = (
+    ("H", "moisture"),
+    ("T", "temperature"),
+    ("C", "conductivity"),
+    ("L", "illuminance"),
+    ("D", "dli"),
+)
+# Settings of the entity of each key fetched for a plant, the plant and its
+# moisture first: only they are fetched when the battery is nearly empty
+ENTITIES = (
+    ("plant", "HA_PLANT_ID"),
+    ("moisture", "HA_PLANT_MOISTURE_SENSOR"),
+    ("illuminance", "HA_PLANT_ILLUMINANCE_SENSOR"),
+    ("temperature", "HA_PLANT_TEMPERATURE_SENSOR"),
+    ("conductivity", "HA_PLANT_CONDUCTIVITY_SENSOR"),
+    ("dli", "HA_PLANT_DLI_SENSOR"),
+)
+GAUGES_Y_OFFSET = 28
+GAUGES_SPACING = 20
+GAUGE_WIDTH = WIDTH - STATUS_VALUE_OFFSET - 5
+GAUGE_HEIGHT = 10
+GAUGE_BORDER = 1
+
+# Paths of the first plant, see indexed() for the others
+IMAGE_PATH = "/images/plant.jpg"
+IMAGE_RAW_PATH = "/images/plant.bin"
+HISTORY_PATH = "/state/plant_history.bin"
+SCREEN_STATE = "plant_screen"
+# Last fetched states, redrawn when a fetch fails
+CACHE_STATE = "plant_cache"
+# Plant shown by a badge with several of them
+PAGE_STATE = "plant_page"
+# Framebuffer of each plant's page, flipped through with the up and down
+# buttons, and the screen regions each page was drawn with
+PAGES_PATH = "/state/plant_pages.bin"
+PAGES_STATE = "plant_pages"
+FRAMEBUFFER_SIZE = WIDTH * HEIGHT // 8
+# Gateway records are read into this instead of a new buffer for each
+RECORD_BUFFER = bytearray(
+    plantrecord.HEADER_SIZE
+    + plantrecord.NAME_SIZE
+    + len(plantrecord.ATTRIBUTES) * plantrecord.GAUGE_SIZE
+)
+# Consecutive failed wakes, for the retry backoff
+ERRORS_STATE = "plant_errors"
+# Battery measures of the power governor
+POWER_STATE = "plant_power"
+# Pico W VBUS sense, high on USB power
+VBUS_SENSE = "WL_GPIO2"
+# Live mode checks the power and buttons this often, in seconds
+LIVE_POLL_SECONDS = 0.25
+# Changes drawn at once at most, in a burst that doesn't calm down
+LIVE_MAX_CHANGES = 16
+SCHEDULE_STATE_PATH = "/state/plant_schedule.bin"
+PROFILE_PATH = "/state/profile.bin"
+BOOT_STATE = "plant_boot"
+BATTERY_STEP = 5
+
+# Screen regions that can be refreshed on their own
+REGIONS = {
+    "header": align(0, 0, WIDTH, 20),
+    "image": align(0, 0, IMAGE_WIDTH, HEIGHT),
+}
+for i, (_, attribute) in enumerate(GAUGES):
+    y = GAUGES_Y_OFFSET + i * GAUGES_SPACING
+    REGIONS[attribute] = align(IMAGE_WIDTH, y, WIDTH - IMAGE_WIDTH, GAUGE_HEIGHT + 2)
 
 
 class HAPlant:
-    def __init__(self):
+    def __init__(self, config: dict, index: int = 0):
+        # HA_PLANT_* settings of the plant, see plant_configs()
+        self.config = config
+        self.index = index
         self.plant_state = None
         # Example state
         # {
@@ -93,91 +181,255 @@ class HAPlant:
         #   "last_changed": "2023-03-10T13:58:08.838316+00:00",
         #   "last_updated": "2023-03-10T13:58:08.838316+00:00",
         # }
+        # Bar fills and thresholds computed by the gateway, by attribute
+        self.fills = {}
+        self.bounds = {}
+        # Resolved once, plants are kept for the whole run of the app
+        self.config_bounds = {
+            attribute: thresholds(attribute, config) for _, attribute in GAUGES
+        }
+        # (key, entity_id) of the plant and its sensors, the keys prefixed by
+        # the plant's index so that all plants share a batch
+        prefix = str(index) + "."
+        self.entities = [(prefix + key, config[name]) for key, name in ENTITIES]
 
     def get_plant_attribute(self, attribute):
-        return self.plant_state.get("attributes", {}).get(attribute, None)
+        # No attributes once the plant is removed or renamed
+        return (self.plant_state.get("attributes") or {}).get(attribute, None)
 
     def get_detailed_state(self, attribute):
         return self.details.get(attribute, {}).get("state", None)
 
-    def fetch_states(self) -> None:
-        self.plant_state = fetch_state(secrets.HA_PLANT_ID)
-        self.details["moisture"] = fetch_state(secrets.HA_PLANT_MOISTURE_SENSOR)
-        self.details["illuminance"] = fetch_state(secrets.HA_PLANT_ILLUMINANCE_SENSOR)
-        self.details["temperature"] = fetch_state(secrets.HA_PLANT_TEMPERATURE_SENSOR)
-        self.details["conductivity"] = fetch_state(secrets.HA_PLANT_CONDUCTIVITY_SENSOR)
-        self.details["dli"] = fetch_state(secrets.HA_PLANT_DLI_SENSOR)
-        print(self.details)
-
-    def display_state(self):
+    def set_states(self, states: dict) -> None:
+        """Set the fetched states, keyed like self.entities."""
+        self.details = {}
+        for (key, _), (prefixed, _) in zip(ENTITIES, self.entities):
+            # Sensors left out to save battery are unknown
+            self.details[key] = states.get(prefixed, {})
+        self.plant_state = self.details.pop("plant")
+        self.fills = {}
+        self.bounds = {}
+        if _DEBUG:
+            print(self.details)
+
+    def update_state(self, key: str, state: dict) -> None:
+        """Set a state pushed by Home Assistant, keyed like ENTITIES."""
+        if key == "plant":
+            self.plant_state = state
+        else:
+            self.details[key] = state
+            # The gateway's fill is the previous value's
+            self.fills.pop(key, None)
+
+    def fetch_record(self, connection: HTTPConnection, board_id: str) -> None:
+        """Get the plant's record from the gateway."""
+        width = GAUGE_WIDTH - GAUGE_BORDER * 2
+        path = f"/records/{board_id}?plant={self.index}&width={width}"
+        with profiler.phase("fetch_state"):
+            res = connection.get(path)
+            try:
+                if res.status_code != 200:
+                    raise ValueError(f"Gateway error: {res.text}")
+                size = res.read_body(RECORD_BUFFER)
+            finally:
+                res.close()
+            record = plantrecord.unpack(memoryview(RECORD_BUFFER)[:size])
+
+        self.plant_state = {"attributes": {"friendly_name": record["name"]}}
+        self.details = {}
+        self.fills = {}
+        self.bounds = {}
+        for attribute, (value, fill, bounds) in record["gauges"].items():
+            self.details[attribute] = {"state": value}
+            if bounds is not None:
+                self.fills[attribute] = fill
+                self.bounds[attribute] = bounds
+        if _DEBUG:
+            print(record)
+
+    def record_history(self) -> None:
+        """Append the sensor values of this wake to the history."""
+        values = [self.gauge_value(attribute) for _, attribute in GAUGES]
+        interval = getattr(secrets, "HISTORY_INTERVAL_MINUTES", 60) * 60
+        try:
+            plant_history(self).append(display.timestamp(), values, interval)
+        except OSError as e:
+            print("Couldn't save history:", e)
+
+    def cached_state(self) -> dict:
+        return {
+            "plant_state": self.plant_state,
+            "details": self.details,
+            "fills": self.fills,
+            "bounds": self.bounds,
+        }
+
+    def load_cached_state(self, cache: dict) -> None:
+        self.plant_state = cache["plant_state"]
+        self.details = cache.get("details", {})
+        self.fills = cache.get("fills", {})
+        self.bounds = cache.get("bounds", {})
+
+    def screen(self, stale: bool = False):
+        """
+        What the plant's page is drawn from: (header, gauges, sparklines,
+        regions), regions being the digest of each screen region.
+        stale marks the header clock, for states that couldn't be updated.
+        """
+        header = header_texts(self.get_plant_attribute("friendly_name"), stale)
+        sparklines = getattr(secrets, "GAUGE_STYLE", "bar") == "sparkline"
+        if sparklines:
+            series = plant_history(self).series(GAUGE_WIDTH)
+            gauges = [
+                (
+                    label,
+                    sparkline_points(samples)
+                    if self.gauge_thresholds(attribute)
+                    else None,
+                )
+                for (label, attribute), samples in zip(GAUGES, series)
+            ]
+        else:
+            gauges = [
+                (label, self.gauge_fill(attribute)) for label, attribute in GAUGES
+            ]
+
+        hour, minute = get_time()
+        clock_bucket = (hour * 60 + minute) // getattr(
+            secrets, "CLOCK_REFRESH_MINUTES", 180
+        )
+        regions = [
+            ("header", digest(header[0], header[2], clock_bucket, stale)),
+            ("image", digest(image_stamp(self.index))),
+        ]
+        for (_, attribute), gauge in zip(GAUGES, gauges):
+            regions.append((attribute, digest(gauge)))
+        return header, gauges, sparklines, regions
+
+    def display_state(self, force_refresh: bool = True, stale: bool = False):
+        """
+        Draw the plant, only refreshing what changed unless force_refresh.
+        Return the digests of the screen regions.
+        """
+        header, gauges, sparklines, regions = self.screen(stale)
+
+        # Skip the refresh when the screen would look the same
+        previous = load_screen_state()
+        dirty = dirty_regions(regions, previous["regions"])
+        saved = dict(regions)
+        if power_profile >= power.LOW and not force_refresh and "image" in dirty:
+            # A new picture waits for a refresh done anyway
+            dirty.remove("image")
+            saved["image"] = previous["regions"].get("image")
+        if not force_refresh and not dirty:
+            print("Screen unchanged, skipping refresh")
+            return regions
+
+        # Partial updates leave some ghosting, clear it from time to time,
+        # unless saving battery
+        full_refresh = (
+            force_refresh
+            or len(dirty) == len(regions)
+            or previous["partials"] >= getattr(secrets, "FULL_REFRESH_EVERY", 10)
+            and power_profile < power.LOW
+        )
+
+        # The header is drawn over the top of the picture
+        image = full_refresh or "image" in dirty or "header" in dirty
+        self.draw(header, gauges, sparklines, image)
+
+        if full_refresh:
+            if power_profile >= power.SAVING:
+                display.set_update_speed(UPDATE_FAST)
+            else:
+                display.set_update_speed(UPDATE_MEDIUM)
+            with profiler.phase("update"):
+                display.update()
+            partials = 0
+        else:
+            print("Refreshing", dirty)
+            display.set_update_speed(UPDATE_FAST)
+            for name in dirty:
+                with profiler.phase("update"):
+                    display.partial_update(*REGIONS[name])
+            partials = previous["partials"] + 1
+        save_screen_state({"regions": saved, "partials": partials})
+        return regions
+
+    def draw(self, header, gauges, sparklines: bool, image: bool = True) -> None:
+        """Draw the page into the framebuffer, the picture only if image."""
         display.set_pen(WHITE)
         display.clear()
 
-        display_image()
+        if image:
+            with profiler.phase("display_image"):
+                display_image(self.index)
 
         # Write text in header
-        display_header(self.get_plant_attribute("friendly_name"))
+        display_header(*header)
 
         # Display status
-        y_offset = 28
-        lines_spacing = 20
-        lines = [
-            ("H", "moisture"),
-            ("T", "temperature"),
-            ("C", "conductivity"),
-            ("L", "illuminance"),
-            ("D", "dli"),
-        ]
-        for line in lines:
-            self.bar(line[0], line[1], y_offset)
-            y_offset += lines_spacing
-
+        y_offset = GAUGES_Y_OFFSET
+        for label, gauge in gauges:
+            with profiler.phase("bar"):
+                if sparklines:
+                    self.sparkline(label, gauge, y_offset)
+                else:
+                    self.bar(label, gauge, y_offset)
+            y_offset += GAUGES_SPACING
         display.set_pen(BLACK)
-        display.set_update_speed(UPDATE_MEDIUM)
-        display.update()
 
-    def bar(self, label: str, attribute: str, y_offset: int) -> None:
-        print(f"Displaying {attribute} bar")
+    def gauge_value(self, attribute: str):
+        """Sensor value of a gauge, None if unknown."""
+        try:
+            return float(self.get_detailed_state(attribute))
+        except (TypeError, ValueError):
+            return None
+
+    def gauge_thresholds(self, attribute: str):
+        """(min, max) thresholds of a gauge, from the gateway if it has them."""
+        if attribute in self.bounds:
+            return self.bounds[attribute]
+        return self.config_bounds[attribute]
+
+    def gauge_fill(self, attribute: str):
+        """Width in pixels of the filled part of a gauge, None if unknown."""
+        if attribute in self.fills:
+            return self.fills[attribute]
+        value = self.gauge_value(attribute)
+        bounds = self.gauge_thresholds(attribute)
+        if value is None or bounds is None:
+            return None
+        min_value, max_value = bounds
+
+        if value < min_value:
+            value = min_value
+        elif value > max_value:
+            value = max_value
+
+        percentage = (value - min_value) / (max_value - min_value)
+        return int((GAUGE_WIDTH - GAUGE_BORDER * 2) * percentage)
+
+    def bar(self, label: str, fill, y_offset: int) -> None:
+        if _DEBUG:
+            print("Displaying", label, "bar")
 
         display.set_pen(BLACK)
         display.set_font("bitmap6")
         display.text(label, LINE_START_OFFSET, y_offset)
 
-        width = WIDTH - STATUS_VALUE_OFFSET - 5
-        gauge_border = 1
-        height = 10
+        if fill is None:
+            return
 
         external_x = STATUS_VALUE_OFFSET
         external_y = y_offset + 2
-        external_width = width
-        external_height = height
-
-        internal_x = external_x + gauge_border
-        internal_y = external_y + gauge_border
-        internal_width = external_width - gauge_border * 2
-        internal_height = external_height - gauge_border * 2
-
-        # Prepare value & thresholds
-        state = self.get_detailed_state(attribute)
-        try:
-            value = float(state)
-        except ValueError:
-            return
+        external_width = GAUGE_WIDTH
+        external_height = GAUGE_HEIGHT
 
-        min_value = getattr(secrets, "HA_PLANT_MIN_" + attribute.upper(), -1)
-        max_value = getattr(secrets, "HA_PLANT_MAX_" + attribute.upper(), -1)
-
-        if min_value == -1 or max_value == -1:
-            return
-        elif max_value < min_value:
-            min_value, max_value = max_value, min_value
-        elif min_value == max_value:
-            max_value = min_value + 100
-
-        if value < min_value:
-            value = min_value
-        elif value > max_value:
-            value = max_value
+        internal_x = external_x + GAUGE_BORDER
+        internal_y = external_y + GAUGE_BORDER
+        internal_width = external_width - GAUGE_BORDER * 2
+        internal_height = external_height - GAUGE_BORDER * 2
 
         # Display contour
         display.set_pen(BLACK)
@@ -186,62 +438,545 @@ class HAPlant:
         display.rectangle(internal_x, internal_y, internal_width, internal_height)
 
         # Fill bar
-        percentage = (value - min_value) / (max_value - min_value)
-        bar_width = int(internal_width * percentage)
         display.set_pen(BLACK)
-        display.rectangle(internal_x, internal_y, bar_width, internal_height)
+        display.rectangle(internal_x, internal_y, fill, internal_height)
+
+    def sparkline(self, label: str, points, y_offset: int) -> None:
+        if _DEBUG:
+            print("Displaying", label, "sparkline")
+
+        display.set_pen(BLACK)
+        display.set_font("bitmap6")
+        display.text(label, LINE_START_OFFSET, y_offset)
+
+        if not points:
+            return
+
+        # Newest sample on the right edge, one pixel per sample
+        x = STATUS_VALUE_OFFSET + GAUGE_WIDTH - len(points)
+        y = y_offset + 2
+        previous = None
+        for point in points:
+            if point is not None:
+                if previous is None:
+                    display.pixel(x, y + point)
+                else:
+                    display.line(x - 1, y + previous, x, y + point)
+            previous = point
+            x += 1
+
+
+def sparkline_points(samples) -> tuple:
+    """Height of each history sample in a gauge, from the top, None if unknown."""
+    bottom = GAUGE_HEIGHT - 1
+    return tuple(
+        None if sample == history.UNKNOWN else bottom - sample * bottom // history.SCALE
+        for sample in samples
+    )
+
+
+def plant_history(plant: HAPlant):
+    return history.History(
+        indexed(HISTORY_PATH, plant.index),
+        [plant.gauge_thresholds(attribute) for _, attribute in GAUGES],
+        getattr(secrets, "HISTORY_SAMPLES", 7 * 24),
+    )
+
+
+def plant_configs() -> list:
+    """
+    HA_PLANT_* settings of each plant: HA_PLANTS, else the top-level ones
+    of a badge with a single plant.
+    """
+    plants = getattr(secrets, "HA_PLANTS", None)
+    if plants:
+        return plants
+    config = {}
+    for name in dir(secrets):
+        if name.startswith("HA_PLANT_"):
+            config[name] = getattr(secrets, name)
+    return [config]
+
+
+def indexed(path: str, index: int) -> str:
+    """Path of a plant's file, numbered after the first plant's."""
+    if not index:
+        return path
+    base, dot, extension = path.rpartition(".")
+    return f"{base}-{index}{dot}{extension}"
+
+
+def thresholds(attribute: str, config: dict):
+    """(min, max) thresholds of a gauge, None if they aren't configured."""
+    min_value = config.get("HA_PLANT_MIN_" + attribute.upper(), -1)
+    max_value = config.get("HA_PLANT_MAX_" + attribute.upper(), -1)
+
+    if min_value == -1 or max_value == -1:
+        return None
+    elif max_value < min_value:
+        min_value, max_value = max_value, min_value
+    elif min_value == max_value:
+        max_value = min_value + 100
+    return min_value, max_value
+
+
+def next_refresh_minutes(plants: list) -> int:
+    base = secrets.REFRESH_INTERVAL_MINUTES
+    if not getattr(secrets, "ADAPTIVE_REFRESH", True):
+        return base
+
+    # The sensors of all plants, the first one to need a refresh wins
+    values = [
+        plant.gauge_value(attribute) for plant in plants for _, attribute in GAUGES
+    ]
+    now = display.timestamp()
+    previous, elapsed = None, 0
+    saved = scheduler.load(SCHEDULE_STATE_PATH)
+    if saved is not None:
+        elapsed = (now - saved[0]) / 60
+        previous = saved[1]
+
+    minutes = scheduler.next_interval(
+        previous,
+        values,
+        elapsed,
+        [
+            plant.gauge_thresholds(attribute)
+            for plant in plants
+            for _, attribute in GAUGES
+        ],
+        base,
+        getattr(secrets, "REFRESH_MIN_MINUTES", 15),
+        getattr(secrets, "REFRESH_MAX_MINUTES", 720),
+    )
+    try:
+        scheduler.save(SCHEDULE_STATE_PATH, now, values)
+    except OSError as e:
+        print("Couldn't save schedule state:", e)
+    minutes *= power.STRETCH[power_profile]
+    print("Next refresh in", minutes, "minutes")
+    return minutes
+
+
+def update_power_profile() -> int:
+    """Power profile of this wake, see power.py."""
+    state = {}
+    state_load(POWER_STATE, state)
+    profile = power.update(
+        state,
+        display.timestamp(),
+        get_battery_level(),
+        getattr(secrets, "POWER_THRESHOLDS", power.THRESHOLDS),
+        getattr(secrets, "POWER_TREND_HOURS", 24),
+    )
+    state_save(POWER_STATE, state)
+    if profile != power.NORMAL:
+        print("Power profile:", power.NAMES[profile])
+    return profile
 
 
 def main():
-    display.connect()
-    display.set_clocks()
+    global woken_by_timer, power_profile, shown_cached
+    if getattr(secrets, "PROFILE", True):
+        profiler.start(PROFILE_PATH, display.battery_mv())
+    connected = False
 
     # Call halt in a loop, on battery this switches off power.
     # On USB, the app will exit when A+C is pressed because the launcher picks that up.
     while True:
-        display.rtc.clear_timer_flag()
-        fetch_and_display()
-        display.set_timer_minutes_with_jitter(secrets.REFRESH_INTERVAL_MINUTES)
+        # Only timer wakes may skip an unchanged screen: when launched or
+        # woken by a button, something else may have been drawn over it.
+        woken_by_timer = display.woken_by_rtc()
+        if not woken_by_timer and flip_page(len(PLANTS)):
+            # No fetch, the RTC keeps counting down to the next one
+            profiler.flush()
+            print("Halting")
+            display.halt()
+            continue
+
+        # Before connecting, the battery is measured on a pin the Wi-Fi shares
+        power_profile = update_power_profile()
+        shown_cached = False
+        if not woken_by_timer and display_cached(stale=False):
+            # Something shows at once, the fetch then only refreshes the
+            # regions that changed since it was cached
+            shown_cached = True
+        if not connected:
+            with profiler.phase("connect"):
+                display.connect()
+            max_error = getattr(secrets, "CLOCK_MAX_ERROR_SECONDS", 30)
+            max_interval = getattr(secrets, "CLOCK_SYNC_INTERVAL_HOURS", 24) * 60 * 60
+            if power_profile >= power.LOW:
+                # Only sync a clock that looks unset
+                max_error = max_interval = 1 << 30
+            with profiler.phase("set_clocks"):
+                display.set_clocks(max_error=max_error, max_interval=max_interval)
+            connected = True
+        display.clear_rtc_flags()
+        collect()
+        fetch_and_display(PLANTS, force_refresh=not (woken_by_timer or shown_cached))
+        state_delete(ERRORS_STATE)
+        if getattr(secrets, "LIVE_MODE", True) and on_external_power():
+            show_live(PLANTS)
+        display.set_timer_minutes_with_jitter(next_refresh_minutes(PLANTS))
+        profiler.flush()
         print("Halting")
         display.halt()
 
 
-def fetch_and_display():
-    plant = HAPlant()
-    plant.fetch_states()
-    plant.display_state()
+def fetch_plants(plants: list) -> None:
+    """
+    Fetch the states of every plant in one session, from the gateway if
+    set, else from Home Assistant.
+    """
+    if getattr(secrets, "GATEWAY_URL", ""):
+        board_id = binascii.hexlify(machine.unique_id()).decode()
+        print("Fetching records of", board_id, "from the gateway")
+        connection = HTTPConnection(secrets.GATEWAY_URL)
+        try:
+            for plant in plants:
+                plant.fetch_record(connection, board_id)
+            return
+        except (OSError, ValueError) as e:
+            print("Gateway failed, fetching from Home Assistant:", e)
+        finally:
+            connection.close()
+
+    # A single batch for all plants, with only the plant and its moisture
+    # when the battery is nearly empty
+    count = 2 if power_profile >= power.CRITICAL else len(ENTITIES)
+    entities = [entity for plant in plants for entity in plant.entities[:count]]
+    batch = getattr(secrets, "HA_BATCH_FETCH", True)
+    try:
+        states = fetch_entities(entities, batch=batch)
+    finally:
+        close_connection()
+    for plant in plants:
+        plant.set_states(states)
+
+
+def fetch_and_display(plants: list, force_refresh: bool = True) -> None:
+    fetch_plants(plants)
+    if "first_fetch_ms" not in BOOT_STATS:
+        save_boot_stats()
+    display_plants(plants, plants, force_refresh)
+
+
+def display_plants(plants: list, updated: list, force_refresh: bool) -> None:
+    """
+    Record the history of the updated plants, then draw the current page
+    and pre-render the others.
+    """
+    # The sensors that weren't fetched would leave gaps
+    if getattr(secrets, "HISTORY_SAMPLES", 7 * 24) and power_profile < power.CRITICAL:
+        for plant in updated:
+            plant.record_history()
+
+    collect()
+    page = load_page(len(plants))
+    regions = plants[page].display_state(force_refresh)
+    # After the refresh, so that it isn't delayed by the other pages
+    if prerender_pages(plants, page, regions):
+        save_cache(plants)
+
+
+def on_external_power() -> bool:
+    return bool(machine.Pin(VBUS_SENSE, machine.Pin.IN).value())
+
+
+def show_live(plants: list) -> None:
+    """
+    Draw the state changes of the plants' entities as Home Assistant pushes
+    them, until the board is back on battery or a button is pressed. Changes
+    coming in a burst are drawn at once, after LIVE_COALESCE_SECONDS without
+    any. The screen is also redrawn every REFRESH_INTERVAL_MINUTES, for the
+    clock.
+    """
+    targets = {}
+    for plant in plants:
+        for (key, _), (_, entity) in zip(ENTITIES, plant.entities):
+            targets[entity] = (plant, key)
+    try:
+        ws = subscribe_states(list(targets))
+    except (HAError, OSError, ValueError, KeyError) as e:
+        print("Live mode unavailable:", e)
+        return
+
+    print("Live mode")
+    coalesce = getattr(secrets, "LIVE_COALESCE_SECONDS", 2)
+    interval = secrets.REFRESH_INTERVAL_MINUTES * 60
+    drawn = display.timestamp()
+    updated = []
+    changes = 0
+    try:
+        while on_external_power() and not display.pressed_any():
+            change = receive_state_change(
+                ws, coalesce if changes else LIVE_POLL_SECONDS
+            )
+            if change is not None:
+                entity, state = change
+                if entity in targets:
+                    plant, key = targets[entity]
+                    plant.update_state(key, state)
+                    if plant not in updated:
+                        updated.append(plant)
+                    changes += 1
+                if changes < LIVE_MAX_CHANGES:
+                    continue
+            if changes or display.timestamp() - drawn >= interval:
+                print("Drawing", changes, "changes")
+                display_plants(plants, updated, force_refresh=False)
+                drawn = display.timestamp()
+                updated = []
+                changes = 0
+    except (HAError, OSError, ValueError, KeyError) as e:
+        print("Live mode stopped:", e)
+    finally:
+        ws.close()
+    if changes:
+        display_plants(plants, updated, force_refresh=False)
+
+
+def collect() -> None:
+    """Free the garbage of the last phases in low-heap mode."""
+    if LOW_HEAP:
+        gc.collect()
+
+
+def load_page(count: int) -> int:
+    state = {"page": 0}
+    state_load(PAGE_STATE, state)
+    return state["page"] if state["page"] < count else 0
+
+
+def prerender_pages(plants: list, page: int, regions: list) -> bool:
+    """
+    Draw each plant's page into PAGES_PATH for the up and down buttons,
+    skipping the pages that look like when last drawn. With a single plant
+    nothing is drawn. Return whether any page changed.
+    """
+    pages = {"regions": []}
+    state_load(PAGES_STATE, pages)
+    saved = pages["regions"][: len(plants)]
+    saved += [None] * (len(plants) - len(saved))
+
+    changed = False
+    f = None
+    try:
+        for plant in plants:
+            if plant.index == page:
+                screen = None
+                page_regions = dict(regions)
+            else:
+                screen = plant.screen()
+                page_regions = dict(screen[3])
+            if saved[plant.index] == page_regions:
+                continue
+            changed = True
+            saved[plant.index] = page_regions
+            if len(plants) == 1:
+                continue
+
+            print("Pre-rendering page", plant.index)
+            if screen is None:
+                screen = plant.screen()
+            plant.draw(*screen[:3])
+            if f is None:
+                f = open_pages_file(len(plants))
+            f.seek(plant.index * FRAMEBUFFER_SIZE)
+            f.write(display.display)
+    finally:
+        if f is not None:
+            f.close()
+
+    if changed:
+        state_save(PAGES_STATE, {"regions": saved})
+    return changed
+
+
+def open_pages_file(count: int):
+    try:
+        f = open(PAGES_PATH, "r+b")
+    except OSError:
+        f = open(PAGES_PATH, "w+b")
+    # Grow it to hold every page, pages are written in place
+    f.seek(0, 2)
+    missing = count * FRAMEBUFFER_SIZE - f.tell()
+    if missing > 0:
+        f.write(bytes(missing))
+    return f
+
+
+def flip_page(count: int) -> bool:
+    """
+    Move to the next or previous plant when woken by the down or up
+    button. Return whether it was shown from its pre-rendered page, else it
+    needs to be fetched and drawn.
+    """
+    if count < 2:
+        return False
+    # The wake latches are only read once: on USB the app keeps running
+    # through halt(), and later wakes may be for other buttons
+    down = badger2040.pressed_to_wake_get_once(BUTTON_DOWN)
+    up = badger2040.pressed_to_wake_get_once(BUTTON_UP)
+    step = 0
+    if down or display.pressed(BUTTON_DOWN):
+        step = 1
+    elif up or display.pressed(BUTTON_UP):
+        step = -1
+    if not step:
+        return False
+    # Else halt() returns at once on USB, and the page flips again
+    while display.pressed_any():
+        time.sleep(0.01)
+
+    page = (load_page(count) + step) % count
+    state_save(PAGE_STATE, {"page": page})
+    pages = {"regions": []}
+    state_load(PAGES_STATE, pages)
+    if page >= len(pages["regions"]) or not pages["regions"][page]:
+        return False
+    try:
+        with open(PAGES_PATH, "rb") as f:
+            f.seek(page * FRAMEBUFFER_SIZE)
+            if f.readinto(display.display) != FRAMEBUFFER_SIZE:
+                return False
+    except OSError:
+        return False
+
+    print("Showing page", page)
+    display.set_update_speed(UPDATE_FAST)
+    with profiler.phase("update"):
+        display.partial_update(0, 0, WIDTH, HEIGHT)
+    previous = load_screen_state()
+    save_screen_state(
+        {"regions": pages["regions"][page], "partials": previous["partials"] + 1}
+    )
+    return True
+
+
+def save_cache(plants: list) -> None:
+    state_save(CACHE_STATE, {"plants": [plant.cached_state() for plant in plants]})
+
+
+def display_cached(stale: bool = True) -> bool:
+    """
+    Redraw the last fetched state, marked as stale unless it's about to be
+    updated. False if there's none.
+    """
+    cache = {"plants": []}
+    state_load(CACHE_STATE, cache)
+    page = load_page(len(PLANTS))
+    if page >= len(cache["plants"]):
+        return False
+    plant = PLANTS[page]
+    print("Displaying cached state")
+    try:
+        plant.load_cached_state(cache["plants"][page])
+        plant.display_state(
+            force_refresh=not (woken_by_timer or shown_cached), stale=stale
+        )
+    except Exception as e:
+        sys.print_exception(e)
+        return False
+    return True
+
 
+def error_backoff_minutes() -> int:
+    """Minutes until the next retry, doubling with each failed wake."""
+    errors = {"failures": 0}
+    state_load(ERRORS_STATE, errors)
+    errors["failures"] += 1
+    state_save(ERRORS_STATE, errors)
+    return scheduler.backoff(
+        errors["failures"],
+        secrets.ERROR_REFRESH_INTERVAL_MINUTES,
+        getattr(secrets, "ERROR_REFRESH_MAX_MINUTES", 240),
+    )
 
-def display_image():
+
+def save_boot_stats():
+    # ticks_ms counts from power on, every wake on battery is a cold boot
+    BOOT_STATS["first_fetch_ms"] = ticks_ms()
+    BOOT_STATS["first_fetch_mem_free"] = gc.mem_free()
+    state_save(BOOT_STATE, BOOT_STATS)
+
+
+def display_image(index: int = 0):
     # Display image
     display.clear()
-    jpeg.open_file("/images/plant.jpg")
-    jpeg.decode(0, 0)
+    try:
+        blit_raw_image(indexed(IMAGE_RAW_PATH, index))
+    except (OSError, TypeError, ValueError) as e:
+        print("Raw image unavailable, decoding JPEG:", e)
+        jpeg.open_file(indexed(IMAGE_PATH, index))
+        jpeg.decode(0, 0)
+
+
+def blit_raw_image(path: str = IMAGE_RAW_PATH):
+    # The framebuffer stores the panel column by column, HEIGHT // 8 bytes
+    # each. The picture covers the first IMAGE_WIDTH columns entirely, so
+    # the pre-rendered file is read straight into the start of it.
+    size = IMAGE_WIDTH * HEIGHT // 8
+    if os.stat(path)[6] != size:
+        raise ValueError("Unexpected raw image size")
+    framebuffer = memoryview(display.display)
+    with open(path, "rb") as f:
+        f.readinto(framebuffer[:size])
+
+
+def image_stamp(index: int = 0):
+    # Size and mtime, so that a newly provisioned picture gets redrawn
+    try:
+        return os.stat(indexed(IMAGE_PATH, index))[6:9]
+    except OSError:
+        return None
 
 
-def display_header(text):
-    # Draw the page header
-    display.set_pen(BLACK)
-    display.rectangle(0, 0, WIDTH, 20)
+def load_screen_state():
+    state = {"regions": {}, "partials": 0}
+    state_load(SCREEN_STATE, state)
+    return state
 
-    # Write text in header
+
+def save_screen_state(state):
+    state_save(SCREEN_STATE, state)
+
+
+def header_texts(text, stale: bool = False):
+    # A null friendly name, from the template or an entity removed
+    text = text or ""
     if len(text) > 15:
         text = text.split(" ")[0]
         if len(text) > 15:
             text = text[:14] + "."
+
+    hour, minute = get_time()
+    time = f"{hour:02d}:{minute:02d}"
+    if stale:
+        time = "! " + time
+
+    # Quantized so that small fluctuations don't trigger a refresh
+    battery_level = quantize(get_battery_level(), BATTERY_STEP)
+    battery = f"{battery_level}%"
+    return text[:16], time, battery
+
+
+def display_header(text, time, battery):
+    # Draw the page header
+    display.set_pen(BLACK)
+    display.rectangle(0, 0, WIDTH, 20)
+
+    # Write text in header
     display.set_font("bitmap6")
     display.set_pen(WHITE)
-    display.text(text[:16], 3, 4)
+    display.text(text, 3, 4)
 
     # Display time
-    hour, minute = get_time()
-    time = f"{hour:02d}:{minute:02d}"
     time_offset = display.measure_text(time) + 3
     display.text(time, WIDTH - time_offset, 4)
 
     # display battery level
-    battery_level = get_battery_level()
-    battery = f"{battery_level}%"
     battery_offset = display.measure_text(battery) + 15
     display.text(battery, WIDTH - time_offset - battery_offset, 4)
 
@@ -250,11 +985,25 @@ def get_time():
     return fix_dst(*display.rtc.datetime())
 
 
+# Built once, their settings don't change while the app runs
+PLANTS = [HAPlant(config, index) for index, config in enumerate(plant_configs())]
+# Set by main(), errors before it's known are only timer wakes if a flag is set
+woken_by_timer = False
+power_profile = power.NORMAL
+# Whether this wake drew the cached state already, see main()
+shown_cached = False
+
 while True:
     try:
         main()
     except Exception as e:
         sys.print_exception(e)
-        warning(display, str(e))
-        display.set_timer_minutes_with_jitter(secrets.ERROR_REFRESH_INTERVAL_MINUTES)
+        woken_by_timer = woken_by_timer or display.woken_by_rtc()
+        minutes = error_backoff_minutes()
+        print("Retrying in", minutes, "minutes")
+        if not display_cached():
+            # The warning replaces the plant screen, redraw it on next success
+            save_screen_state({"regions": {}, "partials": 0})
+            warning(display, str(e))
+        display.set_timer_minutes_with_jitter(minutes)
         display.halt()
@@ -0,0 +1,62 @@
+"""
+Clock synchronisation policy.
+
+The RTC keeps running while the board is off, so NTP is only needed once
+its estimated error exceeds a bound. The drift of the RTC crystal is
+measured between two syncs, in parts per million, positive when the RTC
+runs fast.
+"""
+
+# PCF85063A crystal tolerance, assumed until the drift has been measured
+DEFAULT_DRIFT_PPM = 20
+# Both clocks have a 1 second resolution: over shorter periods that's more
+# than the drift itself (±14 ppm over 20 hours, ±278 ppm over an hour).
+# Daily syncs are still measured.
+MIN_DRIFT_PERIOD = 20 * 60 * 60
+# Measures beyond a crystal's tolerance, say after the RTC was set by hand,
+# are clamped to it
+MAX_DRIFT_PPM = 100
+MIN_VALID_YEAR = 2023
+
+
+def valid_time(year: int) -> bool:
+    """Whether the RTC looks like it has been set."""
+    return year >= MIN_VALID_YEAR
+
+
+def estimated_error(now: int, last_sync: int, drift_ppm) -> float:
+    """Seconds the RTC may have drifted since the last sync."""
+    if drift_ppm is None:
+        drift_ppm = DEFAULT_DRIFT_PPM
+    return (now - last_sync) * abs(drift_ppm) / 1_000_000
+
+
+def needs_sync(
+    now: int, last_sync, drift_ppm, max_error: float, max_interval: int
+) -> bool:
+    if last_sync is None or now < last_sync:
+        return True
+    if now - last_sync >= max_interval:
+        return True
+    return estimated_error(now, last_sync, drift_ppm) > max_error
+
+
+def measure_drift(rtc_now: int, ntp_now: int, last_sync, previous_ppm):
+    """
+    Drift in ppm from the RTC and NTP times read at the same moment,
+    averaged with the previous measurement. None if it can't be measured.
+    """
+    if last_sync is None or ntp_now - last_sync < MIN_DRIFT_PERIOD:
+        return previous_ppm
+    ppm = (rtc_now - ntp_now) * 1_000_000 / (ntp_now - last_sync)
+    ppm = max(-MAX_DRIFT_PPM, min(ppm, MAX_DRIFT_PPM))
+    if previous_ppm is None:
+        return ppm
+    return (previous_ppm + ppm) / 2
+
+
+def rtc_duration(seconds: float, drift_ppm) -> float:
+    """RTC seconds that elapse during the given real seconds."""
+    if drift_ppm is None:
+        return seconds
+    return seconds * (1 + drift_ppm / 1_000_000)
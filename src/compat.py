@@ -0,0 +1,35 @@
+"""Fallbacks for MicroPython builtins, so device modules also run on CPython."""
+
+import time
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff
+except ImportError:
+    # Ticks wrap around like MicroPython's, so they fit the same fields
+    _TICKS_PERIOD = 1 << 30
+
+    def ticks_ms() -> int:
+        return time.monotonic_ns() // 1_000_000 % _TICKS_PERIOD
+
+    def ticks_us() -> int:
+        return time.monotonic_ns() // 1_000 % _TICKS_PERIOD
+
+    def ticks_diff(end: int, start: int) -> int:
+        half = _TICKS_PERIOD // 2
+        return (end - start + half) % _TICKS_PERIOD - half
+
+
+try:
+    from micropython import const
+except ImportError:
+
+    def const(value):
+        return value
+
+
+try:
+    from gc import mem_free
+except ImportError:
+
+    def mem_free() -> int:
+        return 0
@@ -0,0 +1,184 @@
+import io
+import json
+
+import profiler
+import secrets
+from compat import const
+from httpclient import HTTPConnection
+from jsonstream import extract
+from websocket import WebSocket
+
+# Only these fields of a state are kept, the rest of the payload
+# (context, timestamps, other attributes) is skipped while parsing.
+STATE_FIELDS = {
+    "entity_id": None,
+    "state": None,
+    "attributes": {"friendly_name": None},
+}
+# Fields kept of the WebSocket messages: results, and the new state of the
+# entities of state triggers
+MESSAGE_FIELDS = {
+    "id": None,
+    "type": None,
+    "success": None,
+    "event": {"variables": {"trigger": {"entity_id": None, "to_state": STATE_FIELDS}}},
+}
+
+
+# Prints the fetched states when set. A compile-time constant on MicroPython,
+# the prints are left out of the bytecode when it's 0.
+_DEBUG = const(0)
+
+
+class HAError(Exception):
+    pass
+
+
+class HAFetchStateError(HAError):
+    pass
+
+
+# Connection to HA_BASE_URL shared by every request of a wake cycle, and
+# the header lines sent with each of its requests
+_connection = None
+_headers = None
+
+
+def connection() -> HTTPConnection:
+    """Return the connection to Home Assistant, opening it if needed."""
+    global _connection, _headers
+    if _connection is None:
+        _connection = HTTPConnection(secrets.HA_BASE_URL)
+        _headers = (
+            f"Authorization: Bearer {secrets.HA_ACCESS_TOKEN}\r\n"
+            "content-type: application/json\r\n"
+        ).encode()
+    return _connection
+
+
+def close_connection() -> None:
+    """Close the shared connection and print how much it was reused."""
+    global _connection
+    if _connection is not None:
+        print(_connection.stats())
+        _connection.close()
+        _connection = None
+
+
+def fetch_state(entity: str, fields: dict = STATE_FIELDS) -> dict:
+    print("Fetching state of", entity)
+    with profiler.phase("fetch_state"):
+        res = connection().get("/states/" + entity, headers=_headers)
+        if res.status_code != 200:
+            msg = f"Error fetching state for {entity}: {res.text}"
+            res.close()
+            raise HAFetchStateError(msg)
+        try:
+            data = extract(res, fields)
+        finally:
+            res.close()
+    if _DEBUG:
+        print(data)
+    return data
+
+
+def batch_template(entities) -> str:
+    """
+    Build a Home Assistant template rendering the state and friendly name
+    of every (key, entity_id) pair as a single JSON object, keyed by key.
+    """
+    parts = []
+    for key, entity in entities:
+        parts.append(
+            f'"{key}":{{"state":states("{entity}"),'
+            f'"attributes":{{"friendly_name":state_attr("{entity}","friendly_name")}}}}'
+        )
+    return "{{ {" + ",".join(parts) + "} | tojson }}"
+
+
+def fetch_states_batch(entities) -> dict:
+    """Fetch all entities in a single POST to the template endpoint."""
+    print("Fetching", len(entities), "states in one batch")
+    body = json.dumps({"template": batch_template(entities)})
+    with profiler.phase("fetch_batch"):
+        res = connection().post("/template", body, headers=_headers)
+        try:
+            if res.status_code != 200:
+                msg = f"Error rendering batch template: {res.text}"
+                raise HAFetchStateError(msg)
+            # Parsed while streamed, the body is never held whole
+            states = extract(res, {key: STATE_FIELDS for key, _ in entities})
+        finally:
+            res.close()
+
+    for key, entity in entities:
+        states[key]["entity_id"] = entity
+    if _DEBUG:
+        print(states)
+    return states
+
+
+def fetch_entities(entities, batch: bool = True) -> dict:
+    """
+    Fetch the state of every (key, entity_id) pair, keyed by key.
+    Uses a single batched request when possible and falls back to one
+    request per entity if the batch fails.
+    """
+    if batch:
+        try:
+            return fetch_states_batch(entities)
+        except (HAError, OSError, ValueError, KeyError, TypeError) as e:
+            print("Batch fetch failed, falling back to single fetches:", e)
+    states = {}
+    for key, entity in entities:
+        states[key] = fetch_state(entity)
+    return states
+
+
+def subscribe_states(entity_ids) -> WebSocket:
+    """
+    Open a WebSocket to Home Assistant, subscribed to the state changes of
+    entity_ids. See receive_state_change().
+    """
+    ws = WebSocket(secrets.HA_BASE_URL)
+    ws.open("/websocket")
+    try:
+        if _receive(ws).get("type") != "auth_required":
+            raise HAError("Unexpected WebSocket greeting")
+        ws.send(json.dumps({"type": "auth", "access_token": secrets.HA_ACCESS_TOKEN}))
+        if _receive(ws).get("type") != "auth_ok":
+            raise HAError("WebSocket authentication failed")
+        # A state trigger only sends the changes of these entities, unlike
+        # a subscription to all state_changed events
+        trigger = {"platform": "state", "entity_id": list(entity_ids)}
+        ws.send(json.dumps({"id": 1, "type": "subscribe_trigger", "trigger": trigger}))
+        result = _receive(ws)
+        if result.get("type") != "result" or not result.get("success"):
+            raise HAError("WebSocket subscription failed")
+    except BaseException:
+        ws.close()
+        raise
+    print("Subscribed to", len(entity_ids), "entities")
+    return ws
+
+
+def receive_state_change(ws: WebSocket, timeout: float):
+    """
+    (entity_id, state) of the next state change, None if there was none
+    within timeout seconds.
+    """
+    message = _receive(ws, timeout)
+    if message is None or message.get("type") != "event":
+        return None
+    trigger = message["event"]["variables"]["trigger"]
+    state = trigger.get("to_state") or {"state": None}
+    if _DEBUG:
+        print(trigger)
+    return trigger["entity_id"], state
+
+
+def _receive(ws: WebSocket, timeout: float = None):
+    message = ws.receive(timeout)
+    if message is None:
+        return None
+    return extract(io.BytesIO(message), MESSAGE_FIELDS)
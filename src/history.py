@@ -0,0 +1,161 @@
+"""
+Sensor history.
+
+A ring buffer of samples on flash, appended once per wake, with a size
+fixed by its capacity: a header, the (low, high) range of each sensor, then
+one timestamp and one row of 16-bit samples per slot. Samples are quantized
+over their sensor's range, UNKNOWN when the value is missing. Appending
+writes one slot and the header, never the whole file.
+
+The file is recreated when the sensors, their ranges or the capacity
+change, since its samples can't be read with the new ones.
+"""
+
+import struct
+from array import array
+
+MAGIC = b"HIS1"
+# Magic, sensors, capacity, next slot, number of samples
+HEADER = "<4sHHHH"
+HEADER_SIZE = struct.calcsize(HEADER)
+UNKNOWN = 0xFFFF
+SCALE = 0xFFFE
+
+
+def quantize(value, low: float, high: float) -> int:
+    """Sample of value over low..high, clamped, UNKNOWN if value is None."""
+    if value is None or value != value or high <= low:
+        return UNKNOWN
+    value = min(max(value, low), high)
+    return round((value - low) / (high - low) * SCALE)
+
+
+def dequantize(sample: int, low: float, high: float):
+    if sample == UNKNOWN:
+        return None
+    return low + sample * (high - low) / SCALE
+
+
+class History:
+    def __init__(self, path: str, ranges, capacity: int):
+        """ranges has a (low, high) tuple, or None, for each sensor."""
+        self.path = path
+        self.ranges = [r if r is not None else (0.0, 0.0) for r in ranges]
+        self.capacity = capacity
+        self.header_size = HEADER_SIZE + 8 * len(self.ranges)
+
+    def size(self) -> int:
+        """Size of the file in bytes."""
+        return self.header_size + self.capacity * (4 + 2 * len(self.ranges))
+
+    def _header(self, slot: int, count: int) -> bytes:
+        ranges = [bound for r in self.ranges for bound in r]
+        return struct.pack(
+            HEADER + "f" * len(ranges),
+            MAGIC,
+            len(self.ranges),
+            self.capacity,
+            slot,
+            count,
+            *ranges,
+        )
+
+    def _read_header(self, f):
+        """(next slot, count) of the file, None if it doesn't match."""
+        data = f.read(self.header_size)
+        if len(data) != self.header_size:
+            return None
+        expected = self._header(0, 0)
+        if data[:8] != expected[:8] or data[12:] != expected[12:]:
+            return None
+        _, _, _, slot, count = struct.unpack_from(HEADER, data)
+        if slot >= self.capacity or count > self.capacity:
+            return None
+        return slot, count
+
+    def _open(self):
+        """The file open for writing with its (next slot, count)."""
+        try:
+            f = open(self.path, "r+b")
+        except OSError:
+            pass
+        else:
+            header = self._read_header(f)
+            if header is not None:
+                return f, header
+            f.close()
+
+        f = open(self.path, "w+b")
+        f.write(self._header(0, 0))
+        f.write(bytes(4 * self.capacity))
+        row = bytes(2 * len(self.ranges))
+        for _ in range(self.capacity):
+            f.write(row)
+        return f, (0, 0)
+
+    def append(self, timestamp: int, values, min_interval: int = 0) -> None:
+        """
+        Add a sample of each sensor. It replaces the latest one instead if
+        that one was added less than min_interval seconds before, keeping
+        its timestamp.
+        """
+        f, (slot, count) = self._open()
+        with f:
+            if count:
+                latest = (slot - 1) % self.capacity
+                f.seek(self.header_size + 4 * latest)
+                (previous,) = struct.unpack("<I", f.read(4))
+                if 0 <= timestamp - previous < min_interval:
+                    slot, count, timestamp = latest, count - 1, previous
+
+            samples = [
+                quantize(value, low, high)
+                for value, (low, high) in zip(values, self.ranges)
+            ]
+            f.seek(self.header_size + 4 * slot)
+            f.write(struct.pack("<I", timestamp))
+            row_size = 2 * len(self.ranges)
+            f.seek(self.header_size + 4 * self.capacity + row_size * slot)
+            f.write(struct.pack("<" + "H" * len(samples), *samples))
+
+            f.seek(0)
+            next_slot = (slot + 1) % self.capacity
+            f.write(self._header(next_slot, min(count + 1, self.capacity)))
+
+    def load(self):
+        """
+        Return (timestamps, samples, first, count): the slots' timestamps,
+        their rows of samples, the oldest slot and the number of samples.
+        None if there's no history.
+        """
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return None
+        with f:
+            header = self._read_header(f)
+            if header is None:
+                return None
+            slot, count = header
+            # Arrays are in native byte order: little-endian, like the file
+            timestamps = array("I", bytes(4 * self.capacity))
+            samples = array("H", bytes(2 * self.capacity * len(self.ranges)))
+            f.readinto(timestamps)
+            f.readinto(samples)
+        return timestamps, samples, (slot - count) % self.capacity, count
+
+    def series(self, last: int = None) -> list:
+        """
+        List of the samples of each sensor, oldest first, at most the last
+        ones. Empty lists if there's no history.
+        """
+        sensors = len(self.ranges)
+        loaded = self.load()
+        if loaded is None:
+            return [[] for _ in range(sensors)]
+        _, samples, first, count = loaded
+        if last is not None and last < count:
+            first = (first + count - last) % self.capacity
+            count = last
+        slots = [(first + i) % self.capacity * sensors for i in range(count)]
+        return [[samples[slot + sensor] for slot in slots] for sensor in range(sensors)]
@@ -0,0 +1,321 @@
+"""
+Minimal HTTP/1.1 client keeping a single connection alive across requests.
+
+urequests opens a new socket (and a new TLS handshake) for every request.
+HTTPConnection reuses one socket to a base URL for as long as the server
+keeps it open, and transparently reconnects once if the server closed an
+idle connection in between.
+"""
+
+import json
+import socket
+
+from compat import ticks_ms, ticks_diff
+
+_DRAIN_SIZE = 64
+_HEAD_SIZE = 512
+
+# Scratch buffers shared by every connection, so that a request allocates
+# next to nothing: the request head is assembled in _HEAD and bodies are
+# read and drained through _CHUNK.
+_HEAD = bytearray(_HEAD_SIZE)
+_CHUNK = bytearray(_DRAIN_SIZE)
+
+
+class HTTPError(OSError):
+    pass
+
+
+class _ConnectionClosed(HTTPError):
+    pass
+
+
+class HTTPConnection:
+    def __init__(self, base_url: str, timeout: float = 10):
+        scheme, _, rest = base_url.partition("://")
+        if scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {scheme}")
+        netloc, slash, path = rest.partition("/")
+        host, _, port = netloc.partition(":")
+        self.tls = scheme == "https"
+        self.host = host
+        self.port = int(port) if port else (443 if self.tls else 80)
+        self.prefix = slash + path.rstrip("/")
+        self.timeout = timeout
+        # Headers sent with every request, encoded once
+        self.common_headers = f"Host: {host}\r\nConnection: keep-alive\r\n".encode()
+
+        self.sock = None
+        self.stream = None
+        self.response = None
+
+        # Instrumentation
+        self.connects = 0
+        self.requests = 0
+        self.connect_ms = 0
+
+    def _connect(self) -> None:
+        start = ticks_ms()
+        addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(addr)
+            if self.tls:
+                sock = _wrap_tls(sock, self.host)
+        except BaseException:
+            sock.close()
+            raise
+        self.sock = sock
+        # MicroPython sockets are streams already, CPython needs a file object
+        self.stream = sock.makefile("rwb") if hasattr(sock, "makefile") else sock
+        self.connects += 1
+        self.connect_ms += ticks_diff(ticks_ms(), start)
+
+    def close(self) -> None:
+        self.response = None
+        if self.stream is not None and self.stream is not self.sock:
+            self.stream.close()
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.stream = None
+
+    def request(
+        self, method: str, path: str, body: bytes = None, headers: dict = None
+    ) -> "Response":
+        """
+        Send a request and return its response. The previous response of
+        this connection is drained first, its body can't be read afterwards.
+        """
+        if self.response is not None:
+            self.response.close()
+        if isinstance(body, str):
+            body = body.encode()
+
+        while True:
+            reused = self.stream is not None
+            if not reused:
+                self._connect()
+            try:
+                self._send(method, path, body, headers)
+                response = Response(self, self.stream)
+                break
+            except _ConnectionClosed:
+                self.close()
+                # The server closed the idle connection since the last
+                # request, nothing was processed: reconnect and send again.
+                if not reused:
+                    raise
+            except BaseException:
+                self.close()
+                raise
+
+        self.requests += 1
+        self.response = response
+        return response
+
+    def get(self, path: str, headers: dict = None) -> "Response":
+        return self.request("GET", path, headers=headers)
+
+    def post(self, path: str, body: bytes, headers: dict = None) -> "Response":
+        return self.request("POST", path, body=body, headers=headers)
+
+    def _send(self, method, path, body, headers) -> None:
+        """
+        Send the request. headers is a dict, or bytes of already formatted
+        header lines.
+        """
+        head = _Head(self.stream)
+        try:
+            head.write(method)
+            head.write(" ")
+            head.write(self.prefix)
+            head.write(path)
+            head.write(" HTTP/1.1\r\n")
+            head.write(self.common_headers)
+            if body is not None:
+                head.write("Content-Length: ")
+                head.write(str(len(body)))
+                head.write("\r\n")
+            if isinstance(headers, dict):
+                for name, value in headers.items():
+                    head.write(f"{name}: {value}\r\n")
+            elif headers:
+                head.write(headers)
+            head.write("\r\n")
+            head.flush()
+            if body:
+                self.stream.write(body)
+            if hasattr(self.stream, "flush"):
+                self.stream.flush()
+        except OSError as e:
+            raise _ConnectionClosed(str(e))
+
+    def stats(self) -> str:
+        saved = self.requests - self.connects
+        return (
+            f"HTTP: {self.requests} requests, {self.connects} connections "
+            f"({saved} handshakes saved), {self.connect_ms} ms connecting"
+        )
+
+
+class _Head:
+    """Request head assembled in _HEAD, written out whenever it's full."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+
+    def write(self, data) -> None:
+        if isinstance(data, str):
+            data = data.encode()
+        end = self.size + len(data)
+        if end > _HEAD_SIZE:
+            self.flush()
+            if len(data) > _HEAD_SIZE:
+                self.stream.write(data)
+                return
+            end = len(data)
+        _HEAD[self.size : end] = data
+        self.size = end
+
+    def flush(self) -> None:
+        if self.size:
+            self.stream.write(memoryview(_HEAD)[: self.size])
+            self.size = 0
+
+
+class Response:
+    def __init__(self, connection: HTTPConnection, stream):
+        self.connection = connection
+        self.stream = stream
+
+        try:
+            status_line = stream.readline()
+        except OSError as e:
+            raise _ConnectionClosed(str(e))
+        if not status_line:
+            raise _ConnectionClosed("Connection closed by server")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise HTTPError(f"Invalid status line: {status_line}")
+        self.status_code = int(parts[1])
+
+        self.headers = {}
+        while True:
+            line = stream.readline()
+            if not line:
+                raise HTTPError("Connection closed in headers")
+            if line in (b"\r\n", b"\n"):
+                break
+            name, _, value = line.decode().partition(":")
+            self.headers[name.strip().lower()] = value.strip()
+
+        self.keep_alive = (
+            parts[0] != b"HTTP/1.0"
+            and self.headers.get("connection", "").lower() != "close"
+        )
+        self.chunked = self.headers.get("transfer-encoding", "").lower() == "chunked"
+        if self.chunked:
+            self.remaining = 0
+        elif "content-length" in self.headers:
+            self.remaining = int(self.headers["content-length"])
+        else:
+            # Body delimited by the server closing the connection
+            self.remaining = -1
+            self.keep_alive = False
+        self.done = self.remaining == 0 and not self.chunked
+
+    def _next_chunk(self) -> None:
+        line = self.stream.readline()
+        if self.remaining == 0 and line in (b"\r\n", b"\n"):
+            # CRLF terminating the previous chunk
+            line = self.stream.readline()
+        if not line:
+            raise HTTPError("Connection closed in chunked body")
+        self.remaining = int(line.split(b";")[0].strip(), 16)
+        if self.remaining == 0:
+            # Skip trailers up to the final empty line
+            while self.stream.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            self.done = True
+
+    def readinto(self, buf) -> int:
+        if self.done:
+            return 0
+        if self.chunked and self.remaining == 0:
+            self._next_chunk()
+            if self.done:
+                return 0
+        size = len(buf)
+        if self.remaining >= 0:
+            size = min(size, self.remaining)
+        read = self.stream.readinto(memoryview(buf)[:size]) or 0
+        if not read:
+            if self.remaining > 0:
+                raise HTTPError("Connection closed in body")
+            self.done = True
+            return 0
+        if self.remaining > 0:
+            self.remaining -= read
+            if self.remaining == 0 and not self.chunked:
+                self.done = True
+        return read
+
+    def read(self, size: int = -1) -> bytes:
+        out = bytearray()
+        while size < 0 or len(out) < size:
+            want = _DRAIN_SIZE if size < 0 else min(_DRAIN_SIZE, size - len(out))
+            read = self.readinto(memoryview(_CHUNK)[:want])
+            if not read:
+                break
+            out.extend(memoryview(_CHUNK)[:read])
+        return bytes(out)
+
+    def read_body(self, buf) -> int:
+        """
+        Read the whole body into the preallocated buf and return its size.
+        Raise ValueError if it doesn't fit.
+        """
+        size = 0
+        view = memoryview(buf)
+        while True:
+            if size == len(buf):
+                if self.readinto(_CHUNK):
+                    raise ValueError("Response body too large")
+                return size
+            read = self.readinto(view[size:])
+            if not read:
+                return size
+            size += read
+
+    @property
+    def text(self) -> str:
+        return self.read().decode()
+
+    def json(self):
+        return json.loads(self.read())
+
+    def close(self) -> None:
+        """Drain the body so the connection can serve the next request."""
+        if self.connection.response is self:
+            self.connection.response = None
+        if not self.keep_alive:
+            self.done = True
+            self.connection.close()
+            return
+        try:
+            while self.readinto(_CHUNK):
+                pass
+        except OSError:
+            self.connection.close()
+
+
+def _wrap_tls(sock, host):
+    import ssl
+
+    if hasattr(ssl, "create_default_context"):
+        # CPython
+        return ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+    return ssl.wrap_socket(sock, server_hostname=host)
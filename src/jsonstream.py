@@ -0,0 +1,221 @@
+"""
+Incremental JSON extraction.
+
+Reads a JSON object from a stream in small chunks and only builds the values
+listed in a field specification, skipping everything else byte by byte.
+Peak memory use depends on the chunk size and the kept values, not on the
+size of the whole document.
+
+A field specification is a dict mapping the keys to keep either to None
+(keep the whole value) or to a nested specification (keep some keys of a
+nested object), e.g.:
+
+    {"state": None, "attributes": {"friendly_name": None}}
+"""
+
+_WHITESPACE = b" \t\n\r"
+_DELIMITERS = b" \t\n\r,]}"
+_ESCAPES = {
+    ord('"'): ord('"'),
+    ord("\\"): ord("\\"),
+    ord("/"): ord("/"),
+    ord("b"): 0x08,
+    ord("f"): 0x0C,
+    ord("n"): 0x0A,
+    ord("r"): 0x0D,
+    ord("t"): 0x09,
+}
+_QUOTE = ord('"')
+_BACKSLASH = ord("\\")
+_COLON = ord(":")
+_COMMA = ord(",")
+_OBJECT_START = ord("{")
+_OBJECT_END = ord("}")
+_ARRAY_START = ord("[")
+_ARRAY_END = ord("]")
+
+
+def extract(stream, fields, chunk_size: int = 64) -> dict:
+    """
+    Parse the JSON object at the start of stream, keeping only the keys
+    described by fields. Stops reading as soon as the object is closed.
+    """
+    reader = _Reader(stream, chunk_size)
+    if reader.next_token() != _OBJECT_START:
+        raise ValueError("Expected a JSON object")
+    return _object(reader, fields)
+
+
+class _Reader:
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.buf = bytearray(chunk_size)
+        self.pos = 0
+        self.end = 0
+
+    def _fill(self):
+        if hasattr(self.stream, "readinto"):
+            self.end = self.stream.readinto(self.buf) or 0
+        else:
+            chunk = self.stream.read(len(self.buf)) or b""
+            self.end = len(chunk)
+            self.buf[: self.end] = chunk
+        self.pos = 0
+        if not self.end:
+            raise ValueError("Unexpected end of JSON stream")
+
+    def next(self) -> int:
+        if self.pos >= self.end:
+            self._fill()
+        char = self.buf[self.pos]
+        self.pos += 1
+        return char
+
+    def peek(self) -> int:
+        if self.pos >= self.end:
+            self._fill()
+        return self.buf[self.pos]
+
+    def next_token(self) -> int:
+        char = self.next()
+        while char in _WHITESPACE:
+            char = self.next()
+        return char
+
+    def peek_token(self) -> int:
+        char = self.peek()
+        while char in _WHITESPACE:
+            self.pos += 1
+            char = self.peek()
+        return char
+
+
+def _object(reader, fields) -> dict:
+    result = {}
+    char = reader.next_token()
+    if char == _OBJECT_END:
+        return result
+    while True:
+        if char != _QUOTE:
+            raise ValueError("Expected an object key")
+        key = _string(reader)
+        if reader.next_token() != _COLON:
+            raise ValueError("Expected ':' after object key")
+        if key in fields:
+            spec = fields[key]
+            if spec is not None and reader.peek_token() == _OBJECT_START:
+                reader.next()
+                result[key] = _object(reader, spec)
+            else:
+                result[key] = _value(reader, reader.next_token())
+        else:
+            _skip(reader, reader.next_token())
+        char = reader.next_token()
+        if char == _OBJECT_END:
+            return result
+        if char != _COMMA:
+            raise ValueError("Expected ',' or '}' in object")
+        char = reader.next_token()
+
+
+def _string(reader) -> str:
+    out = bytearray()
+    while True:
+        char = reader.next()
+        if char == _QUOTE:
+            return out.decode()
+        if char != _BACKSLASH:
+            out.append(char)
+            continue
+        char = reader.next()
+        if char in _ESCAPES:
+            out.append(_ESCAPES[char])
+            continue
+        if char != ord("u"):
+            raise ValueError("Invalid string escape")
+        code = _hex4(reader)
+        if 0xD800 <= code < 0xDC00:
+            # Surrogate pair, the low half must follow as another \u escape
+            if reader.next() != _BACKSLASH or reader.next() != ord("u"):
+                raise ValueError("Invalid surrogate pair")
+            code = 0x10000 + ((code - 0xD800) << 10) + (_hex4(reader) - 0xDC00)
+        out.extend(chr(code).encode())
+
+
+def _hex4(reader) -> int:
+    digits = bytes((reader.next(), reader.next(), reader.next(), reader.next()))
+    return int(digits, 16)
+
+
+def _scalar(reader, char) -> bytes:
+    out = bytearray((char,))
+    while reader.peek() not in _DELIMITERS:
+        out.append(reader.next())
+    return bytes(out)
+
+
+def _value(reader, char):
+    if char == _QUOTE:
+        return _string(reader)
+    if char == _OBJECT_START:
+        return _object(reader, _AllFields())
+    if char == _ARRAY_START:
+        items = []
+        if reader.peek_token() == _ARRAY_END:
+            reader.next()
+            return items
+        while True:
+            items.append(_value(reader, reader.next_token()))
+            char = reader.next_token()
+            if char == _ARRAY_END:
+                return items
+            if char != _COMMA:
+                raise ValueError("Expected ',' or ']' in array")
+    token = _scalar(reader, char)
+    if token == b"null":
+        return None
+    if token == b"true":
+        return True
+    if token == b"false":
+        return False
+    if b"." in token or b"e" in token or b"E" in token:
+        return float(token)
+    return int(token)
+
+
+def _skip(reader, char) -> None:
+    if char == _QUOTE:
+        _skip_string(reader)
+        return
+    if char not in (_OBJECT_START, _ARRAY_START):
+        while reader.peek() not in _DELIMITERS:
+            reader.next()
+        return
+    depth = 1
+    while depth:
+        char = reader.next()
+        if char == _QUOTE:
+            _skip_string(reader)
+        elif char in (_OBJECT_START, _ARRAY_START):
+            depth += 1
+        elif char in (_OBJECT_END, _ARRAY_END):
+            depth -= 1
+
+
+def _skip_string(reader) -> None:
+    while True:
+        char = reader.next()
+        if char == _QUOTE:
+            return
+        if char == _BACKSLASH:
+            reader.next()
+
+
+class _AllFields:
+    """Field specification keeping every key of an object."""
+
+    def __contains__(self, key):
+        return True
+
+    def __getitem__(self, key):
+        return None
@@ -1,12 +1,10 @@
 import gc
-import os
-import time
-import math
 import badger2040
 import badger_os
-import jpegdec
 
 APP_DIR = "/apps"
+# App names and pre-rendered pages, written by `inv update-code`
+INDEX_PATH = "/apps/index.bin"
 FONT_SIZE = 2
 
 changed = False
@@ -25,18 +23,36 @@ else:
     # Otherwise restore previously running app
     badger_os.state_launch()
 
+# Only reached when no app was resumed, keep the imports above to a minimum
+import json  # noqa: E402
+import math  # noqa: E402
+import os  # noqa: E402
+import time  # noqa: E402
 
 display = badger2040.Badger2040()
 display.set_font("bitmap8")
 display.led(128)
 
-jpeg = jpegdec.JPEG(display.display)
+jpeg = None
 
 state = {"page": 0, "running": "launcher"}
 
 badger_os.state_load("launcher", state)
 
-examples = [x[:-3] for x in os.listdir(APP_DIR) if x.endswith(".py")]
+
+def load_index():
+    """Return the app names and the offset of the first page in the index."""
+    with open(INDEX_PATH, "rb") as f:
+        header = f.readline()
+    return json.loads(header)["apps"], len(header)
+
+
+try:
+    examples, index_offset = load_index()
+except (OSError, ValueError, KeyError) as e:
+    print("App index unavailable, listing apps:", e)
+    examples = [x[:-3] for x in os.listdir(APP_DIR) if x.endswith(".py")]
+    index_offset = None
 
 # Approximate center lines for buttons A, B and C
 centers = (41, 147, 253)
@@ -80,9 +96,32 @@ def draw_disk_usage(x):
     display.text("{:.2f}%".format(f_used), x + 91, 4, WIDTH, 1.0)
 
 
+def draw_icons():
+    global jpeg
+    if index_offset is not None:
+        # The page as packed in the display's framebuffer, icons included
+        buffer = memoryview(display.display)
+        with open(INDEX_PATH, "rb") as f:
+            f.seek(index_offset + state["page"] * len(buffer))
+            if f.readinto(buffer) == len(buffer):
+                return
+        display.set_pen(15)
+        display.clear()
+
+    if jpeg is None:
+        import jpegdec
+
+        jpeg = jpegdec.JPEG(display.display)
+    for i in range(min(3, len(examples[(state["page"] * 3) :]))):
+        icon_label = examples[i + (state["page"] * 3)].replace("_", "-")
+        jpeg.open_file(f"{APP_DIR}/icon-{icon_label}.jpg")
+        jpeg.decode(centers[i] - 26, 30)
+
+
 def render():
     display.set_pen(15)
     display.clear()
+    draw_icons()
     display.set_pen(0)
 
     max_icons = min(3, len(examples[(state["page"] * 3) :]))
@@ -90,11 +129,7 @@ def render():
     for i in range(max_icons):
         x = centers[i]
         label = examples[i + (state["page"] * 3)]
-        icon_label = label.replace("_", "-")
-        icon = f"{APP_DIR}/icon-{icon_label}.jpg"
         label = label.replace("_", " ")
-        jpeg.open_file(icon)
-        jpeg.decode(x - 26, 30)
         display.set_pen(0)
         w = display.measure_text(label, FONT_SIZE)
         display.text(label, int(x - (w / 2)), 16 + 80, WIDTH, FONT_SIZE)
@@ -1,3 +1,4 @@
+import binascii
 import time
 import machine
 from pimoroni_i2c import PimoroniI2C
@@ -6,6 +7,13 @@ import ntptime
 import random
 
 import badger2040
+import badger_os
+import clocksync
+
+CLOCK_STATE = "clock"
+WIFI_STATE = "wifi"
+# Renew the DHCP lease with a full connection at least this often
+WIFI_CACHE_MAX_AGE = 24 * 60 * 60
 
 
 class Badger2040(badger2040.Badger2040):
@@ -13,24 +21,87 @@ class Badger2040(badger2040.Badger2040):
         super().__init__()
         i2c = PimoroniI2C(sda=4, scl=5)
         self.rtc = PCF85063A(i2c)
+        self.drift_ppm = None
 
     def halt(self):
         time.sleep(0.05)
         enable = machine.Pin(badger2040.ENABLE_3V3, machine.Pin.OUT)
         enable.off()
-        while not self.pressed_any() and not self.rtc.read_timer_flag():
+        while not self.pressed_any() and not self.woken_by_rtc():
             pass
 
-    def set_clocks(self):
+    def woken_by_rtc(self) -> bool:
+        return self.rtc.read_timer_flag() or self.rtc.read_alarm_flag()
+
+    def clear_rtc_flags(self):
+        self.rtc.clear_timer_flag()
+        self.rtc.clear_alarm_flag()
+
+    def timestamp(self) -> int:
+        """Seconds since the epoch according to the RTC."""
+        year, month, day, hour, minute, second, _ = self.rtc.datetime()
+        return time.mktime((year, month, day, hour, minute, second, 0, 0))
+
+    def battery_mv(self) -> int:
+        """
+        VSYS voltage in mV: the battery's, or about 5 V on USB. Read it before
+        connecting, the ADC pin is shared with the Wi-Fi chip.
+        """
+        # VSYS is divided by 3 on GPIO29, the ADC reference is 3.3 V
+        return machine.ADC(29).read_u16() * 3 * 3300 // 65535
+
+    def set_clocks(self, max_error: float = 30, max_interval: int = 24 * 60 * 60):
+        """
+        Set the RTC from NTP if its estimated error exceeds max_error seconds,
+        the last sync is older than max_interval seconds or it looks unset.
+        """
+        state = {"last_sync": None, "drift_ppm": None}
+        badger_os.state_load(CLOCK_STATE, state)
+        self.drift_ppm = state["drift_ppm"]
+
+        rtc_now = None
+        if clocksync.valid_time(self.rtc.datetime()[0]):
+            rtc_now = self.timestamp()
+            if not clocksync.needs_sync(
+                rtc_now, state["last_sync"], self.drift_ppm, max_error, max_interval
+            ):
+                return
+
         ntptime.settime()
-        now = time.localtime()
-        self.rtc.datetime(now[:7])
+        ntp_now = time.time()
+        if rtc_now is not None:
+            self.drift_ppm = clocksync.measure_drift(
+                rtc_now, ntp_now, state["last_sync"], self.drift_ppm
+            )
+        self.rtc.datetime(time.localtime(ntp_now)[:7])
+        print("Clock synced, RTC drift:", self.drift_ppm, "ppm")
+        badger_os.state_save(
+            CLOCK_STATE, {"last_sync": ntp_now, "drift_ppm": self.drift_ppm}
+        )
 
     def set_timer_minutes(self, minutes: int):
-        """Wake the board in X minutes. Doesn't halt the board."""
-        self.rtc.clear_timer_flag()
-        self.rtc.set_timer(minutes, ttp=PCF85063A.TIMER_TICK_1_OVER_60HZ)
-        self.rtc.enable_timer_interrupt(True)
+        """
+        Wake the board in X minutes. Doesn't halt the board.
+        The timer counts up to 255 minutes, longer delays use the RTC alarm.
+        """
+        self.clear_rtc_flags()
+        # Both count RTC time, correct for its measured drift
+        seconds = round(clocksync.rtc_duration(minutes * 60, self.drift_ppm))
+        if seconds <= 255 * 60:
+            self.rtc.unset_alarm()
+            self.rtc.set_timer(
+                max(1, round(seconds / 60)), ttp=PCF85063A.TIMER_TICK_1_OVER_60HZ
+            )
+            self.rtc.enable_timer_interrupt(True)
+        else:
+            self.rtc.unset_timer()
+            self.set_alarm_seconds(seconds)
+
+    def set_alarm_seconds(self, seconds: int):
+        """Wake the board in X RTC seconds with the alarm, up to a month."""
+        wake = time.localtime(self.timestamp() + seconds)
+        self.rtc.set_alarm(wake[5], wake[4], wake[3], wake[2])
+        self.rtc.enable_alarm_interrupt(True)
 
     def set_timer_minutes_with_jitter(
         self, minutes: int, jitter_percentage: float = 0.1
@@ -43,6 +114,105 @@ class Badger2040(badger2040.Badger2040):
         minutes += random.randint(0, delta)
         self.set_timer_minutes(minutes)
 
+    def connect(self, **args):
+        """
+        Connect to Wi-Fi. First try to join the access point of the last
+        successful connection directly, with its static IP configuration,
+        and only fall back to a full scan, association and DHCP if it fails.
+        """
+        import WIFI_CONFIG
+
+        cache = {}
+        badger_os.state_load(WIFI_STATE, cache)
+
+        start = time.ticks_ms()
+        if getattr(WIFI_CONFIG, "FAST_CONNECT", True) and self.fast_connect(cache):
+            cache["fast_ms"] = time.ticks_diff(time.ticks_ms(), start)
+            print("Fast Wi-Fi connect in", cache["fast_ms"], "ms")
+        else:
+            super().connect(**args)
+            cache["full_ms"] = time.ticks_diff(time.ticks_ms(), start)
+            print("Full Wi-Fi connect in", cache["full_ms"], "ms")
+            self.update_wifi_cache(cache)
+        badger_os.state_save(WIFI_STATE, cache)
+
+    def fast_connect(self, cache: dict, timeout_ms: int = 5000) -> bool:
+        """Join the cached access point with the cached IP configuration."""
+        if "ifconfig" not in cache:
+            return False
+        if self.timestamp() - cache.get("saved_at", 0) > WIFI_CACHE_MAX_AGE:
+            return False
+
+        import network
+        import rp2
+        import WIFI_CONFIG
+
+        rp2.country(WIFI_CONFIG.COUNTRY)
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+        wlan.ifconfig(tuple(cache["ifconfig"]))
+        # Without a BSSID, any access point of the SSID on the cached channel
+        bssid = cache.get("bssid")
+        if bssid is not None:
+            bssid = binascii.unhexlify(bssid)
+        try:
+            wlan.connect(
+                WIFI_CONFIG.SSID, WIFI_CONFIG.PSK, bssid=bssid, channel=cache["channel"]
+            )
+        except TypeError:
+            # Firmware without the channel argument
+            wlan.connect(WIFI_CONFIG.SSID, WIFI_CONFIG.PSK, bssid=bssid)
+
+        start = time.ticks_ms()
+        while time.ticks_diff(time.ticks_ms(), start) < timeout_ms:
+            if wlan.isconnected():
+                return True
+            if wlan.status() < 0:
+                # Wrong password, access point not found or failure
+                break
+            time.sleep_ms(50)
+
+        print("Fast Wi-Fi connect failed, status", wlan.status())
+        wlan.disconnect()
+        try:
+            wlan.ifconfig("dhcp")
+        except (TypeError, ValueError, OSError):
+            pass
+        wlan.active(False)
+        return False
+
+    def update_wifi_cache(self, cache: dict):
+        """
+        Remember the access point and IP configuration in use, as reported by
+        the interface: a scan would cost radio time, and could pick an access
+        point of the SSID other than the one joined.
+        """
+        import network
+
+        wlan = network.WLAN(network.STA_IF)
+        channel = _wlan_config(wlan, "channel")
+        if not channel:
+            # Nothing to join directly, the next wake connects in full
+            cache.pop("ifconfig", None)
+            return
+        bssid = _wlan_config(wlan, "bssid")
+        if bssid:
+            cache["bssid"] = binascii.hexlify(bssid).decode()
+        else:
+            # Firmware that doesn't report it
+            cache.pop("bssid", None)
+        cache["channel"] = channel
+        cache["ifconfig"] = wlan.ifconfig()
+        cache["saved_at"] = self.timestamp()
+
     def status_handler(self, mode, status, ip):
         # Explicitly doing nothing here, to prevent display blinking.
         pass
+
+
+def _wlan_config(wlan, name: str):
+    """Value of a WLAN config parameter, None if the firmware doesn't have it."""
+    try:
+        return wlan.config(name)
+    except (ValueError, TypeError, OSError):
+        return None
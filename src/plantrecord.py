@@ -0,0 +1,73 @@
+"""
+Binary plant record served by the gateway, see gateway.py.
+
+Everything the plant screen is drawn from, computed on the host: the
+plant's friendly name, then for each gauge its sensor value, the width of
+its bar fill and its (min, max) thresholds. Unknown values and thresholds
+are NaN, unknown fills are NO_FILL.
+"""
+
+import struct
+
+MAGIC = b"PR"
+VERSION = 1
+# Magic, version, number of gauges, time of the HA states, name length
+HEADER = "<2sBBIB"
+HEADER_SIZE = struct.calcsize(HEADER)
+# Value, bar fill, min and max thresholds
+GAUGE = "<fBff"
+GAUGE_SIZE = struct.calcsize(GAUGE)
+NAME_SIZE = 32
+NO_FILL = 0xFF
+
+ATTRIBUTES = ("moisture", "temperature", "conductivity", "illuminance", "dli")
+
+_NAN = float("nan")
+
+
+def pack(name: str, updated: int, gauges: dict) -> bytes:
+    """
+    Record of a plant. gauges has a (value, fill, thresholds) tuple for
+    each of ATTRIBUTES, any of them None if unknown.
+    """
+    encoded = name.encode()[:NAME_SIZE].decode("utf-8", "ignore").encode()
+    data = struct.pack(HEADER, MAGIC, VERSION, len(ATTRIBUTES), updated, len(encoded))
+    data += encoded
+    for attribute in ATTRIBUTES:
+        value, fill, bounds = gauges.get(attribute, (None, None, None))
+        low, high = bounds if bounds is not None else (_NAN, _NAN)
+        data += struct.pack(
+            GAUGE,
+            _NAN if value is None else value,
+            NO_FILL if fill is None else fill,
+            low,
+            high,
+        )
+    return data
+
+
+def unpack(data) -> dict:
+    """
+    Fields of a record: name, updated and gauges, with the gauges as
+    (value, fill, thresholds) tuples keyed by attribute.
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Invalid plant record")
+    magic, version, count, updated, name_size = struct.unpack_from(HEADER, data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported plant record")
+    if len(data) != HEADER_SIZE + name_size + count * GAUGE_SIZE:
+        raise ValueError("Invalid plant record")
+
+    offset = HEADER_SIZE + name_size
+    name = str(data[HEADER_SIZE:offset], "utf-8")
+    gauges = {}
+    for attribute in ATTRIBUTES[:count]:
+        value, fill, low, high = struct.unpack_from(GAUGE, data, offset)
+        gauges[attribute] = (
+            None if value != value else value,
+            None if fill == NO_FILL else fill,
+            None if low != low or high != high else (low, high),
+        )
+        offset += GAUGE_SIZE
+    return {"name": name, "updated": updated, "gauges": gauges}
@@ -0,0 +1,66 @@
+"""
+Battery power governor.
+
+Picks how much a wake may do from the battery level and its trend, so that
+a draining badge keeps showing its plants for longer:
+
+- SAVING stretches the refresh interval and refreshes the panel fast,
+- LOW also leaves the picture as it is and skips NTP syncs,
+- CRITICAL also only fetches the plants and their moisture.
+
+The drain rate, in % per hour, is measured over each RATE_STEP % the level
+drops by, since whole % levels can't tell a rate from a wake to the next.
+The level the battery would reach within a horizon at that rate picks the
+profile: a badge draining fast saves sooner. A profile is only left once
+that level is HYSTERESIS % above its threshold, so that a level wavering by
+a step doesn't flip between profiles.
+"""
+
+NORMAL = 0
+SAVING = 1
+LOW = 2
+CRITICAL = 3
+NAMES = ("normal", "saving", "low", "critical")
+
+# Battery levels in % below which SAVING, LOW and CRITICAL start
+THRESHOLDS = (40, 20, 10)
+# Refresh interval multiplier of each profile
+STRETCH = (1, 2, 4, 8)
+HYSTERESIS = 5
+RATE_STEP = 5
+
+
+def update(
+    state: dict, now: int, level: int, thresholds=THRESHOLDS, horizon: float = 24
+) -> int:
+    """
+    Profile of a wake at timestamp now, with the battery at level %.
+    state keeps the measures of the previous wakes, it's updated in place.
+    """
+    # Time and level the current measure of the rate started at
+    since, start = state.get("time"), state.get("level")
+    rate = state.get("rate", 0.0)
+    if since is None or now < since or level >= start + HYSTERESIS:
+        # First wake, clock set back or charging: measure from here
+        rate = 0.0
+        state["time"], state["level"] = now, level
+    elif start - level >= RATE_STEP and now > since:
+        rate = (start - level) * 3600 / (now - since)
+        state["time"], state["level"] = now, level
+    state["rate"] = rate
+
+    projected = level - max(rate, 0) * horizon
+    profile = _profile(projected, thresholds, 0)
+    # Leave a lower profile only once clearly above its threshold
+    recovering = _profile(projected, thresholds, HYSTERESIS)
+    profile = max(profile, min(state.get("profile", NORMAL), recovering))
+    state["profile"] = profile
+    return profile
+
+
+def _profile(level: float, thresholds, margin: int) -> int:
+    profile = NORMAL
+    for threshold in thresholds:
+        if level < threshold + margin:
+            profile += 1
+    return min(profile, CRITICAL)
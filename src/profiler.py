@@ -0,0 +1,152 @@
+"""
+Wake cycle profiler.
+
+Times the phases of a wake cycle and keeps the last records in a fixed-size
+ring buffer on flash, pulled and summarized on the host by `inv profile`.
+
+The file starts with a header (next slot, number of records, wake counter)
+followed by CAPACITY struct-packed records: wake, phase, duration in us,
+free heap in bytes and battery voltage in mV at the start of the wake. The
+free heap of a phase is the lowest of its start and end, its high-water
+mark as far as gc.mem_free() can tell.
+Records are kept in memory during the wake and written at once by flush().
+"""
+
+import struct
+
+from compat import mem_free, ticks_diff, ticks_us
+
+PHASES = (
+    "boot",
+    "connect",
+    "set_clocks",
+    "fetch_state",
+    "fetch_batch",
+    "display_image",
+    "bar",
+    "update",
+)
+CAPACITY = 512
+
+HEADER = "<HHH"
+HEADER_SIZE = struct.calcsize(HEADER)
+RECORD = "<HBIIH"
+RECORD_SIZE = struct.calcsize(RECORD)
+
+
+class Profiler:
+    def __init__(self, path: str, battery_mv: int = 0, capacity: int = CAPACITY):
+        self.path = path
+        self.battery_mv = battery_mv
+        self.capacity = capacity
+        self.records = []
+
+    def record(self, phase: str, duration_us: int, free: int = None) -> None:
+        now_free = mem_free()
+        if free is None or now_free < free:
+            free = now_free
+        self.records.append((PHASES.index(phase), duration_us, free))
+
+    def phase(self, name: str) -> "_Phase":
+        return _Phase(self, name)
+
+    def flush(self) -> None:
+        """Append this wake's records to the ring buffer."""
+        try:
+            f = open(self.path, "r+b")
+        except OSError:
+            f = open(self.path, "w+b")
+            f.write(struct.pack(HEADER, 0, 0, 0))
+            f.write(bytes(self.capacity * RECORD_SIZE))
+        with f:
+            f.seek(0)
+            slot, count, wake = struct.unpack(HEADER, f.read(HEADER_SIZE))
+            wake = (wake + 1) & 0xFFFF
+            for phase, duration_us, free in self.records:
+                f.seek(HEADER_SIZE + slot * RECORD_SIZE)
+                f.write(
+                    struct.pack(RECORD, wake, phase, duration_us, free, self.battery_mv)
+                )
+                slot = (slot + 1) % self.capacity
+                count = min(count + 1, self.capacity)
+            f.seek(0)
+            f.write(struct.pack(HEADER, slot, count, wake))
+        self.records = []
+
+
+class _Phase:
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+        self.free = 0
+
+    def __enter__(self):
+        self.free = mem_free()
+        self.start = ticks_us()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration_us = ticks_diff(ticks_us(), self.start)
+        self.profiler.record(self.name, duration_us, self.free)
+        return False
+
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+# Profiler of the running app, None when profiling is off
+_profiler = None
+
+
+def start(path: str, battery_mv: int = 0, capacity: int = CAPACITY) -> None:
+    """Start profiling, recording the time since power on as the boot phase."""
+    global _profiler
+    _profiler = Profiler(path, battery_mv, capacity)
+    _profiler.record("boot", ticks_us())
+
+
+def phase(name: str):
+    """Context manager timing a phase, doing nothing when profiling is off."""
+    if _profiler is None:
+        return _NO_PHASE
+    return _profiler.phase(name)
+
+
+def flush() -> None:
+    if _profiler is None:
+        return
+    try:
+        _profiler.flush()
+    except OSError as e:
+        print("Couldn't save profile:", e)
+
+
+def read(data: bytes) -> list:
+    """
+    Records of a ring buffer file, oldest first, as (wake, phase,
+    duration_us, mem_free, battery_mv) tuples.
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Invalid profile")
+    slot, count, _ = struct.unpack(HEADER, data[:HEADER_SIZE])
+    capacity = (len(data) - HEADER_SIZE) // RECORD_SIZE
+    if count > capacity or slot >= max(capacity, 1):
+        raise ValueError("Invalid profile")
+
+    records = []
+    first = (slot - count) % capacity if capacity else 0
+    for i in range(count):
+        offset = HEADER_SIZE + (first + i) % capacity * RECORD_SIZE
+        wake, phase, duration_us, free, battery_mv = struct.unpack_from(
+            RECORD, data, offset
+        )
+        records.append((wake, PHASES[phase], duration_us, free, battery_mv))
+    return records
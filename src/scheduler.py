@@ -0,0 +1,110 @@
+"""
+Adaptive refresh interval.
+
+Picks the next wake interval from how fast each sensor moved since the
+previous wake and how close it is to its thresholds: slow changes far from
+the thresholds (at night) stretch the interval, fast changes (watering) or
+values close to a threshold shorten it.
+
+The previous sample is kept in a small struct-packed file: a timestamp in
+seconds followed by one float per sensor, NaN when unknown.
+"""
+
+import struct
+
+NAN = float("nan")
+
+# Values closer than this to a threshold, as a fraction of the
+# min..max range, are refreshed at the base interval at most.
+NEAR_THRESHOLD = 0.1
+# Only wait for half of the estimated time to reach a threshold.
+SAFETY_FACTOR = 0.5
+
+
+def next_interval(
+    previous,
+    current,
+    elapsed: float,
+    thresholds,
+    base: int,
+    minimum: int,
+    maximum: int,
+) -> int:
+    """
+    Minutes until the next refresh.
+
+    previous and current are sequences of sensor values (None or NaN when
+    unknown) taken elapsed minutes apart, thresholds a sequence of
+    (min, max) tuples or None for each sensor.
+    """
+    if previous is None or elapsed <= 0:
+        return _clamp(base, minimum, maximum)
+
+    interval = maximum
+    # Only stretched by sensors whose change could be measured
+    measured = False
+    for before, now, bounds in zip(previous, current, thresholds):
+        if bounds is None or not _known(now):
+            continue
+        low, high = bounds
+        span = high - low
+        if span <= 0:
+            continue
+
+        margin = min(now - low, high - now) / span
+        if margin < NEAR_THRESHOLD:
+            interval = min(interval, base)
+        if margin <= 0 or not _known(before):
+            continue
+
+        measured = True
+        rate = abs(now - before) / span / elapsed
+        if rate > 0:
+            interval = min(interval, margin / rate * SAFETY_FACTOR)
+
+    if not measured:
+        interval = min(interval, base)
+    return _clamp(round(interval), minimum, maximum)
+
+
+def backoff(failures: int, base: int, maximum: int) -> int:
+    """Minutes until the next retry after failures consecutive failures."""
+    # Bounded exponent, the cap is reached long before anyway
+    return min(base * 2 ** min(max(failures - 1, 0), 16), maximum)
+
+
+def _clamp(value: int, minimum: int, maximum: int) -> int:
+    return max(minimum, min(value, maximum))
+
+
+def _known(value) -> bool:
+    # NaN is the only value not equal to itself
+    return value is not None and value == value
+
+
+def pack(timestamp: int, values) -> bytes:
+    values = [NAN if value is None else value for value in values]
+    return struct.pack("<I" + "f" * len(values), timestamp, *values)
+
+
+def unpack(data: bytes) -> tuple:
+    if len(data) < 4 or len(data) % 4:
+        raise ValueError("Invalid schedule state")
+    count = (len(data) - 4) // 4
+    fields = struct.unpack("<I" + "f" * count, data)
+    values = [value if _known(value) else None for value in fields[1:]]
+    return fields[0], values
+
+
+def load(path: str):
+    """Return the (timestamp, values) saved at path, None if there's none."""
+    try:
+        with open(path, "rb") as f:
+            return unpack(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def save(path: str, timestamp: int, values) -> None:
+    with open(path, "wb") as f:
+        f.write(pack(timestamp, values))
@@ -0,0 +1,31 @@
+"""Change detection for the e-ink screen."""
+
+import binascii
+import hashlib
+
+
+def quantize(value: int, step: int) -> int:
+    """Round value to the nearest multiple of step."""
+    return (int(value) + step // 2) // step * step
+
+
+def digest(*inputs) -> str:
+    """Short stable digest of everything a screen is drawn from."""
+    h = hashlib.sha256(repr(inputs).encode())
+    return binascii.hexlify(h.digest()[:8]).decode()
+
+
+def align(x: int, y: int, w: int, h: int) -> tuple:
+    """
+    Grow a rectangle so that y and h are multiples of 8, partial updates
+    work on banks of 8 vertical pixels.
+    """
+    bottom = y + h
+    y -= y % 8
+    bottom += -bottom % 8
+    return x, y, w, bottom - y
+
+
+def dirty_regions(regions, previous: dict) -> list:
+    """Names of the (name, digest) regions whose digest changed."""
+    return [name for name, region in regions if previous.get(name) != region]
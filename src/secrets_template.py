@@ -3,6 +3,8 @@
 SSID = ""
 PASS = ""
 COUNTRY = ""
+# Reconnect to the last access point with a static IP before a full connect
+WIFI_FAST_CONNECT = True
 
 # Home Assistant
 HA_ACCESS_TOKEN = ""
@@ -12,6 +14,78 @@ HA_PLANT_MOISTURE_SENSOR = "sensor.plant_name_moisture"
 HA_PLANT_TEMPERATURE_SENSOR = "sensor.plant_name_temperature"
 HA_PLANT_CONDUCTIVITY_SENSOR = "sensor.plant_name_conductivity"
 HA_PLANT_ILLUMINANCE_SENSOR = "sensor.plant_name_illuminance"
+# Several plants on one badge, flipped through with the up and down buttons:
+# a dict of the HA_PLANT_* settings above for each plant. Written by
+# `inv provision` for boards with a plants list in provisioning.yaml.
+HA_PLANTS = []
+# Fetch all entities in a single request to the template endpoint.
+# Falls back to one request per entity if it fails.
+HA_BATCH_FETCH = True
+# Get everything from the gateway run by `inv gateway`, e.g.
+# "http://192.168.1.2:8124", instead of from Home Assistant. Home Assistant
+# is still used when the gateway can't be reached.
+GATEWAY_URL = ""
 
-REFRESH_INTERVAL_MINUTES = 60  # Max 255
+REFRESH_INTERVAL_MINUTES = 60
+# Stretch or shorten the refresh interval depending on how fast the
+# sensors change and how close they are to their thresholds.
+ADAPTIVE_REFRESH = True
+REFRESH_MIN_MINUTES = 15
+REFRESH_MAX_MINUTES = 720
+# After an error, the last fetched state is shown with a "!" before the
+# clock. Retries wait twice as long after each failure, up to the maximum.
 ERROR_REFRESH_INTERVAL_MINUTES = 30
+ERROR_REFRESH_MAX_MINUTES = 240
+
+# Screen
+# On timer wakes the screen is only refreshed when something changed.
+# The header clock then shows the time of the last refresh: force one
+# when it lags behind by more than this.
+CLOCK_REFRESH_MINUTES = 180
+# When only some regions changed, they are refreshed with a fast partial
+# update. Do a full refresh after this many partial ones to clear ghosting.
+FULL_REFRESH_EVERY = 10
+# Draw the gauges as "bar"s of the current values or "sparkline"s of their
+# history
+GAUGE_STYLE = "bar"
+
+# History
+# Keep a sample of each sensor per wake on flash, at most one every
+# HISTORY_INTERVAL_MINUTES: 7 days of hourly samples take 2.4 KB.
+# 0 turns the history off.
+HISTORY_SAMPLES = 168
+HISTORY_INTERVAL_MINUTES = 60
+
+# Clock
+# Only sync the clock over NTP when the RTC may have drifted by more than
+# this, or at least this often
+CLOCK_MAX_ERROR_SECONDS = 30
+CLOCK_SYNC_INTERVAL_HOURS = 24
+
+# Live mode
+# On USB power, stay connected after a refresh and draw the sensor changes
+# as Home Assistant pushes them over its WebSocket API, until back on battery
+# or a button is pressed. Changes coming in a burst are drawn at once, after
+# this many seconds without any.
+LIVE_MODE = True
+LIVE_COALESCE_SECONDS = 2
+
+# Power
+# Battery levels in % below which a wake does less. Below the first, the
+# refresh interval is stretched and the panel refreshed fast. Below the
+# second, a new picture and NTP syncs wait. Below the third, only the
+# moisture is fetched. Per board in provisioning.yaml, see src/power.py.
+POWER_THRESHOLDS = [40, 20, 10]
+# A battery draining fast saves sooner: the level it would reach within this
+# many hours at its current drain rate is used instead
+POWER_TREND_HOURS = 24
+
+# Memory
+# Low-heap mode: collect the garbage between the phases of a wake and
+# sooner while they run, for boards short on free heap
+LOW_HEAP = False
+
+# Profiling
+# Record how long each phase of a wake takes to /state/profile.bin,
+# summarized by `inv profile`
+PROFILE = True
@@ -0,0 +1,200 @@
+"""
+Minimal WebSocket client (RFC 6455), for Home Assistant's WebSocket API.
+
+Only what a badge needs: text messages both ways, fragmented messages,
+answering pings, and waiting for a message with a timeout. The socket is
+read directly rather than through a stream: CPython's socket files can't
+be read again once a read timed out.
+"""
+
+import binascii
+import errno
+import os
+import socket
+import struct
+
+from httpclient import HTTPError, _wrap_tls
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+_FIN = 0x80
+_MASK = 0x80
+# Messages the badge can keep in memory
+MAX_MESSAGE_SIZE = 16 * 1024
+
+
+class WebSocketClosed(OSError):
+    pass
+
+
+class WebSocket:
+    def __init__(self, base_url: str, timeout: float = 10):
+        scheme, _, rest = base_url.partition("://")
+        if scheme not in ("http", "https", "ws", "wss"):
+            raise ValueError(f"Unsupported URL scheme: {scheme}")
+        netloc, slash, path = rest.partition("/")
+        host, _, port = netloc.partition(":")
+        self.tls = scheme in ("https", "wss")
+        self.host = host
+        self.port = int(port) if port else (443 if self.tls else 80)
+        self.prefix = slash + path.rstrip("/")
+        self.timeout = timeout
+        self.sock = None
+
+    def open(self, path: str) -> None:
+        """Connect and upgrade the connection to a WebSocket."""
+        addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(addr)
+            if self.tls:
+                sock = _wrap_tls(sock, self.host)
+            self.sock = sock
+            self._handshake(path)
+        except BaseException:
+            sock.close()
+            self.sock = None
+            raise
+
+    def _handshake(self, path: str) -> None:
+        key = binascii.b2a_base64(os.urandom(16)).strip().decode()
+        self._write(
+            (
+                f"GET {self.prefix}{path} HTTP/1.1\r\n"
+                f"Host: {self.host}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        # Read up to the end of the headers, byte by byte so that nothing
+        # of the first frames is read along
+        head = bytearray()
+        while not head.endswith(b"\r\n\r\n"):
+            head += self._read(1)
+            if len(head) > 4096:
+                raise HTTPError("WebSocket handshake headers too long")
+        status = head.split(b"\r\n", 1)[0].split(None, 2)
+        if len(status) < 2 or status[1] != b"101":
+            raise HTTPError(f"WebSocket handshake failed: {bytes(head[:64])}")
+
+    def close(self) -> None:
+        if self.sock is None:
+            return
+        try:
+            self._send_frame(OP_CLOSE, b"")
+        except OSError:
+            pass
+        self.sock.close()
+        self.sock = None
+
+    def send(self, message) -> None:
+        """Send a text message."""
+        if isinstance(message, str):
+            message = message.encode()
+        self._send_frame(OP_TEXT, message)
+
+    def receive(self, timeout: float = None):
+        """
+        Next message, bytes, None if none started within timeout seconds.
+        Pings are answered on the way.
+        """
+        message = bytearray()
+        while True:
+            first = self._read_first(timeout)
+            if first is None:
+                return None
+            opcode, payload = self._read_frame(first)
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+            elif opcode == OP_CLOSE:
+                self.sock.close()
+                self.sock = None
+                raise WebSocketClosed("WebSocket closed by server")
+            elif opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                message += payload
+                if len(message) > MAX_MESSAGE_SIZE:
+                    raise ValueError("WebSocket message too large")
+                if first & _FIN:
+                    return bytes(message)
+                # The rest of a fragmented message follows without delay
+                timeout = self.timeout
+
+    def _read_first(self, timeout):
+        """First byte of a frame, None if none came within timeout."""
+        if timeout is not None:
+            self.sock.settimeout(timeout)
+        try:
+            return self._read(1)[0]
+        except OSError as e:
+            if _timed_out(e):
+                return None
+            raise
+        finally:
+            self.sock.settimeout(self.timeout)
+
+    def _read_frame(self, first: int):
+        second = self._read(1)[0]
+        size = second & 0x7F
+        if size == 126:
+            (size,) = struct.unpack("!H", self._read(2))
+        elif size == 127:
+            (size,) = struct.unpack("!Q", self._read(8))
+        if size > MAX_MESSAGE_SIZE:
+            raise ValueError("WebSocket frame too large")
+        mask = self._read(4) if second & _MASK else None
+        payload = self._read(size)
+        if mask is not None:
+            payload = _masked(payload, mask)
+        return first & 0x0F, payload
+
+    def _send_frame(self, opcode: int, payload: bytes) -> None:
+        # Frames from clients are always masked
+        size = len(payload)
+        if size < 126:
+            header = struct.pack("!BB", _FIN | opcode, _MASK | size)
+        elif size < 0x10000:
+            header = struct.pack("!BBH", _FIN | opcode, _MASK | 126, size)
+        else:
+            header = struct.pack("!BBQ", _FIN | opcode, _MASK | 127, size)
+        mask = os.urandom(4)
+        self._write(header + mask + _masked(payload, mask))
+
+    def _read(self, size: int) -> bytes:
+        data = bytearray(size)
+        view = memoryview(data)
+        read = 0
+        while read < size:
+            # CPython sockets have recv_into, MicroPython ones readinto
+            if hasattr(self.sock, "recv_into"):
+                count = self.sock.recv_into(view[read:])
+            else:
+                count = self.sock.readinto(view[read:])
+            if not count:
+                raise WebSocketClosed("Connection closed")
+            read += count
+        return bytes(data)
+
+    def _write(self, data: bytes) -> None:
+        if hasattr(self.sock, "sendall"):
+            self.sock.sendall(data)
+        else:
+            self.sock.write(data)
+
+
+def _masked(payload: bytes, mask: bytes) -> bytes:
+    data = bytearray(payload)
+    for i in range(len(data)):
+        data[i] ^= mask[i & 3]
+    return bytes(data)
+
+
+def _timed_out(e: OSError) -> bool:
+    # CPython raises TimeoutError("timed out"), MicroPython OSError(ETIMEDOUT)
+    return bool(e.args) and e.args[0] in (errno.ETIMEDOUT, errno.EAGAIN, "timed out")
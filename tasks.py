@@ -1,16 +1,45 @@
 import ast
+import functools
+import hashlib
+import io
+import json
 import os
 import subprocess
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import yaml
 from PIL import Image
 from invoke import task, Context
 
+from imagecache import ImageCache
+
 BASE_DIR = Path(__file__).parent.resolve(strict=True)
 SRC_DIR = BASE_DIR / "src"
 TESTS_DIR = BASE_DIR / "test"
+BENCH_DIR = BASE_DIR / "bench"
+# Per-board files (secrets.py, images, logs), overlaid on src/ when deploying
+BUILD_DIR = BASE_DIR / "build"
+# Content hashes of the files deployed to a board, kept on both sides
+BOARD_MANIFEST = ".manifest.json"
+DEPLOY_IGNORE = {".DS_Store", ".pytest_cache", "__pycache__"}
+# Snapshot of all Home Assistant states, reused for HA_CACHE_TTL seconds
+HA_CACHE_PATH = BUILD_DIR / "ha_states.json"
+# Downloaded plant pictures and what they were turned into, see imagecache.py
+IMAGE_CACHE_DIR = BUILD_DIR / "image_cache"
+# Plant picture on the panel, cropped from a square of PICTURE_SIZE pixels
+PICTURE_SIZE = 128
+PICTURE_WIDTH = 104
+# Modules cross-compiled by mpy-cross, one dir per .mpy ABI version
+MPY_BUILD_DIR = BUILD_DIR / "mpy"
+# Deployed as sources: main.py is only ever run as .py, the rest is config
+MPY_KEEP_SOURCE = {"main.py", "secrets.py", "secrets_template.py", "WIFI_CONFIG.py"}
+# Launcher pages pre-rendered on the host, see build_app_index
+LAUNCHER_INDEX = "apps/index.bin"
+LAUNCHER_ICON_CENTERS = (41, 147, 253)
+LAUNCHER_ICON_Y = 30
 
 MICROPYTHON_DEPENDENCIES = [
     # "github:miguelgrinberg/microdot/src/microdot.py",
@@ -27,10 +56,24 @@ def test(c: Context) -> None:
             "pytest",
             pty=True,
             echo=True,
-            env={"PYTHONPATH": f"{SRC_DIR}:{path}"},
+            env={"PYTHONPATH": f"{BASE_DIR}:{SRC_DIR}:{path}"},
         )
 
 
+@task
+def bench(c: Context) -> None:
+    """Run host benchmarks."""
+    with c.cd(BASE_DIR):
+        path = os.getenv("PYTHONPATH", "")
+        for script in sorted(BENCH_DIR.glob("bench_*.py")):
+            c.run(
+                f"python {script}",
+                pty=True,
+                echo=True,
+                env={"PYTHONPATH": f"{BASE_DIR}:{SRC_DIR}:{path}"},
+            )
+
+
 @task(name="list")
 def list_boards(c: Context) -> None:
     """List connected boards with mpremote."""
@@ -38,12 +81,64 @@ def list_boards(c: Context) -> None:
 
 
 @task
-def provision_all(c: Context, *, initial: bool = True) -> None:
-    """Provision all connected boards sequentially."""
+def provision_all(c: Context, *, initial: bool = True, workers: int = 1) -> None:
+    """
+    Provision all connected boards, `workers` at a time.
+    With more than one worker, each board's output goes to
+    build/<board_id>/provision.log.
+    """
     ids = get_all_board_ids()
-
-    for board_id in ids:
-        provision(c, board_id, initial=initial)
+    # Fetch HA states once, the pictures of all boards at the same time:
+    # provisioning then finds them in the caches
+    get_ha_states()
+    try:
+        download_images(ids, workers=max(workers, 4))
+    except Exception as e:
+        print(f"Downloading pictures failed, retrying while provisioning: {e}")
+
+    results = {}
+    if workers <= 1:
+        for board_id in ids:
+            start = time.monotonic()
+            try:
+                provision(c, board_id, initial=initial)
+                ok = True
+            except Exception as e:
+                print(f"Provisioning {board_id} failed: {e}")
+                ok = False
+            results[board_id] = ok, time.monotonic() - start
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                board_id: executor.submit(provision_in_subprocess, board_id, initial)
+                for board_id in ids
+            }
+            for board_id, future in futures.items():
+                results[board_id] = future.result()
+
+    print(f"{'board':<20}{'status':<8}{'duration':>10}")
+    for board_id, (ok, duration) in results.items():
+        status = "ok" if ok else "FAILED"
+        print(f"{board_id:<20}{status:<8}{duration:>9.1f}s")
+    if not all(ok for ok, _ in results.values()):
+        raise SystemExit(1)
+
+
+def provision_in_subprocess(board_id: str, initial: bool) -> tuple[bool, float]:
+    """Run `inv provision` for a board, logging its output to its build dir."""
+    command = ["invoke", "provision", board_id]
+    if not initial:
+        command.append("--no-initial")
+    log_path = get_board_dir(board_id) / "provision.log"
+    print(f"Provisioning {board_id}, logging to {log_path}")
+
+    env = {**os.environ, "HA_CACHE_TTL": os.getenv("HA_CACHE_TTL") or "3600"}
+    start = time.monotonic()
+    with log_path.open("w") as log:
+        result = subprocess.run(
+            command, cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    return result.returncode == 0, time.monotonic() - start
 
 
 @task
@@ -61,48 +156,161 @@ def provision(c: Context, board_id: str, *, initial: bool = True) -> None:
                     pty=True,
                     echo=True,
                 )
-    update_code(c, board_id)
+    # The board is empty after a wipe, copy everything
+    update_code(c, board_id, full=initial)
 
 
 @task
 def download_image(c: Context, board_id: str) -> None:
-    """Download and prepare the proper plant picture for the board."""
-    provisioning = get_provisioning(board_id)
-    plant_id = provisioning["HA_PLANT_ID"]
-
+    """Download and prepare the picture of each of the board's plants."""
+    download_images([board_id])
+
+
+def download_images(board_ids: list[str], workers: int = 4) -> None:
+    """Pictures of the plants of several boards, prepared in parallel."""
+    get_ha_states()
+    cache = ImageCache(IMAGE_CACHE_DIR)
+    jobs = []
+    for board_id in board_ids:
+        images_dir = get_board_dir(board_id) / "images"
+        images_dir.mkdir(exist_ok=True)
+        for index, plant in enumerate(get_plants(get_provisioning(board_id))):
+            jobs.append((cache, plant["HA_PLANT_ID"], images_dir, index))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(download_plant_image, *job) for job in jobs]:
+            future.result()
+
+
+def download_plant_image(
+    cache: ImageCache, plant_id: str, images_dir: Path, index: int
+) -> None:
+    """
+    Write a plant's picture to plant.jpg and plant.bin in images_dir,
+    numbered like indexed() in plant.py after the first plant.
+    """
     data = query_ha_state(plant_id)
     image_url = data["attributes"]["entity_picture"]
-    image_path = SRC_DIR / "images" / "plant.jpg"
-    c.run(f"curl -o {image_path} {image_url}", pty=True, echo=True)
+    name = "plant" if not index else f"plant-{index}"
+    source = cache.fetch(image_url)
+    outputs = cache.processed(
+        source, {"size": PICTURE_SIZE, "width": PICTURE_WIDTH}, process_image
+    )
+    for extension, content in outputs.items():
+        (images_dir / f"{name}.{extension}").write_bytes(content)
+    print(f"{images_dir / name}: {image_url}")
 
-    # resize image_path to 128x128 with Pillow
-    image = Image.open(image_path)
-    image = image.resize((128, 128))
 
-    # crop image to 104x128, centered
-    left = int((image.width - 104) / 2)
-    top = 0
-    right = left + 104
-    bottom = top + 128
-    image = image.crop((left, top, right, bottom))
+def process_image(source: bytes, size: int, width: int) -> dict[str, bytes]:
+    """The picture as a grayscale JPEG and pre-rendered for the panel."""
+    image = Image.open(io.BytesIO(source))
+    image = image.resize((size, size))
+
+    # crop image to width x size, centered
+    left = int((image.width - width) / 2)
+    image = image.crop((left, 0, left + width, size))
 
     # convert image to grayscale
     image = image.convert("L")
-    image.save(image_path)
+    jpeg = io.BytesIO()
+    image.save(jpeg, format="JPEG")
+
+    # pre-render it for the panel, so the board doesn't decode the JPEG
+    return {"jpg": jpeg.getvalue(), "bin": pack_image(image)}
+
+
+def pack_image(image: Image.Image) -> bytes:
+    """
+    Dither an image to 1 bit and pack it in the Badger's framebuffer layout:
+    column by column, 8 vertical pixels per byte with the top one in the
+    most significant bit, a set bit being white.
+    """
+    image = image.convert("1")  # Floyd-Steinberg dithering
+    width, height = image.size
+    pixels = image.load()
+    data = bytearray(width * height // 8)
+    for x in range(width):
+        for y in range(height):
+            if pixels[x, y]:
+                data[(x * height + y) // 8] |= 0x80 >> (y % 8)
+    return bytes(data)
 
 
-def query_ha_state(entity_id):
-    import requests
-    import sys
+@task
+def bench_image(c: Context, board_id: str) -> None:
+    """Time the JPEG decode against the raw image blit on the board."""
+    c.run(
+        f'mpremote connect id:{board_id} exec "'
+        "import time, jpegdec, badger2040;"
+        "display = badger2040.Badger2040();"
+        "jpeg = jpegdec.JPEG(display.display);"
+        "start = time.ticks_us();"
+        "jpeg.open_file('/images/plant.jpg');"
+        "jpeg.decode(0, 0);"
+        "jpeg_us = time.ticks_diff(time.ticks_us(), start);"
+        "start = time.ticks_us();"
+        "f = open('/images/plant.bin', 'rb');"
+        "f.readinto(memoryview(display.display)[:104 * 128 // 8]);"
+        "f.close();"
+        "raw_us = time.ticks_diff(time.ticks_us(), start);"
+        "print('JPEG decode:', jpeg_us, 'us');"
+        "print('Raw blit:', raw_us, 'us');"
+        "print('Saved per cycle:', jpeg_us - raw_us, 'us')\"",
+        pty=True,
+        echo=True,
+    )
+
+
+def query_ha_state(entity_id: str) -> dict:
+    return get_ha_states().get(entity_id, {})
 
-    sys.path.insert(0, str(SRC_DIR))
-    from secrets import HA_ACCESS_TOKEN, HA_BASE_URL
 
-    url = HA_BASE_URL + "/states/" + entity_id
-    headers = {"Authorization": "Bearer " + HA_ACCESS_TOKEN}
-    res = requests.get(url, headers=headers)
-    data = res.json()
-    return data
+@functools.cache
+def get_ha_states() -> dict[str, dict]:
+    """
+    All Home Assistant states indexed by entity_id, fetched with a single
+    request per run. The result is saved to HA_CACHE_PATH and reused while
+    it's younger than the HA_CACHE_TTL environment variable (in seconds),
+    or when Home Assistant can't be reached.
+    """
+    import requests
+
+    ttl = float(os.getenv("HA_CACHE_TTL", "0"))
+    snapshot_age = None
+    if HA_CACHE_PATH.exists():
+        snapshot_age = time.time() - HA_CACHE_PATH.stat().st_mtime
+
+    if snapshot_age is not None and snapshot_age < ttl:
+        states = json.loads(HA_CACHE_PATH.read_text())
+    else:
+        base_url, token = get_ha_config()
+        try:
+            with requests.Session() as session:
+                session.headers["Authorization"] = "Bearer " + token
+                res = session.get(base_url + "/states")
+                res.raise_for_status()
+                states = res.json()
+        except requests.RequestException as e:
+            if snapshot_age is None:
+                raise
+            print(f"Couldn't reach Home Assistant ({e}), using cached states")
+            states = json.loads(HA_CACHE_PATH.read_text())
+        else:
+            BUILD_DIR.mkdir(exist_ok=True)
+            HA_CACHE_PATH.write_text(json.dumps(states))
+
+    return {state["entity_id"]: state for state in states}
+
+
+@functools.cache
+def get_ha_config() -> tuple[str, str]:
+    """HA_BASE_URL and HA_ACCESS_TOKEN, read from src/secrets.py."""
+    secrets = ast.parse((SRC_DIR / "secrets.py").read_text())
+    values = {}
+    for node in secrets.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                values[target.id] = node.value.value
+    return values["HA_BASE_URL"], values["HA_ACCESS_TOKEN"]
 
 
 @task
@@ -121,51 +329,374 @@ def wipe(c: Context, board_id: str) -> None:
         echo=True,
     )
     print("Board wiped, waiting for it to reboot...")
-    time.sleep(3)
+    wait_for_board(board_id)
     print("Done!")
 
 
+def wait_for_board(board_id: str, timeout: float = 30) -> None:
+    """Wait until the board shows up again in `mpremote devs`."""
+    # Give it time to actually reset before it's listed again
+    time.sleep(1)
+    deadline = time.monotonic() + timeout
+    while board_id not in get_all_board_ids():
+        if time.monotonic() > deadline:
+            msg = f"Board {board_id} didn't come back after {timeout}s"
+            raise TimeoutError(msg)
+        time.sleep(0.5)
+
+
 @task
-def update_code(c: Context, board_id: str) -> None:
-    """Update code on the board."""
-    with c.cd(SRC_DIR):
-        c.run("find . -name '.DS_Store' -delete", pty=True, echo=True)
-        c.run(
-            "find . -name '.pytest_cache' -type d -exec rm -r {} +", pty=True, echo=True
+def boot_stats(c: Context, board_id: str) -> None:
+    """Show the boot time and free heap of the plant app's last boot."""
+    result = c.run(
+        f"mpremote connect id:{board_id} cat :/state/plant_boot.json", hide=True
+    )
+    stats = json.loads(result.stdout)
+    for label, key, unit in (
+        ("Imports done", "imported_ms", "ms after boot"),
+        ("First fetch done", "first_fetch_ms", "ms after boot"),
+        ("Free heap at start", "start_mem_free", "bytes"),
+        ("Free heap after imports", "imported_mem_free", "bytes"),
+        ("Free heap after fetch", "first_fetch_mem_free", "bytes"),
+    ):
+        print(f"{label:<24}{stats[key]:>8} {unit}")
+
+
+@task
+def profile(c: Context, min_free: int = 0) -> None:
+    """
+    Pull the wake profiles of all connected boards, print phase percentiles.
+    Fail if the free heap of a phase went below min_free bytes.
+    """
+    # Parse the ring buffer with the module that writes it on the boards
+    sys.path.insert(0, str(SRC_DIR))
+    import profiler
+
+    durations = {}
+    mem_free = {}
+    for board_id in get_all_board_ids():
+        profile_path = get_board_dir(board_id) / "profile.bin"
+        result = c.run(
+            f"mpremote connect id:{board_id} cp :/state/profile.bin {profile_path}",
+            hide=True,
+            warn=True,
         )
-        c.run(
-            "find . -name '__pycache__' -type d -exec rm -r {} +", pty=True, echo=True
+        if not result.ok:
+            print(f"{board_id}: no profile")
+            continue
+        records = profiler.read(profile_path.read_bytes())
+        wakes = {wake for wake, *_ in records}
+        battery = records[-1][4] if records else 0
+        print(f"{board_id}: {len(wakes)} wakes, battery at {battery} mV")
+        for _, phase, duration_us, free, _ in records:
+            durations.setdefault(phase, []).append(duration_us / 1000)
+            mem_free.setdefault(phase, []).append(free)
+
+    print(
+        f"{'phase':<14}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+        f"{'max ms':>10}{'min free':>10}"
+    )
+    for phase in profiler.PHASES:
+        if phase not in durations:
+            continue
+        values = sorted(durations[phase])
+        print(
+            f"{phase:<14}{len(values):>7}{percentile(values, 50):>10.1f}"
+            f"{percentile(values, 90):>10.1f}{percentile(values, 99):>10.1f}"
+            f"{values[-1]:>10.1f}{min(mem_free[phase]):>10}"
         )
+
+    low = [phase for phase, free in mem_free.items() if min(free) < min_free]
+    if low:
+        print(f"Free heap went below {min_free} bytes in:", ", ".join(low))
+        raise SystemExit(1)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+@task
+def gateway(c: Context, *, port: int = 8124, interval: float = 30) -> None:
+    """
+    Serve the plant records of the boards in provisioning.yaml, polling
+    Home Assistant every `interval` seconds. Set GATEWAY_URL on the boards.
+    """
+    # The records are packed by the module that unpacks them on the boards
+    sys.path.insert(0, str(SRC_DIR))
+    from gateway import Gateway
+
+    with (BASE_DIR / "provisioning.yaml").open() as f:
+        provisioning = yaml.safe_load(f)
+    base_url, token = get_ha_config()
+    server = Gateway(
+        provisioning, base_url, token, interval=interval, address=("0.0.0.0", port)
+    )
+    server.start()
+    print(f"Serving {len(provisioning)} boards on port {port}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+@task
+def update_code(
+    c: Context, board_id: str, *, full: bool = False, mpy: bool = True
+) -> None:
+    """
+    Update code on the board. Only files changed since the last deploy are
+    copied, based on a manifest of content hashes. Use --full to copy
+    everything, --no-mpy to deploy the sources instead of compiled modules.
+    """
+    files = get_deploy_files(board_id)
+    if mpy:
+        files = compile_mpy(c, board_id, files)
+    manifest = {remote: hash_file(local) for remote, local in files.items()}
+    previous = None if full else get_board_manifest(c, board_id)
+
+    commands = []
+    if previous is None:
+        with c.cd(SRC_DIR):
+            c.run("find . -name '.DS_Store' -delete", pty=True, echo=True)
+            c.run(
+                "find . -name '.pytest_cache' -type d -exec rm -r {} +",
+                pty=True,
+                echo=True,
+            )
+            c.run(
+                "find . -name '__pycache__' -type d -exec rm -r {} +",
+                pty=True,
+                echo=True,
+            )
+        commands.append("cp -r . :")
+        # Board specific files from prepare and download_image
+        board_dir = BUILD_DIR / board_id
+        if (board_dir / "secrets.py").exists():
+            commands.append(f"cp {board_dir / 'secrets.py'} :secrets.py")
+        if (board_dir / "images").exists():
+            commands.append(f"cp -r {board_dir / 'images'} :")
+        # Only what these copies put on the board, the files built elsewhere
+        # (the launcher index) are copied below. Then the sources are
+        # swapped for their compiled modules.
+        previous = {
+            remote: hash_file(local)
+            for remote, local in get_deploy_files(board_id).items()
+            if local.is_relative_to(SRC_DIR) or local.is_relative_to(board_dir)
+        }
+
+    known_dirs = {"."} | {
+        directory.as_posix()
+        for remote in previous
+        for directory in Path(remote).parents
+    }
+    for remote, local in files.items():
+        if previous.get(remote) == manifest[remote]:
+            continue
+        for directory in reversed(Path(remote).parents):
+            if directory.as_posix() not in known_dirs:
+                commands.append(f"mkdir :{directory.as_posix()}")
+                known_dirs.add(directory.as_posix())
+        commands.append(f"cp {local} :{remote}")
+    for remote in previous.keys() - manifest.keys():
+        commands.append(f"rm :{remote}")
+    if not commands:
+        print(f"{board_id} is up to date")
+        return
+
+    # Only kept as the host copy once the board got the files, so that a
+    # failed copy is tried again by the next deploy
+    manifest_path = get_board_dir(board_id) / "manifest.json"
+    pending_path = manifest_path.with_name("manifest.pending.json")
+    pending_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    commands.append(f"cp {pending_path} :{BOARD_MANIFEST}")
+    commands.append("reset")
+    with c.cd(SRC_DIR):
         c.run(
-            f"mpremote connect id:{board_id} cp -r . : + reset",
+            f"mpremote connect id:{board_id} " + " + ".join(commands),
             pty=True,
             echo=True,
         )
+    pending_path.replace(manifest_path)
+
+
+def get_deploy_files(board_id: str) -> dict[str, Path]:
+    """
+    Files to deploy, by path on the board: src/ overlaid with the board's
+    build dir.
+    """
+    files = {}
+    for path in sorted(SRC_DIR.rglob("*")):
+        if not path.is_file() or set(path.parts) & DEPLOY_IGNORE:
+            continue
+        files[path.relative_to(SRC_DIR).as_posix()] = path
+
+    board_dir = BUILD_DIR / board_id
+    if (board_dir / "secrets.py").exists():
+        files["secrets.py"] = board_dir / "secrets.py"
+    for path in sorted((board_dir / "images").glob("*")):
+        files[f"images/{path.name}"] = path
+    files[LAUNCHER_INDEX] = build_app_index()
+    return files
+
+
+def build_app_index() -> Path:
+    """
+    Write the launcher's app index: a JSON line listing the apps, followed
+    by one packed framebuffer per page of three apps, with their icons
+    already decoded at their place on a white background.
+    """
+    apps = sorted(path.stem for path in (SRC_DIR / "apps").glob("*.py"))
+    per_page = len(LAUNCHER_ICON_CENTERS)
+
+    data = bytearray((json.dumps({"apps": apps}) + "\n").encode())
+    for first in range(0, len(apps), per_page):
+        page = Image.new("L", (296, 128), 255)
+        for name, center in zip(apps[first : first + per_page], LAUNCHER_ICON_CENTERS):
+            icon_path = SRC_DIR / "apps" / f"icon-{name.replace('_', '-')}.jpg"
+            if icon_path.exists():
+                icon = Image.open(icon_path).convert("L")
+                page.paste(icon, (center - icon.width // 2, LAUNCHER_ICON_Y))
+        data += pack_image(page)
+
+    index_path = BUILD_DIR / "launcher_index.bin"
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    # Parallel provisioning may build the index concurrently
+    tmp = index_path.with_name(f"{index_path.name}.{os.getpid()}")
+    tmp.write_bytes(data)
+    tmp.replace(index_path)
+    return index_path
+
+
+def compile_mpy(c: Context, board_id: str, files: dict[str, Path]) -> dict[str, Path]:
+    """
+    Cross-compile the Python modules in files to .mpy for the board's
+    firmware, and return files with the sources swapped for them.
+
+    Apps stay listed by the launcher through a stub apps/<name>.py importing
+    the compiled lib/<name>_app.mpy.
+    """
+    version = get_board_mpy_version(c, board_id)
+    compiler_version = get_mpy_cross_version(c)
+    if version != compiler_version:
+        raise ValueError(
+            "Board %s runs .mpy v%d.%d but mpy-cross emits v%d.%d, install the "
+            "mpy-cross release matching the board's MicroPython firmware"
+            % (board_id, *version, *compiler_version)
+        )
+    build_dir = MPY_BUILD_DIR / ("v%d.%d" % version)
+
+    compiled = {}
+    for remote, local in files.items():
+        path = Path(remote)
+        if path.suffix != ".py" or remote in MPY_KEEP_SOURCE:
+            compiled[remote] = local
+            continue
+        if path.parent.as_posix() == "apps":
+            module = f"lib/{path.stem}_app.mpy"
+            stub = build_dir / remote
+            stub.parent.mkdir(parents=True, exist_ok=True)
+            stub.write_text(
+                f"# Compiled to /{module}, deploy with --no-mpy to run the source\n"
+                f"import {path.stem}_app  # noqa: F401\n"
+            )
+            compiled[remote] = stub
+        else:
+            module = path.with_suffix(".mpy").as_posix()
+
+        output = build_dir / module
+        if not output.exists() or output.stat().st_mtime < local.stat().st_mtime:
+            output.parent.mkdir(parents=True, exist_ok=True)
+            # Parallel provisioning may compile the same module concurrently
+            tmp = output.with_name(f"{output.name}.{os.getpid()}")
+            c.run(f"mpy-cross -s {remote} -o {tmp} {local}", echo=True)
+            tmp.replace(output)
+        compiled[module] = output
+    return compiled
+
+
+def get_board_mpy_version(c: Context, board_id: str) -> tuple[int, int]:
+    """The (version, sub-version) of the .mpy files the board can import."""
+    result = c.run(
+        f"mpremote connect id:{board_id} exec "
+        "'import sys; print(sys.implementation._mpy)'",
+        hide=True,
+    )
+    # Bits 0-7 are the version, 8-9 the sub-version and 10+ the native arch
+    mpy = int(result.stdout.split()[-1])
+    return mpy & 0xFF, mpy >> 8 & 0x3
+
+
+def get_mpy_cross_version(c: Context) -> tuple[int, int]:
+    # e.g. "MicroPython v1.22.2 on 2024-02-22; mpy-cross emitting mpy v6.2"
+    result = c.run("mpy-cross --version", hide=True)
+    version = result.stdout.rsplit("mpy v", 1)[1].split()[0]
+    major, _, minor = version.partition(".")
+    return int(major), int(minor or 0)
+
+
+def hash_file(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def get_board_manifest(c: Context, board_id: str) -> dict[str, str] | None:
+    """
+    Manifest of the last deploy to the board, from the host copy if there's
+    one, else from the board itself. None if there's none.
+    """
+    manifest_path = BUILD_DIR / board_id / "manifest.json"
+    if manifest_path.exists():
+        return json.loads(manifest_path.read_text())
+    result = c.run(
+        f"mpremote connect id:{board_id} cat :{BOARD_MANIFEST}", hide=True, warn=True
+    )
+    if not result.ok:
+        return None
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        return None
 
 
 def prepare(board_id: str) -> None:
-    """Update secrets.py with the correct values for the board."""
+    """Write the board's secrets.py, based on src/secrets.py, to its build dir."""
     provisioning = get_provisioning(board_id)
+    plants = [resolve_plant(plant) for plant in get_plants(provisioning)]
+    # The first plant also goes to the top-level HA_PLANT_* settings, the
+    # list of plants only for boards with a plants list
+    values = {**provisioning, **plants[0]}
+    values["HA_PLANTS"] = plants if "plants" in provisioning else []
 
     with (SRC_DIR / "secrets.py").open() as f:
         secrets = f.read()
 
     secrets = ast.parse(secrets)
+    assigned = set()
     for node in secrets.body:
         if isinstance(node, ast.Assign):
             for target in node.targets:
                 var_name = target.id
-                if var_name in provisioning:
-                    node.value = ast.Constant(provisioning[var_name])
-                elif var_name.lower() in provisioning:
-                    state = query_ha_state(provisioning[var_name.lower()])
-                    value = int(state.get("state", -1))
-                    node.value = ast.Constant(value)
-
-    with (SRC_DIR / "secrets.py").open("w") as f:
+                assigned.add(var_name)
+                if var_name in values:
+                    node.value = ast.parse(repr(values[var_name]), mode="eval").body
+    # Settings added since src/secrets.py was copied from the template
+    for var_name, value in values.items():
+        if var_name.isupper() and var_name not in assigned:
+            secrets.body.append(ast.parse(f"{var_name} = {value!r}").body[0])
+
+    with (get_board_dir(board_id) / "secrets.py").open("w") as f:
         f.write(ast.unparse(secrets))
 
 
+def get_board_dir(board_id: str) -> Path:
+    board_dir = BUILD_DIR / board_id
+    board_dir.mkdir(parents=True, exist_ok=True)
+    return board_dir
+
+
 def get_all_board_ids():
     # Here's an example output of `mpremote devs`:
     # /dev/cu.Bluetooth-Incoming-Port None 0000:0000 None None
@@ -182,6 +713,29 @@ def get_all_board_ids():
     return ids
 
 
+def get_plants(provisioning: dict) -> list[dict]:
+    """
+    Provisioning of each plant of a board: its plants list, or the board's
+    own HA_PLANT_* settings for a single plant.
+    """
+    return provisioning.get("plants") or [provisioning]
+
+
+def resolve_plant(plant: dict) -> dict:
+    """
+    Settings of a plant for its secrets.py: upper case keys as they are,
+    lower case ones name the HA entity holding their value.
+    """
+    values = {}
+    for key, value in plant.items():
+        if key.isupper():
+            values[key] = value
+        elif key.upper().startswith("HA_PLANT_"):
+            state = query_ha_state(value)
+            values[key.upper()] = int(state.get("state", -1))
+    return values
+
+
 def get_provisioning(board_id: str) -> dict[str, str]:
     # load provisioning.yaml
     with (BASE_DIR / "provisioning.yaml").open() as f:
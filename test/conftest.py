@@ -0,0 +1,10 @@
+import pytest
+
+from sim.fakeha import FakeHA
+
+
+@pytest.fixture
+def fake_ha():
+    server = FakeHA().start()
+    yield server
+    server.stop()
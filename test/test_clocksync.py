@@ -0,0 +1,63 @@
+import pytest
+
+from clocksync import (
+    estimated_error,
+    measure_drift,
+    needs_sync,
+    rtc_duration,
+    valid_time,
+)
+
+DAY = 24 * 60 * 60
+NOW = 1678456800
+
+
+@pytest.mark.parametrize(
+    "last_sync, drift_ppm, expected",
+    [
+        (None, None, True),
+        (NOW + 60, 5, True),  # RTC went backwards
+        (NOW - DAY, 0, True),  # Sync interval reached
+        (NOW - 3600, None, False),
+        (NOW - 3600, 5, False),
+        (NOW - 20 * 3600, 500, True),  # 36 seconds off
+        (NOW - 20 * 3600, -500, True),
+    ],
+)
+def test_needs_sync(last_sync, drift_ppm, expected):
+    assert needs_sync(NOW, last_sync, drift_ppm, 30, DAY) == expected
+
+
+def test_estimated_error():
+    assert estimated_error(NOW, NOW - 100_000, 10) == 1
+    # Unknown drift assumes the crystal tolerance
+    assert estimated_error(NOW, NOW - 100_000, None) == 2
+
+
+def test_measure_drift():
+    # RTC 2 seconds ahead after 100000 seconds
+    assert measure_drift(NOW + 2, NOW, NOW - 100_000, None) == 20
+    assert measure_drift(NOW + 2, NOW, NOW - 100_000, 10) == 15
+    # Too short to measure, or never synced
+    assert measure_drift(NOW + 2, NOW, NOW - 60, 10) == 10
+    assert measure_drift(NOW + 2, NOW, None, None) is None
+
+
+def test_measure_drift_ignores_quantization():
+    # A second off after an hour is only the clocks' resolution
+    assert measure_drift(NOW + 1, NOW, NOW - 3600, 10) == 10
+    assert measure_drift(NOW - 1, NOW, NOW - 3600, None) is None
+    # Clamped to a plausible drift
+    assert measure_drift(NOW + 60, NOW, NOW - DAY, None) == 100
+    assert measure_drift(NOW - 60, NOW, NOW - DAY, 0) == -50
+
+
+def test_rtc_duration():
+    assert rtc_duration(1_000_000, 20) == pytest.approx(1_000_020)
+    assert rtc_duration(1_000_000, -20) == pytest.approx(999_980)
+    assert rtc_duration(3600, None) == 3600
+
+
+def test_valid_time():
+    assert valid_time(2024)
+    assert not valid_time(2000)
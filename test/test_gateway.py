@@ -0,0 +1,176 @@
+import math
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import plantrecord
+from gateway import Gateway, build_record, thresholds
+from sim import Simulator
+
+BOARD_ID = "e6614864d35f9934"
+BOARD = {
+    "HA_PLANT_ID": "plant.aloe_vera",
+    "HA_PLANT_MOISTURE_SENSOR": "sensor.aloe_vera_soil_moisture",
+    "HA_PLANT_TEMPERATURE_SENSOR": "sensor.aloe_vera_temperature",
+    "HA_PLANT_CONDUCTIVITY_SENSOR": "sensor.aloe_vera_conductivity",
+    "HA_PLANT_ILLUMINANCE_SENSOR": "sensor.aloe_vera_illuminance",
+    "HA_PLANT_DLI_SENSOR": "sensor.aloe_vera_dli",
+    "ha_plant_max_moisture": "number.aloe_vera_max_soil_moisture",
+    "ha_plant_min_moisture": "number.aloe_vera_min_soil_moisture",
+    "ha_plant_max_temperature": "number.aloe_vera_max_temperature",
+    "ha_plant_min_temperature": "number.aloe_vera_min_temperature",
+    "ha_plant_max_illuminance": "number.aloe_vera_max_illuminance",
+    "ha_plant_min_illuminance": "number.aloe_vera_min_illuminance",
+    "ha_plant_max_conductivity": "number.aloe_vera_max_conductivity",
+    "ha_plant_min_conductivity": "number.aloe_vera_min_conductivity",
+    "ha_plant_max_dli": "number.aloe_vera_max_dli",
+    "ha_plant_min_dli": "number.aloe_vera_min_dli",
+}
+
+
+@pytest.fixture
+def gateway(fake_ha):
+    server = Gateway(
+        {BOARD_ID: BOARD}, fake_ha.base_url, "token", address=("127.0.0.1", 0)
+    )
+    server.start()
+    deadline = time.monotonic() + 5
+    while not server.polls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield server
+    server.stop()
+
+
+def get(url: str) -> bytes:
+    with urllib.request.urlopen(url) as res:
+        return res.read()
+
+
+def test_record_roundtrip():
+    data = plantrecord.pack(
+        "Aloe vera",
+        1678449600,
+        {
+            "moisture": (42.0, 72, (15.0, 60.0)),
+            "temperature": (None, None, (10.0, 35.0)),
+            "dli": (3.25, None, None),
+        },
+    )
+
+    record = plantrecord.unpack(data)
+
+    assert record["name"] == "Aloe vera"
+    assert record["updated"] == 1678449600
+    assert record["gauges"]["moisture"] == (42.0, 72, (15.0, 60.0))
+    assert record["gauges"]["temperature"] == (None, None, (10.0, 35.0))
+    assert record["gauges"]["conductivity"] == (None, None, None)
+    assert record["gauges"]["dli"] == (3.25, None, None)
+    with pytest.raises(ValueError):
+        plantrecord.unpack(data[:-1])
+
+
+def test_long_names_are_cut_on_characters():
+    data = plantrecord.pack("é" * 20, 0, {})
+
+    assert plantrecord.unpack(data)["name"] == "é" * 16
+
+
+def test_thresholds_from_provisioning_and_entities(fake_ha):
+    board = dict(BOARD, HA_PLANT_MIN_DLI=5, HA_PLANT_MAX_DLI=1)
+
+    assert thresholds(board, fake_ha.states, "moisture") == (15, 60)
+    assert thresholds(board, fake_ha.states, "dli") == (1, 5)
+    del board["ha_plant_max_conductivity"]
+    assert thresholds(board, fake_ha.states, "conductivity") is None
+
+
+def test_record_has_values_and_fills(fake_ha):
+    record = plantrecord.unpack(build_record(BOARD, fake_ha.states, 0, 160))
+
+    assert record["name"] == "Aloe vera"
+    value, fill, bounds = record["gauges"]["moisture"]
+    # 42% between 15% and 60%
+    assert (value, fill, bounds) == (42, 96, (15, 60))
+    # Below the minimum
+    assert record["gauges"]["illuminance"][1] == 0
+    assert math.isclose(record["gauges"]["dli"][0], 3.2, rel_tol=1e-6)
+
+
+def test_serves_records(gateway, fake_ha):
+    record = plantrecord.unpack(get(f"{gateway.base_url}/records/{BOARD_ID}"))
+    assert record["gauges"]["moisture"][1] == 96
+
+    record = plantrecord.unpack(get(f"{gateway.base_url}/records/{BOARD_ID}?width=80"))
+    assert record["gauges"]["moisture"][1] == 48
+    # Polled once, whatever the number of requests
+    assert fake_ha.requests == [("GET", "/api/states")]
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(f"{gateway.base_url}/records/unknown")
+    assert error.value.code == 404
+
+
+def test_serves_each_plant_of_a_board(fake_ha):
+    other = dict(BOARD, HA_PLANT_MOISTURE_SENSOR="sensor.aloe_vera_temperature")
+    server = Gateway(
+        {BOARD_ID: {"plants": [BOARD, other]}},
+        fake_ha.base_url,
+        "token",
+        address=("127.0.0.1", 0),
+    )
+    server.poll()
+
+    first = plantrecord.unpack(server.record(BOARD_ID, 0))
+    second = plantrecord.unpack(server.record(BOARD_ID, 1))
+
+    assert first["gauges"]["moisture"][0] == 42
+    assert second["gauges"]["moisture"][0] == 21.5
+    assert server.record(BOARD_ID, 2) is None
+    server.server_close()
+
+
+def test_keeps_serving_when_ha_is_down(gateway, fake_ha):
+    gateway.ha_url = "http://127.0.0.1:1/api"
+    with pytest.raises(OSError):
+        gateway.poll()
+
+    record = plantrecord.unpack(get(f"{gateway.base_url}/records/{BOARD_ID}"))
+    assert record["name"] == "Aloe vera"
+
+
+def test_not_polled_yet(fake_ha):
+    server = Gateway(
+        {BOARD_ID: BOARD}, "http://127.0.0.1:1/api", "t", address=("127.0.0.1", 0)
+    )
+    assert server.record(BOARD_ID) is None
+    server.server_close()
+
+
+def test_badge_uses_gateway(tmp_path, fake_ha, gateway):
+    sim = Simulator(
+        tmp_path / "flash",
+        {"HA_BASE_URL": fake_ha.base_url, "GATEWAY_URL": gateway.base_url},
+    )
+
+    wake = sim.launch("plant")
+
+    assert not wake.exceptions, wake.output
+    assert "Fetching records of " + BOARD_ID in wake.output
+    # Only the gateway's poll reached HA
+    assert fake_ha.requests == [("GET", "/api/states")]
+
+
+def test_badge_falls_back_to_ha(tmp_path, fake_ha):
+    sim = Simulator(
+        tmp_path / "flash",
+        {"HA_BASE_URL": fake_ha.base_url, "GATEWAY_URL": "http://127.0.0.1:1"},
+    )
+
+    wake = sim.launch("plant")
+
+    assert not wake.exceptions, wake.output
+    assert not wake.warnings, wake.output
+    assert "Gateway failed" in wake.output
+    assert fake_ha.requests == [("POST", "/api/template")]
@@ -0,0 +1,117 @@
+import types
+
+import pytest
+
+ENTITIES = [
+    ("plant", "plant.aloe_vera"),
+    ("moisture", "sensor.aloe_vera_soil_moisture"),
+    ("temperature", "sensor.aloe_vera_temperature"),
+]
+
+
+@pytest.fixture
+def ha(monkeypatch, fake_ha):
+    import ha
+
+    secrets = types.SimpleNamespace(
+        HA_BASE_URL=fake_ha.base_url, HA_ACCESS_TOKEN="token"
+    )
+    monkeypatch.setattr(ha, "secrets", secrets)
+    yield ha
+    ha.close_connection()
+
+
+def test_fetch_entities_batched_single_request(ha, fake_ha):
+    states = ha.fetch_entities(ENTITIES)
+
+    assert fake_ha.requests == [("POST", "/api/template")]
+    assert states["plant"]["entity_id"] == "plant.aloe_vera"
+    assert states["plant"]["attributes"]["friendly_name"] == "Aloe vera"
+    assert states["moisture"]["state"] == "42"
+    assert states["temperature"]["state"] == "21.5"
+
+
+def test_fetch_entities_falls_back_when_batch_fails(ha, fake_ha):
+    fake_ha.template_enabled = False
+
+    states = ha.fetch_entities(ENTITIES)
+
+    assert fake_ha.requests == [
+        ("POST", "/api/template"),
+        ("GET", "/api/states/plant.aloe_vera"),
+        ("GET", "/api/states/sensor.aloe_vera_soil_moisture"),
+        ("GET", "/api/states/sensor.aloe_vera_temperature"),
+    ]
+    assert states["plant"]["attributes"]["friendly_name"] == "Aloe vera"
+    assert states["moisture"]["state"] == "42"
+    assert "context" not in states["moisture"]
+
+
+def test_fetch_entities_unbatched(ha, fake_ha):
+    states = ha.fetch_entities(ENTITIES, batch=False)
+
+    assert len(fake_ha.requests) == len(ENTITIES)
+    assert all(method == "GET" for method, _ in fake_ha.requests)
+    assert states["temperature"]["state"] == "21.5"
+
+
+def test_fetch_state_error(ha, fake_ha):
+    with pytest.raises(ha.HAFetchStateError):
+        ha.fetch_state("sensor.missing")
+
+
+def test_fetch_entities_reuses_connection(ha, fake_ha):
+    fake_ha.template_enabled = False
+
+    ha.fetch_entities(ENTITIES)
+
+    assert len(fake_ha.requests) == 4
+    assert fake_ha.connections == 1
+    assert ha.connection().connects == 1
+    assert ha.connection().requests == 4
+
+
+def test_fetch_state_chunked(ha, fake_ha):
+    fake_ha.chunked = True
+
+    first = ha.fetch_state("plant.aloe_vera")
+    second = ha.fetch_state("sensor.aloe_vera_temperature")
+
+    assert first["attributes"] == {"friendly_name": "Aloe vera"}
+    assert second["state"] == "21.5"
+    assert fake_ha.connections == 1
+
+
+def test_fetch_state_reconnects_after_server_close(ha, fake_ha):
+    fake_ha.drop_connections = True
+
+    ha.fetch_state("plant.aloe_vera")
+    state = ha.fetch_state("sensor.aloe_vera_temperature")
+
+    assert state["state"] == "21.5"
+    assert fake_ha.connections == 2
+    assert ha.connection().connects == 2
+
+
+def test_subscribe_states_receives_only_its_entities(ha, fake_ha):
+    ws = ha.subscribe_states(["sensor.aloe_vera_soil_moisture"])
+    try:
+        assert ha.receive_state_change(ws, timeout=0.05) is None
+
+        fake_ha.set_state("sensor.aloe_vera_temperature", "30")
+        fake_ha.set_state("sensor.aloe_vera_soil_moisture", "20")
+
+        entity, state = ha.receive_state_change(ws, timeout=5)
+        assert entity == "sensor.aloe_vera_soil_moisture"
+        assert state["state"] == "20"
+        assert "context" not in state
+        assert ha.receive_state_change(ws, timeout=0.05) is None
+    finally:
+        ws.close()
+
+
+def test_subscribe_states_authentication_failure(ha, fake_ha):
+    ha.secrets.HA_ACCESS_TOKEN = ""
+
+    with pytest.raises(ha.HAError):
+        ha.subscribe_states(["sensor.aloe_vera_soil_moisture"])
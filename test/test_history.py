@@ -0,0 +1,81 @@
+import struct
+
+from history import SCALE, UNKNOWN, History, dequantize, quantize
+
+RANGES = [(0, 100), (10, 35), None]
+
+
+def test_quantize():
+    assert quantize(0, 0, 100) == 0
+    assert quantize(100, 0, 100) == SCALE
+    assert quantize(150, 0, 100) == SCALE
+    assert quantize(-5, 0, 100) == 0
+    assert quantize(None, 0, 100) == UNKNOWN
+    assert quantize(float("nan"), 0, 100) == UNKNOWN
+    assert abs(dequantize(quantize(21.5, 10, 35), 10, 35) - 21.5) < 0.001
+    assert dequantize(UNKNOWN, 10, 35) is None
+
+
+def test_samples_are_read_back(tmp_path):
+    history = History(str(tmp_path / "history.bin"), RANGES, 8)
+    history.append(1000, [50, 22.5, 3])
+    history.append(5000, [None, 10, 4])
+
+    moisture, temperature, other = history.series()
+
+    assert moisture == [SCALE // 2, UNKNOWN]
+    assert temperature == [SCALE // 2, 0]
+    # Sensors without a range aren't kept
+    assert other == [UNKNOWN, UNKNOWN]
+    timestamps, _, first, count = history.load()
+    assert (timestamps[first], count) == (1000, 2)
+
+
+def test_file_size_is_fixed(tmp_path):
+    path = tmp_path / "history.bin"
+    history = History(str(path), RANGES, 8)
+
+    history.append(0, [1, 2, 3])
+    size = path.stat().st_size
+    for i in range(1, 20):
+        history.append(i, [i, 20, 3])
+
+    assert size == path.stat().st_size == history.size()
+    # The ring buffer keeps the latest samples
+    assert history.series()[0] == [quantize(i, 0, 100) for i in range(12, 20)]
+    assert history.series(last=3)[0] == [quantize(i, 0, 100) for i in range(17, 20)]
+
+
+def test_close_samples_replace_the_latest_one(tmp_path):
+    history = History(str(tmp_path / "history.bin"), RANGES, 8)
+
+    history.append(0, [10, 20, 0], min_interval=3600)
+    history.append(1800, [20, 20, 0], min_interval=3600)
+    history.append(3600, [30, 20, 0], min_interval=3600)
+
+    assert history.series()[0] == [quantize(20, 0, 100), quantize(30, 0, 100)]
+
+
+def test_changed_ranges_reset_the_history(tmp_path):
+    path = str(tmp_path / "history.bin")
+    History(path, RANGES, 8).append(0, [10, 20, 0])
+
+    history = History(path, [(0, 50), (10, 35), None], 8)
+    assert history.series() == [[], [], []]
+
+    history.append(3600, [10, 20, 0])
+    assert history.series()[0] == [quantize(10, 0, 50)]
+
+
+def test_corrupt_file_is_ignored(tmp_path):
+    path = tmp_path / "history.bin"
+    history = History(str(path), RANGES, 8)
+    history.append(0, [10, 20, 0])
+    data = bytearray(path.read_bytes())
+    # Next slot out of range
+    struct.pack_into("<H", data, 8, 9)
+    path.write_bytes(data)
+
+    assert history.load() is None
+    history.append(10, [30, 20, 0])
+    assert history.series()[0] == [quantize(30, 0, 100)]
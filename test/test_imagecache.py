@@ -0,0 +1,92 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from imagecache import ImageCache
+
+
+class PictureServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), PictureHandler)
+        self.picture = b"picture"
+        self.etag = '"1"'
+        self.requests = []
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/aloe.jpg"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class PictureHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(len(self.server.picture)))
+        self.end_headers()
+        self.wfile.write(self.server.picture)
+
+
+@pytest.fixture
+def server():
+    server = PictureServer().start()
+    yield server
+    server.stop()
+
+
+def process(source, size):
+    process.calls += 1
+    return {"jpg": source * size, "bin": bytes(size)}
+
+
+def test_fetch_only_downloads_changes(tmp_path, server):
+    cache = ImageCache(tmp_path)
+    assert cache.fetch(server.url) == b"picture"
+    # Another run, e.g. provisioning another board
+    assert ImageCache(tmp_path).fetch(server.url) == b"picture"
+    assert server.requests == [None, '"1"']
+
+    server.picture, server.etag = b"new picture", '"2"'
+    assert cache.fetch(server.url) == b"new picture"
+
+
+def test_fetch_falls_back_to_the_cached_copy(tmp_path, server):
+    cache = ImageCache(tmp_path, timeout=1)
+    cache.fetch(server.url)
+    url = server.url
+    server.stop()
+
+    assert cache.fetch(url) == b"picture"
+    with pytest.raises(OSError):
+        cache.fetch(url.replace("aloe", "ficus"))
+
+
+def test_processed_once_per_source_and_params(tmp_path):
+    process.calls = 0
+    cache = ImageCache(tmp_path)
+
+    outputs = cache.processed(b"ab", {"size": 2}, process)
+    assert outputs == {"jpg": b"abab", "bin": bytes(2)}
+    assert ImageCache(tmp_path).processed(b"ab", {"size": 2}, process) == outputs
+    assert process.calls == 1
+
+    cache.processed(b"ab", {"size": 3}, process)
+    cache.processed(b"cd", {"size": 2}, process)
+    assert process.calls == 3
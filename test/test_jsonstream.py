@@ -0,0 +1,59 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from jsonstream import extract
+
+PAYLOADS_DIR = Path(__file__).parent.parent / "bench" / "payloads"
+
+FIELDS = {"entity_id": None, "state": None, "attributes": {"friendly_name": None}}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+@pytest.mark.parametrize("payload", sorted(PAYLOADS_DIR.glob("*.json")))
+def test_extract_matches_json(payload, chunk_size):
+    raw = payload.read_bytes()
+    data = json.loads(raw)
+
+    result = extract(io.BytesIO(raw), FIELDS, chunk_size=chunk_size)
+
+    assert result == {
+        "entity_id": data["entity_id"],
+        "state": data["state"],
+        "attributes": {"friendly_name": data["attributes"]["friendly_name"]},
+    }
+
+
+def test_extract_keeps_whole_values():
+    raw = json.dumps(
+        {
+            "skip": {"nested": ["a", {"b": "}]"}]},
+            "list": [1, -2.5, True, None, {"x": "y"}],
+            "text": 'quote " slash \\ unicode é 🌵 \n',
+            "number": 1e3,
+        }
+    ).encode()
+
+    result = extract(
+        io.BytesIO(raw), {"list": None, "text": None, "number": None}, chunk_size=3
+    )
+
+    assert result == {
+        "list": [1, -2.5, True, None, {"x": "y"}],
+        "text": 'quote " slash \\ unicode é 🌵 \n',
+        "number": 1000.0,
+    }
+
+
+def test_extract_stops_after_root_object():
+    stream = io.BytesIO(b'{"state": "on"}trailing garbage')
+
+    assert extract(stream, {"state": None}, chunk_size=4) == {"state": "on"}
+
+
+@pytest.mark.parametrize("raw", [b"", b"[1, 2]", b'{"state": "on"', b'{"state" "on"}'])
+def test_extract_invalid(raw):
+    with pytest.raises(ValueError):
+        extract(io.BytesIO(raw), {"state": None})
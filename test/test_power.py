@@ -0,0 +1,81 @@
+import pytest
+
+import power
+from power import CRITICAL, LOW, NORMAL, SAVING, update
+
+HOUR = 3600
+# LiPo cell voltage at each tenth of its charge, from full to empty
+DISCHARGE_MV = (4200, 4050, 3950, 3880, 3820, 3780, 3740, 3700, 3640, 3500, 3000)
+
+
+def battery_level(charge: float) -> int:
+    """Level shown by badger_os for a cell with charge left (0..1)."""
+    position = (1 - charge) * (len(DISCHARGE_MV) - 1)
+    index = min(int(position), len(DISCHARGE_MV) - 2)
+    low, high = DISCHARGE_MV[index + 1], DISCHARGE_MV[index]
+    mv = high - (high - low) * (position - index)
+    return max(0, min(100, int((mv - 3000) * 100 // 1200)))
+
+
+def discharge(hours: int, **kwargs) -> list:
+    """(level, profile) of hourly wakes draining a full cell in hours."""
+    state = {}
+    wakes = []
+    for hour in range(hours + 1):
+        level = battery_level(1 - hour / hours)
+        wakes.append((level, update(state, hour * HOUR, level, **kwargs)))
+    return wakes
+
+
+def first_level(wakes, profile) -> int:
+    return next(level for level, p in wakes if p >= profile)
+
+
+def test_profiles_degrade_along_the_discharge_curve():
+    wakes = discharge(30 * 24)
+
+    profiles = [profile for _, profile in wakes]
+    assert profiles == sorted(profiles)
+    assert profiles[0] == NORMAL
+    assert {SAVING, LOW, CRITICAL} <= set(profiles)
+    # Critical before the cell is empty
+    assert first_level(wakes, CRITICAL) > 0
+
+
+def test_fast_drain_saves_sooner():
+    slow = discharge(60 * 24)
+    fast = discharge(5 * 24)
+
+    assert first_level(fast, SAVING) > first_level(slow, SAVING)
+    assert first_level(fast, CRITICAL) > first_level(slow, CRITICAL)
+
+
+def test_thresholds_are_configurable():
+    default = discharge(30 * 24)
+    earlier = discharge(30 * 24, thresholds=(70, 50, 30))
+
+    assert first_level(earlier, SAVING) > first_level(default, SAVING)
+
+
+def test_wavering_level_doesnt_flip_profiles():
+    state = {}
+    profiles = [
+        update(state, hour * HOUR, 40 - hour % 2, horizon=0) for hour in range(12)
+    ]
+    assert profiles == [NORMAL] + [SAVING] * 11
+
+
+def test_charging_goes_back_to_normal():
+    state = {}
+    for hour, level in enumerate((30, 20, 15, 9)):
+        profile = update(state, hour * HOUR, level)
+    assert profile == CRITICAL
+
+    assert update(state, 5 * HOUR, 60) == NORMAL
+    assert state["rate"] == 0
+
+
+@pytest.mark.parametrize("level, expected", [(100, NORMAL), (35, SAVING), (5, LOW)])
+def test_first_wake_uses_the_level(level, expected):
+    assert update({}, 0, level, thresholds=(40, 20, 0)) == expected
+    assert power.STRETCH[expected] >= 1
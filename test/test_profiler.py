@@ -0,0 +1,77 @@
+import pytest
+
+import profiler
+from profiler import HEADER_SIZE, RECORD_SIZE, Profiler, read
+
+
+def wake(path, phases, battery_mv=4000, capacity=8):
+    prof = Profiler(str(path), battery_mv, capacity)
+    for phase, duration_us in phases:
+        prof.record(phase, duration_us)
+    prof.flush()
+
+
+def test_records_are_read_back(tmp_path):
+    path = tmp_path / "profile.bin"
+    wake(path, [("boot", 1500), ("connect", 2_000_000)])
+    wake(path, [("fetch_state", 300_000)], battery_mv=3900)
+
+    records = read(path.read_bytes())
+
+    assert [record[:3] for record in records] == [
+        (1, "boot", 1500),
+        (1, "connect", 2_000_000),
+        (2, "fetch_state", 300_000),
+    ]
+    assert [record[4] for record in records] == [4000, 4000, 3900]
+
+
+def test_ring_buffer_keeps_the_latest_records(tmp_path):
+    path = tmp_path / "profile.bin"
+    for i in range(5):
+        wake(path, [("bar", i * 10), ("update", i * 10 + 1)], capacity=8)
+
+    records = read(path.read_bytes())
+
+    assert len(path.read_bytes()) == HEADER_SIZE + 8 * RECORD_SIZE
+    assert [record[2] for record in records] == [10, 11, 20, 21, 30, 31, 40, 41]
+    assert records[0][0] == 2
+
+
+def test_phase_context_manager(tmp_path, monkeypatch):
+    path = tmp_path / "profile.bin"
+    monkeypatch.setattr(profiler, "_profiler", None)
+    with profiler.phase("connect"):
+        pass
+    profiler.flush()
+    assert not path.exists()
+
+    profiler.start(str(path), battery_mv=4100)
+    with profiler.phase("connect"):
+        pass
+    profiler.flush()
+
+    phases = [record[1] for record in read(path.read_bytes())]
+    assert phases == ["boot", "connect"]
+
+
+@pytest.mark.parametrize("data", [b"", b"\x05\x00\x01\x00\x00\x00"])
+def test_read_invalid(data):
+    with pytest.raises(ValueError):
+        read(data)
+
+
+def test_phase_records_its_lowest_free_heap(tmp_path, monkeypatch):
+    path = tmp_path / "profile.bin"
+    monkeypatch.setattr(profiler, "_profiler", None)
+    profiler.start(str(path))
+    # Free heap at the start and end of each phase
+    free = iter([5000, 3000, 2000, 4000])
+    monkeypatch.setattr(profiler, "mem_free", lambda: next(free))
+    with profiler.phase("fetch_state"):
+        pass
+    with profiler.phase("update"):
+        pass
+    profiler.flush()
+
+    assert [record[3] for record in read(path.read_bytes())][1:] == [3000, 2000]
@@ -0,0 +1,81 @@
+import pytest
+
+from scheduler import backoff, load, next_interval, pack, save, unpack
+
+THRESHOLDS = [(15, 60), (10, 35), None]
+BASE, MINIMUM, MAXIMUM = 60, 15, 720
+
+
+def interval(previous, current, elapsed=60, thresholds=THRESHOLDS):
+    return next_interval(previous, current, elapsed, thresholds, BASE, MINIMUM, MAXIMUM)
+
+
+def test_no_previous_sample_uses_base():
+    assert interval(None, [40, 20, 1]) == BASE
+
+
+def test_stable_values_stretch_interval():
+    assert interval([40, 20, 1], [40, 20, 5]) == MAXIMUM
+
+
+def test_slow_drift_far_from_thresholds():
+    # Moisture loses 0.5% an hour, 20% away from the threshold
+    assert interval([40.5, 20, None], [40, 20, None]) == MAXIMUM
+    # 2% an hour: half of the 10 hours it would take to reach 15%
+    assert interval([37, 20, None], [35, 20, None]) == 300
+
+
+def test_fast_change_shortens_interval():
+    # Watering: moisture jumped by a quarter of the range in 30 minutes
+    assert interval([20, 20, None], [31.25, 20, None], elapsed=30) == 22
+
+
+def test_close_to_threshold_uses_base():
+    assert interval([17, 20, None], [17, 20, None]) == BASE
+    # Out of range
+    assert interval([12, 20, None], [12, 20, None]) == BASE
+
+
+def test_interval_clamped_to_minimum():
+    assert interval([15.5, 20, None], [59.5, 20, None], elapsed=1) == MINIMUM
+
+
+def test_unknown_values_ignored():
+    assert interval([None, 20, None], [40, None, None]) == BASE
+    assert interval([None, 20, None], [40, 20, None]) == MAXIMUM
+
+
+def test_nothing_to_evaluate_uses_base():
+    assert interval([1, 2], [1, 2], thresholds=[None, None]) == BASE
+    assert interval([None], [None], thresholds=[(0, 100)]) == BASE
+
+
+def test_backoff_doubles_up_to_maximum():
+    assert [backoff(failures, 30, 240) for failures in range(1, 6)] == [
+        30,
+        60,
+        120,
+        240,
+        240,
+    ]
+    assert backoff(1000, 30, 240) == 240
+
+
+def test_pack_unpack():
+    timestamp, values = unpack(pack(1678456800, [41.5, None, 1200.0]))
+
+    assert timestamp == 1678456800
+    assert values == [41.5, None, 1200.0]
+
+
+def test_unpack_invalid():
+    with pytest.raises(ValueError):
+        unpack(b"\x00\x01\x02")
+
+
+def test_load_save(tmp_path):
+    path = str(tmp_path / "schedule.bin")
+
+    assert load(path) is None
+    save(path, 1678456800, [1.0, None])
+    assert load(path) == (1678456800, [1.0, None])
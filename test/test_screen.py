@@ -0,0 +1,55 @@
+import pytest
+
+from screen import align, digest, dirty_regions, quantize
+
+
+@pytest.mark.parametrize(
+    "value, step, expected",
+    [
+        (0, 5, 0),
+        (2, 5, 0),
+        (3, 5, 5),
+        (87, 5, 85),
+        (88, 5, 90),
+        (100, 5, 100),
+        (42.7, 10, 40),
+    ],
+)
+def test_quantize(value, step, expected):
+    assert quantize(value, step) == expected
+
+
+def test_digest():
+    gauges = [("H", 12), ("T", None)]
+
+    assert digest("Aloe vera", "85%", 3, gauges) == digest(
+        "Aloe vera", "85%", 3, list(gauges)
+    )
+    assert digest("Aloe vera", "85%", 3, gauges) != digest(
+        "Aloe vera", "85%", 3, [("H", 13), ("T", None)]
+    )
+    assert len(digest()) == 16
+
+
+@pytest.mark.parametrize(
+    "rect, expected",
+    [
+        ((0, 0, 296, 20), (0, 0, 296, 24)),
+        ((104, 28, 192, 12), (104, 24, 192, 16)),
+        ((104, 48, 192, 12), (104, 48, 192, 16)),
+        ((104, 108, 192, 12), (104, 104, 192, 16)),
+        ((0, 0, 104, 128), (0, 0, 104, 128)),
+    ],
+)
+def test_align(rect, expected):
+    assert align(*rect) == expected
+
+
+def test_dirty_regions():
+    regions = [("header", "a"), ("image", "b"), ("moisture", "c")]
+
+    assert dirty_regions(regions, {}) == ["header", "image", "moisture"]
+    assert dirty_regions(regions, {"header": "a", "image": "b", "moisture": "c"}) == []
+    assert dirty_regions(regions, {"header": "x", "image": "b", "moisture": "c"}) == [
+        "header"
+    ]
@@ -0,0 +1,338 @@
+import copy
+import json
+import threading
+import time
+
+import pytest
+
+from sim import Simulator
+from sim.hardware import UPDATE_FAST
+from sim.simulator import SECRETS
+
+# badger2040 pins
+BUTTON_DOWN = 11
+BUTTON_A = 12
+BUTTON_UP = 15
+
+
+def minutes(seconds):
+    return round(seconds / 60)
+
+
+@pytest.fixture
+def sim(tmp_path, fake_ha):
+    return Simulator(tmp_path / "flash", {"HA_BASE_URL": fake_ha.base_url})
+
+
+def assert_ok(wake):
+    assert not wake.exceptions, wake.output
+    assert not wake.warnings, wake.output
+
+
+def test_launch_fetches_and_draws(sim, fake_ha, tmp_path):
+    wake = sim.launch("plant")
+
+    assert_ok(wake)
+    assert fake_ha.requests == [("POST", "/api/template")]
+    assert [region for _, region, _ in wake.refreshes] == [None]
+    assert wake.wifi_connects == ["full"]
+    # The picture, then the black header over it
+    assert any(sim.hardware.panel[:1664])
+    assert sim.hardware.panel[0] & 0xC0 == 0
+
+    sim.screenshot(tmp_path / "screen.png")
+    assert (tmp_path / "screen.png").read_bytes().startswith(b"\x89PNG")
+
+
+def test_timer_wakes(sim, fake_ha):
+    sim.launch("plant")
+    wakes = list(sim.run(3))
+
+    for slept, wake in wakes:
+        assert_ok(wake)
+        assert wake.woken_by == "rtc"
+        # REFRESH_INTERVAL_MINUTES with up to 10% jitter
+        assert 60 <= minutes(slept) <= 66
+    assert len(fake_ha.requests) == 4
+    # Nothing changed: the screen is left as is, Wi-Fi joins the cached AP
+    assert wakes[0][1].refreshes == []
+    assert wakes[-1][1].wifi_connects == ["fast"]
+
+
+def test_wifi_cache_keeps_the_access_point_joined(sim, fake_ha):
+    # A stronger access point of the same SSID than the one joined
+    sim.hardware.access_points.append(("sim", b"\x02\x00\x00\x00\x00\x02", 11, -40))
+    sim.launch("plant")
+    # The cache saved before the clock was set has expired
+    wakes = [wake for _, wake in sim.run(2)]
+
+    cache = json.loads(sim.hardware.path("/state/wifi.json").read_text())
+    assert cache["bssid"] == "020000000001"
+    assert cache["channel"] == 6
+    assert [wake.wifi_connects for wake in wakes] == [["full"], ["fast"]]
+
+
+def test_wifi_cache_without_bssid(sim, fake_ha):
+    sim.hardware.wlan_reports_bssid = False
+    sim.launch("plant")
+    # Joins by SSID on the cached channel
+    wakes = [wake for _, wake in sim.run(2)]
+
+    cache = json.loads(sim.hardware.path("/state/wifi.json").read_text())
+    assert "bssid" not in cache
+    assert [wake.wifi_connects for wake in wakes] == [["full"], ["fast"]]
+
+    # Not on the cached channel anymore: falls back to a full connect
+    sim.hardware.access_points[0] = ("sim", b"\x02\x00\x00\x00\x00\x01", 1, -60)
+    _, wake = next(sim.run(1))
+    assert_ok(wake)
+    assert wake.wifi_connects == ["full"]
+
+
+def test_changed_sensor_refreshes_its_gauge(sim, fake_ha):
+    # Keep the header clock from refreshing too
+    sim.secrets["CLOCK_REFRESH_MINUTES"] = 24 * 60
+    sim.launch("plant")
+    fake_ha.set_state("sensor.aloe_vera_soil_moisture", "20")
+
+    _, wake = next(sim.run(1))
+
+    assert_ok(wake)
+    assert [region for _, region, _ in wake.refreshes] == [(104, 24, 192, 16)]
+
+
+def test_long_interval_uses_rtc_alarm(sim):
+    sim.secrets.update(
+        ADAPTIVE_REFRESH=False,
+        REFRESH_INTERVAL_MINUTES=300,
+        CLOCK_REFRESH_MINUTES=24 * 60,
+    )
+    sim.launch("plant")
+
+    assert not sim.hardware.rtc.timer_enabled
+    slept, wake = next(sim.run(1))
+
+    assert_ok(wake)
+    assert 300 <= minutes(slept) <= 330
+    assert "Screen unchanged" in wake.output
+
+
+def test_error_shows_warning_and_retries(sim):
+    sim.secrets["HA_BASE_URL"] = "http://127.0.0.1:1/api"
+    wake = sim.launch("plant")
+
+    assert wake.warnings
+    assert wake.exceptions
+    # ERROR_REFRESH_INTERVAL_MINUTES with up to 10% jitter
+    assert 30 <= minutes(sim.sleep()) <= 33
+
+
+def test_error_redraws_cached_state_and_backs_off(sim, fake_ha):
+    sim.secrets["CLOCK_REFRESH_MINUTES"] = 24 * 60
+    sim.launch("plant")
+    sim.secrets["HA_BASE_URL"] = "http://127.0.0.1:1/api"
+
+    sleeps, refreshes = [], []
+    for slept, wake in sim.run(4):
+        sleeps.append(minutes(slept))
+        refreshes.append([region for _, region, _ in wake.refreshes])
+        assert wake.exceptions
+        assert not wake.warnings, wake.output
+        assert "Displaying cached state" in wake.output
+    # The cached state stays, only the header gets the stale marker
+    assert refreshes == [[(0, 0, 296, 24)], [], [], []]
+
+    sim.secrets["HA_BASE_URL"] = fake_ha.base_url
+    sleeps.append(minutes(sim.sleep()))
+    wake = sim.boot("rtc")
+    assert_ok(wake)
+    # The header loses its marker
+    assert [region for _, region, _ in wake.refreshes] == [(0, 0, 296, 24)]
+
+    # ERROR_REFRESH_INTERVAL_MINUTES doubling with up to 10% jitter
+    assert 60 <= sleeps[0] <= 66
+    for slept, expected in zip(sleeps[1:], (30, 60, 120, 240)):
+        assert expected <= slept <= expected * 1.1
+    assert 60 <= minutes(sim.sleep()) <= 66
+
+
+def test_sparklines_draw_the_history(sim, fake_ha):
+    sim.secrets.update(GAUGE_STYLE="sparkline", CLOCK_REFRESH_MINUTES=24 * 60)
+    sim.launch("plant")
+    fake_ha.set_state("sensor.aloe_vera_soil_moisture", "20")
+
+    _, wake = next(sim.run(1))
+
+    assert_ok(wake)
+    # Each sparkline got a new sample, the header and picture are left as is
+    assert [region for _, region, _ in wake.refreshes] == [
+        (104, y, 192, 16) for y in (24, 48, 64, 88, 104)
+    ]
+    assert sim.hardware.path("/state/plant_history.bin").exists()
+
+
+def two_plants(fake_ha) -> list:
+    """Add a second plant to HA, with the sensors of the first one."""
+    for entity_id, state in list(fake_ha.states.items()):
+        if "aloe_vera" in entity_id:
+            ficus = entity_id.replace("aloe_vera", "ficus")
+            fake_ha.states[ficus] = dict(copy.deepcopy(state), entity_id=ficus)
+    fake_ha.states["plant.ficus"]["attributes"]["friendly_name"] = "Ficus"
+    fake_ha.set_state("sensor.ficus_soil_moisture", "20")
+
+    plants = []
+    for name in ("aloe_vera", "ficus"):
+        plants.append(
+            {
+                key: value.replace("aloe_vera", name)
+                if isinstance(value, str)
+                else value
+                for key, value in SECRETS.items()
+                if key.startswith("HA_PLANT_")
+            }
+        )
+    return plants
+
+
+def test_buttons_flip_between_plants(sim, fake_ha):
+    sim.secrets["HA_PLANTS"] = two_plants(fake_ha)
+    sim.provision_image(1)
+
+    wake = sim.launch("plant")
+
+    assert_ok(wake)
+    # Both plants in a single batch
+    assert fake_ha.requests == [("POST", "/api/template")]
+    assert "Pre-rendering page 1" in wake.output
+    first_page = bytes(sim.hardware.panel)
+
+    wake = sim.press(BUTTON_DOWN)
+    assert_ok(wake)
+    assert "Showing page 1" in wake.output
+    # From the pre-rendered page, without connecting
+    assert wake.wifi_connects == []
+    assert len(fake_ha.requests) == 1
+    assert [(speed, region) for speed, region, _ in wake.refreshes] == [
+        (UPDATE_FAST, (0, 0, 296, 128))
+    ]
+    assert bytes(sim.hardware.panel) != first_page
+
+    wake = sim.press(BUTTON_UP)
+    assert_ok(wake)
+    assert bytes(sim.hardware.panel) == first_page
+
+    # The refresh timer kept running through the button wakes
+    slept, wake = next(sim.run(1))
+    assert_ok(wake)
+    assert 60 <= minutes(slept) <= 66
+    assert len(fake_ha.requests) == 2
+
+
+def test_usb_button_wakes_after_a_flip(sim, fake_ha):
+    sim.secrets["HA_PLANTS"] = two_plants(fake_ha)
+    sim.provision_image(1)
+    sim.launch("plant")
+    sim.hardware.usb_power = True
+    wakes = []
+    board = threading.Thread(
+        target=lambda: wakes.append(sim.press(BUTTON_DOWN)), daemon=True
+    )
+    board.start()
+    # Kept on by USB after showing the second plant, waiting in halt()
+    assert sim.hardware.halted.wait(5)
+
+    # Fetches and goes live, still on the second plant
+    sim.hardware.press([BUTTON_A])
+    assert fake_ha.subscribed.wait(5)
+    sim.hardware.usb_power = False
+    board.join(5)
+
+    (wake,) = wakes
+    assert_ok(wake)
+    assert wake.output.count("Showing page") == 1
+    page = json.loads(sim.hardware.path("/state/plant_page.json").read_text())
+    assert page == {"page": 1}
+
+
+def test_low_battery_does_less(sim, fake_ha):
+    sim.hardware.battery_mv = 3100
+    wake = sim.launch("plant")
+
+    assert_ok(wake)
+    assert "Power profile: critical" in wake.output
+    # Only the plant and its moisture
+    assert "Fetching 2 states in one batch" in wake.output
+    assert wake.refreshes[0][0] == UPDATE_FAST
+    # REFRESH_INTERVAL_MINUTES stretched eightfold
+    assert 480 <= minutes(sim.sleep()) <= 528
+
+
+def test_button_wake_shows_the_cache_before_fetching(sim, fake_ha):
+    sim.secrets.update(CLOCK_REFRESH_MINUTES=24 * 60)
+    sim.launch("plant")
+    fake_ha.set_state("sensor.aloe_vera_soil_moisture", "20")
+
+    wake = sim.press(BUTTON_A)
+
+    assert_ok(wake)
+    output = wake.output
+    assert output.index("Displaying cached state") < output.index("Fetching")
+    # The cached screen at once, then only the moisture gauge that changed
+    assert [region for _, region, _ in wake.refreshes] == [None, (104, 24, 192, 16)]
+
+
+def test_live_mode_on_usb(sim, fake_ha):
+    sim.secrets.update(LIVE_COALESCE_SECONDS=0.2)
+    sim.hardware.usb_power = True
+    wakes = []
+    board = threading.Thread(target=lambda: wakes.append(sim.launch("plant")))
+    board.start()
+    assert fake_ha.subscribed.wait(5)
+    refreshes = len(sim.hardware.refreshes)
+
+    # A burst of changes, drawn at once
+    fake_ha.set_state("sensor.aloe_vera_soil_moisture", "20")
+    fake_ha.set_state("sensor.aloe_vera_temperature", "30")
+    deadline = time.monotonic() + 5
+    while len(sim.hardware.refreshes) < refreshes + 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    # Back on battery, polling again
+    sim.hardware.usb_power = False
+    board.join(5)
+
+    (wake,) = wakes
+    assert_ok(wake)
+    assert "Drawing 2 changes" in wake.output
+    assert [region for _, region, _ in wake.refreshes[refreshes:]] == [
+        (104, 24, 192, 16),
+        (104, 48, 192, 16),
+    ]
+    assert fake_ha.requests == [("POST", "/api/template"), ("GET", "/api/websocket")]
+    assert 60 <= minutes(sim.sleep()) <= 66
+
+
+def test_live_mode_entity_removed(sim, fake_ha):
+    sim.secrets.update(LIVE_COALESCE_SECONDS=0.2)
+    sim.hardware.usb_power = True
+    wakes = []
+    board = threading.Thread(
+        target=lambda: wakes.append(sim.launch("plant")), daemon=True
+    )
+    board.start()
+    assert fake_ha.subscribed.wait(5)
+    refreshes = len(sim.hardware.refreshes)
+
+    # Renamed: their states change to null
+    fake_ha.remove_state("plant.aloe_vera")
+    fake_ha.remove_state("sensor.aloe_vera_soil_moisture")
+    deadline = time.monotonic() + 5
+    while len(sim.hardware.refreshes) == refreshes:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    sim.hardware.usb_power = False
+    board.join(5)
+
+    (wake,) = wakes
+    assert_ok(wake)
+    assert "Drawing 2 changes" in wake.output
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+import yaml
+
+pytest.importorskip("invoke")
+pytest.importorskip("PIL")
+
+from invoke import Context, Result, UnexpectedExit  # noqa: E402
+
+import tasks  # noqa: E402
+
+BOARD_ID = "e6614c311b7e6f35"
+
+
+class FakeContext(Context):
+    """Records commands, mpremote sessions fail while failing is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.commands = []
+        self.failing = False
+
+    def run(self, command, **kwargs):
+        self.commands.append(command)
+        if self.failing and command.startswith("mpremote"):
+            raise UnexpectedExit(Result(command=command, exited=1))
+        return Result(command=command, exited=0)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "main.py").write_text("print('v1')\n")
+    index_path = tmp_path / "index.bin"
+    index_path.write_bytes(b"index")
+    monkeypatch.setattr(tasks, "SRC_DIR", src_dir)
+    monkeypatch.setattr(tasks, "BUILD_DIR", tmp_path / "build")
+    monkeypatch.setattr(tasks, "build_app_index", lambda: index_path)
+    return src_dir
+
+
+def deploy(c):
+    c.commands.clear()
+    tasks.update_code(c, BOARD_ID, mpy=False)
+    return [command for command in c.commands if command.startswith("mpremote")]
+
+
+def test_update_code_copies_changed_files(project):
+    c = FakeContext()
+    deploy(c)
+    manifest_path = tasks.BUILD_DIR / BOARD_ID / "manifest.json"
+    assert "main.py" in json.loads(manifest_path.read_text())
+
+    assert deploy(c) == []
+    (project / "main.py").write_text("print('v2')\n")
+    (session,) = deploy(c)
+    assert f"cp {project / 'main.py'} :main.py" in session
+    assert "apps/index.bin" not in session
+
+
+def test_update_code_retries_after_failed_copy(project):
+    c = FakeContext()
+    deploy(c)
+    (project / "main.py").write_text("print('v2')\n")
+
+    c.failing = True
+    with pytest.raises(UnexpectedExit):
+        deploy(c)
+    c.failing = False
+
+    # The board may not have it, so it's copied again
+    (session,) = deploy(c)
+    assert f"cp {project / 'main.py'} :main.py" in session
+    assert deploy(c) == []
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_update_code_full_deploy_copies_launcher_index(project, full):
+    c = FakeContext()
+    if full:
+        deploy(c)
+    c.commands.clear()
+    tasks.update_code(c, BOARD_ID, full=full, mpy=False)
+
+    # Built on the host, so not in the copy of src/
+    session = c.commands[-1]
+    assert " cp -r . : " in session
+    assert f"cp {tasks.build_app_index()} :apps/index.bin" in session
+    assert deploy(c) == []
+
+
+def test_prepare_adds_settings_missing_from_secrets(project, tmp_path, monkeypatch):
+    (project / "secrets.py").write_text('SSID = ""\nHA_PLANT_ID = ""\n')
+    plants = [{"HA_PLANT_ID": "plant.aloe_vera"}, {"HA_PLANT_ID": "plant.basil"}]
+    (tmp_path / "provisioning.yaml").write_text(
+        yaml.safe_dump({BOARD_ID: {"SSID": "home", "plants": plants}})
+    )
+    monkeypatch.setattr(tasks, "BASE_DIR", tmp_path)
+
+    tasks.prepare(BOARD_ID)
+
+    secrets = {}
+    exec((tasks.BUILD_DIR / BOARD_ID / "secrets.py").read_text(), secrets)
+    assert secrets["SSID"] == "home"
+    assert secrets["HA_PLANT_ID"] == "plant.aloe_vera"
+    assert secrets["HA_PLANTS"] == plants
+    assert "plants" not in secrets